@@ -0,0 +1,104 @@
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class EngineOverloaded(Exception):
+    """
+    Raised when the analysis queue is full and the request is shed
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__("Analysis queue is full, try again later")
+        self.retry_after = retry_after
+
+
+class EngineTimeout(Exception):
+    """
+    Raised when an analysis does not finish within its deadline
+    """
+
+
+class AnalysisEngine:
+    """
+    Runs blocking model pipelines on a dedicated, sized thread pool.
+
+    At most ``max_in_flight`` jobs run at once, at most ``max_queue`` jobs
+    wait for a slot, and everything beyond that is rejected immediately so
+    the event loop (and /health, /history) never stalls behind model calls.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, timeout: float, retry_after: int):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_in_flight, thread_name_prefix="analysis"
+        )
+        self._slots = None
+        self._waiting = 0
+        self._running = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    @property
+    def in_flight(self) -> int:
+        return self._running
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # Created lazily so the semaphore binds to the running loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        return self._slots
+
+    async def run(self, func, *args, timeout: float = None):
+        """
+        Run ``func(*args)`` on the analysis pool and return its result
+        """
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        slots = self._get_slots()
+
+        # Admission is decided synchronously from our own counters; the
+        # semaphore alone can't tell how many callers are about to wait on it.
+        if self._waiting + self._running >= self.max_in_flight + self.max_queue:
+            raise EngineOverloaded(self.retry_after)
+
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise EngineTimeout("Timed out waiting for an analysis slot")
+        finally:
+            self._waiting -= 1
+
+        self._running += 1
+        # Carry the request's context (e.g. its stage trace) into the worker
+        context = contextvars.copy_context()
+        future = loop.run_in_executor(self._executor, context.run, func, *args)
+
+        def _release(_):
+            # The slot is held until the worker thread really finishes, so a
+            # timed-out call still counts against the in-flight limit.
+            self._running -= 1
+            slots.release()
+
+        future.add_done_callback(_release)
+
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(future), timeout=max(deadline - loop.time(), 0)
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Analysis exceeded %.1fs deadline", timeout)
+            raise EngineTimeout(f"Analysis did not finish within {timeout:.0f}s")
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,59 @@
+import argparse
+import logging
+
+from sqlalchemy import update
+
+from app.database import SessionLocal
+from app.init_db import init_db
+from app.models import FoodScan
+from app.nutrients import extract_nutrients
+
+logger = logging.getLogger(__name__)
+
+
+def backfill_nutrients(chunk_size: int = 1000, missing_only: bool = False) -> int:
+    """
+    Re-extract the denormalized nutrient columns from scan_result.
+
+    Rows are streamed in primary-key order, ``chunk_size`` at a time, and
+    each chunk is written back with one executemany UPDATE.
+    """
+    updated = 0
+    last_id = 0
+    db = SessionLocal()
+    try:
+        while True:
+            query = db.query(FoodScan.id, FoodScan.scan_result).filter(FoodScan.id > last_id)
+            if missing_only:
+                query = query.filter(FoodScan.product_name.is_(None), FoodScan.calories.is_(None))
+            rows = query.order_by(FoodScan.id).limit(chunk_size).all()
+            if not rows:
+                break
+
+            db.execute(
+                update(FoodScan),
+                [{"id": row.id, **extract_nutrients(row.scan_result)} for row in rows]
+            )
+            db.commit()
+            # Drop loaded state so memory stays flat across chunks
+            db.expunge_all()
+
+            updated += len(rows)
+            last_id = rows[-1].id
+            logger.info("Backfilled %s scans (last id %s)", updated, last_id)
+    finally:
+        db.close()
+    return updated
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Backfill nutrient columns from scan_result")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--missing-only", action="store_true",
+                        help="only rows whose nutrient columns were never filled")
+    args = parser.parse_args()
+
+    init_db()
+    count = backfill_nutrients(args.chunk_size, args.missing_only)
+    print(f"Backfilled {count} scans")
@@ -0,0 +1,236 @@
+import asyncio
+import hashlib
+import logging
+import tarfile
+import zipfile
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.serialization import dumps_str
+from app.uploads import sniff_image_type, too_large_detail
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz")
+ARCHIVE_CONTENT_TYPES = (
+    "application/zip",
+    "application/x-zip-compressed",
+    "application/x-tar",
+    "application/gzip",
+    "application/x-gzip",
+)
+
+
+def is_archive(filename: str, content_type: str) -> bool:
+    filename = (filename or "").lower()
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    return filename.endswith(ARCHIVE_SUFFIXES) or content_type in ARCHIVE_CONTENT_TYPES
+
+
+def iter_archive(fileobj, max_bytes: int):
+    """
+    Yield ``(name, contents)`` for every regular file in a zip or tar
+    archive; ``contents`` is as returned by ``read_item``
+    """
+    fileobj.seek(0)
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or _is_junk(info.filename):
+                    continue
+                if info.file_size > max_bytes:
+                    yield info.filename, _too_large(max_bytes)
+                    continue
+                with archive.open(info) as member:
+                    yield info.filename, read_item(member, max_bytes)
+        return
+
+    fileobj.seek(0)
+    # Stream mode reads members sequentially without building an index
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            if not member.isfile() or _is_junk(member.name):
+                continue
+            if member.size > max_bytes:
+                yield member.name, _too_large(max_bytes)
+                continue
+            yield member.name, read_item(archive.extractfile(member), max_bytes)
+
+
+def read_item(fileobj, max_bytes: int):
+    """
+    Read one batch item, checking its magic bytes before reading the rest
+    and never reading more than ``max_bytes`` + 1 (declared sizes can lie).
+
+    Returns the bytes, or the HTTPException to report for the item.
+    """
+    header = fileobj.read(16)
+    if sniff_image_type(header) is None:
+        return HTTPException(status_code=415, detail="Unsupported image format")
+    contents = header + fileobj.read(max_bytes + 1 - len(header))
+    if len(contents) > max_bytes:
+        return _too_large(max_bytes)
+    return contents
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=too_large_detail(max_bytes))
+
+
+def _is_junk(name: str) -> bool:
+    basename = name.rsplit("/", 1)[-1]
+    return name.startswith("__MACOSX/") or basename.startswith(".")
+
+
+async def iterate_in_threadpool(iterator):
+    """
+    Drive a blocking iterator from the event loop one item at a time
+    """
+    sentinel = object()
+    while True:
+        item = await run_in_threadpool(next, iterator, sentinel)
+        if item is sentinel:
+            return
+        yield item
+
+
+async def run_batch(items, analyze, make_row, store_rows, concurrency: int,
+                    chunk_size: int, max_retries: int = 3, store_blob=None):
+    """
+    Analyze ``items`` (async iterable of ``(filename, bytes)``) and yield
+    one NDJSON line per item as it finishes, followed by a summary line.
+    Items whose contents are an HTTPException (rejected while reading) are
+    reported as errors without being stored or analyzed.
+
+    ``analyze(contents)`` returns ``(result, keys, cached)`` or raises
+    HTTPException; identical uploads are analyzed once. Successful rows
+    from ``make_row(filename, result, keys, blob_digest)`` are written with
+    ``store_rows`` once per chunk. ``store_blob(contents)``, if given, keeps
+    the original alongside the analysis and returns its digest or None.
+    """
+    work = asyncio.Queue(maxsize=concurrency)
+    records = asyncio.Queue()
+    first_seen = {}  # content digest -> index of the first upload
+    outcomes = {}  # index -> (record, row) of finished first uploads
+    waiting = {}  # index -> duplicates waiting for that upload
+    summary = {"total": 0, "ok": 0, "errors": 0, "duplicates": 0, "cached": 0, "stored": 0}
+
+    def emit_duplicate(index, filename, first):
+        record, row = outcomes[first]
+        duplicate = dict(record, index=index, filename=filename, duplicate_of=first)
+        dup_row = dict(row, image_path=filename) if row is not None else None
+        records.put_nowait((duplicate, dup_row))
+
+    async def produce():
+        index = 0
+        async for filename, contents in items:
+            if isinstance(contents, HTTPException):
+                records.put_nowait((error_record(index, filename, contents), None))
+                index += 1
+                continue
+            digest = hashlib.sha256(contents).hexdigest()
+            if digest in first_seen:
+                first = first_seen[digest]
+                if first in outcomes:
+                    emit_duplicate(index, filename, first)
+                else:
+                    waiting.setdefault(first, []).append((index, filename))
+            else:
+                first_seen[digest] = index
+                await work.put((index, filename, contents))
+            index += 1
+        for _ in range(concurrency):
+            await work.put(None)
+
+    async def worker():
+        while True:
+            item = await work.get()
+            if item is None:
+                return
+            index, filename, contents = item
+            blob = asyncio.ensure_future(store_blob(contents)) if store_blob else None
+            try:
+                record, row = await analyze_one(index, filename, contents, blob)
+            finally:
+                if blob is not None:
+                    await blob
+            outcomes[index] = (record, row)
+            records.put_nowait((record, row))
+            for dup_index, dup_filename in waiting.pop(index, []):
+                emit_duplicate(dup_index, dup_filename, index)
+
+    async def analyze_one(index, filename, contents, blob):
+        for attempt in range(max_retries + 1):
+            try:
+                result, keys, cached = await analyze(contents)
+                record = {"index": index, "filename": filename, "status": "ok",
+                          "cached": cached, "duplicate_of": None, "result": result}
+                blob_digest = await blob if blob is not None else None
+                return record, make_row(filename, result, keys, blob_digest)
+            except HTTPException as e:
+                retry_after = (e.headers or {}).get("Retry-After")
+                if e.status_code == 503 and retry_after and attempt < max_retries:
+                    await asyncio.sleep(float(retry_after))
+                    continue
+                return error_record(index, filename, e), None
+            except Exception as e:
+                logger.error("Batch item %s failed: %s", index, e)
+                return error_record(index, filename, HTTPException(500, str(e))), None
+
+    async def supervise():
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        try:
+            await produce()
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            records.put_nowait(None)
+
+    supervisor = asyncio.create_task(supervise())
+    rows = []
+    try:
+        while True:
+            item = await records.get()
+            if item is None:
+                break
+            record, row = item
+            summary["total"] += 1
+            summary["ok" if record["status"] == "ok" else "errors"] += 1
+            summary["duplicates"] += record.get("duplicate_of") is not None
+            summary["cached"] += bool(record.get("cached")) and record.get("duplicate_of") is None
+            if row is not None:
+                rows.append(row)
+                if len(rows) >= chunk_size:
+                    summary["stored"] += await _flush(store_rows, rows)
+                    rows = []
+            yield dumps_str(record) + "\n"
+
+        summary["stored"] += await _flush(store_rows, rows)
+        # Surface producer failures (e.g. a corrupt archive) after partial results
+        await supervisor
+        yield dumps_str({"summary": summary}) + "\n"
+    except Exception as e:
+        logger.error("Batch aborted: %s", e)
+        yield dumps_str({"summary": summary, "error": str(e)}) + "\n"
+    finally:
+        if not supervisor.done():
+            supervisor.cancel()
+
+
+def error_record(index: int, filename: str, error: HTTPException) -> dict:
+    return {"index": index, "filename": filename, "status": "error",
+            "status_code": error.status_code, "error": error.detail}
+
+
+async def _flush(store_rows, rows) -> int:
+    if not rows:
+        return 0
+    try:
+        await run_in_threadpool(store_rows, rows)
+        return len(rows)
+    except Exception as e:
+        logger.error("Failed to store batch chunk of %s rows: %s", len(rows), e)
+        return 0
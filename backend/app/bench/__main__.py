@@ -0,0 +1,175 @@
+"""
+Open-loop load test for /analyze at a target request rate.
+
+Requests are started on a fixed schedule regardless of how long earlier ones
+take, so queueing and load shedding show up in the latency percentiles. By
+default the app runs in-process on a fresh SQLite file with the fake model
+backend; pass --url to load an already running server instead.
+
+    python -m app.bench --rps 20 --seconds 30 --latency 0.5
+    python -m app.bench --backend replay --recordings ./model_recordings
+    python -m app.bench --url http://localhost:8000 --rps 5
+"""
+import argparse
+import asyncio
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rps", type=float, default=10, help="target requests per second")
+    parser.add_argument("--seconds", type=float, default=20, help="duration of the run")
+    parser.add_argument("--images", type=int, default=32, help="distinct images to cycle through")
+    parser.add_argument("--url", help="load a running server instead of the in-process app")
+    parser.add_argument("--backend", choices=("fake", "replay"), default="fake")
+    parser.add_argument("--recordings", help="recordings directory for --backend replay")
+    parser.add_argument("--latency", type=float, default=0.5, help="median seconds per model call")
+    parser.add_argument("--latency-sigma", type=float, default=0.3,
+                        help="log-normal spread of the model latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="fraction of model calls that fail")
+    parser.add_argument("--straggler-rate", type=float, default=0.0,
+                        help="fraction of model calls that take 10x longer")
+    parser.add_argument("--cache", action="store_true", help="leave the result cache enabled")
+    parser.add_argument("--timeout", type=float, default=120, help="client timeout per request")
+    return parser.parse_args()
+
+
+def configure_app(args):
+    """
+    Settings are read at import time, so set them before importing the app
+    """
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/load.db")
+    os.environ["MODEL_BACKEND"] = args.backend
+    os.environ["FAKE_MODEL_LATENCY"] = str(args.latency)
+    os.environ["FAKE_MODEL_LATENCY_SIGMA"] = str(args.latency_sigma)
+    os.environ["FAKE_MODEL_FAILURE_RATE"] = str(args.failure_rate)
+    os.environ["FAKE_MODEL_STRAGGLER_RATE"] = str(args.straggler_rate)
+    os.environ.setdefault("FAKE_MODEL_SEED", "0")
+    # The sample frames are smooth noise, not photos; keep the gate out
+    os.environ.setdefault("FRAME_QUALITY_ENABLED", "false")
+    if args.recordings:
+        os.environ["MODEL_RECORDINGS_DIR"] = args.recordings
+    if not args.cache:
+        os.environ["RESULT_CACHE_ENABLED"] = "false"
+
+
+def sample_images(count: int, size=(1024, 768)):
+    """
+    Distinct noisy JPEGs; alternate dark and light corners so the fake
+    backend returns both packaged and raw results
+    """
+    from PIL import Image
+
+    payloads = []
+    for i in range(count):
+        noise = Image.effect_noise((size[0] // 16, size[1] // 16), 48 + i)
+        frame = noise.resize(size, Image.Resampling.BICUBIC).convert("RGB")
+        frame.paste((20, 20, 20) if i % 2 else (235, 235, 235), (0, 0, 32, 32))
+        buffer = io.BytesIO()
+        frame.save(buffer, "JPEG", quality=85)
+        payloads.append(buffer.getvalue())
+    return payloads
+
+
+def percentile(samples, pct):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def drive(client, args, payloads):
+    """
+    Start a request every 1/rps seconds and wait for all of them to finish
+    """
+    latencies, statuses, lags = [], {}, []
+    loop = asyncio.get_running_loop()
+    interval = 1 / args.rps
+    total = int(args.rps * args.seconds)
+
+    async def scan(payload):
+        start = time.perf_counter()
+        try:
+            response = await client.post(
+                "/analyze", files={"file": ("load.jpg", payload, "image/jpeg")}
+            )
+            status = response.status_code
+        except Exception as e:
+            status = type(e).__name__
+        latencies.append((status, time.perf_counter() - start))
+        statuses[status] = statuses.get(status, 0) + 1
+
+    tasks = []
+    start = loop.time()
+    for i in range(total):
+        scheduled = start + i * interval
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        lags.append(max(0.0, loop.time() - scheduled))
+        tasks.append(asyncio.create_task(scan(payloads[i % len(payloads)])))
+    await asyncio.gather(*tasks)
+    return latencies, statuses, lags, loop.time() - start
+
+
+def report(args, latencies, statuses, lags, elapsed):
+    ok = [seconds for status, seconds in latencies if status == 200]
+    print(f"target={args.rps:g} rps for {args.seconds:g}s  sent={len(latencies)}  "
+          f"wall={elapsed:.1f}s")
+    print(f"throughput: {len(latencies) / elapsed:.1f} req/s  "
+          f"successful: {len(ok) / elapsed:.1f} req/s")
+    print(f"status codes: {dict(sorted(statuses.items(), key=str))}")
+    for name, samples in (("200 latency", ok), ("all latency", [s for _, s in latencies])):
+        print(
+            f"{name}: p50={percentile(samples, 50) * 1000:.0f}ms "
+            f"p90={percentile(samples, 90) * 1000:.0f}ms "
+            f"p99={percentile(samples, 99) * 1000:.0f}ms "
+            f"max={max(samples, default=float('nan')) * 1000:.0f}ms"
+        )
+    # A lagging schedule means the generator itself could not keep up
+    print(f"schedule lag: p99={percentile(lags, 99) * 1000:.1f}ms")
+
+
+async def run(args):
+    import httpx
+
+    payloads = sample_images(args.images)
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=timeout, limits=limits) as client:
+            return await drive(client, args, payloads)
+
+    configure_app(args)
+    from app import main
+    from app.init_db import init_db
+
+    init_db()
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app), httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=timeout
+    ) as client:
+        results = await drive(client, args, payloads)
+    print(f"model backend: {args.backend}  engine: in_flight={main.analysis_engine.max_in_flight} "
+          f"queue={main.analysis_engine.max_queue}")
+    return results
+
+
+def main():
+    args = parse_args()
+    logging.disable(logging.INFO)
+    latencies, statuses, lags, elapsed = asyncio.run(run(args))
+    report(args, latencies, statuses, lags, elapsed)
+    return 0 if statuses.get(200) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Result cache benchmark: cold scans vs memory, perceptual and persistent hits.
+
+    python -m app.bench.cache --images 10 --latency 0.5
+"""
+import argparse
+import asyncio
+import io
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+# Synthetic frames are flat or smooth noise, not photos: keep the
+# frame-quality gate out of the measurement
+os.environ.setdefault("FRAME_QUALITY_ENABLED", "false")
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+)
+
+import httpx
+from PIL import Image, ImageEnhance
+
+from app import food_analyzer, main
+from app.bench.fakes import FakeModel
+from app.init_db import init_db
+
+
+def encode(image: Image.Image, quality: int = 90) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def sample_frames(count: int, size=(1280, 960)):
+    """
+    Distinct frames plus a near-duplicate of each (re-encoded, slightly brighter)
+    """
+    originals, near = [], []
+    for i in range(count):
+        noise = Image.effect_noise((size[0] // 16, size[1] // 16), 64 + i)
+        frame = noise.resize(size, Image.Resampling.BICUBIC).convert("RGB")
+        originals.append(encode(frame))
+        near.append(encode(ImageEnhance.Brightness(frame).enhance(1.03), quality=80))
+    return originals, near
+
+
+async def scan_all(client, payloads):
+    latencies = []
+    for payload in payloads:
+        start = time.perf_counter()
+        response = await client.post(
+            "/analyze", files={"file": ("bench.jpg", payload, "image/jpeg")}
+        )
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def run(args):
+    logging.disable(logging.INFO)
+    init_db()
+    model = FakeModel(args.latency)
+    food_analyzer.model = model
+    originals, near = sample_frames(args.images)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app), httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        phases = []
+        for name, payloads, clear_memory in (
+            ("cold (miss)", originals, False),
+            ("memory hit", originals, False),
+            ("perceptual hit", near, False),
+            ("persistent hit", originals, True),
+        ):
+            if clear_memory:
+                # Let write-behind persist the cold-scan rows first
+                while main.write_behind.depth:
+                    await asyncio.sleep(0.05)
+                main.result_cache.clear()
+            model.reset()
+            latencies = await scan_all(client, payloads)
+            phases.append((name, latencies, model.calls))
+
+    print(f"images={args.images} model_latency={args.latency}s")
+    for name, latencies, calls in phases:
+        print(
+            f"{name:<15} p50={statistics.median(latencies) * 1000:8.1f}ms "
+            f"max={max(latencies) * 1000:8.1f}ms model_calls={calls}"
+        )
+    print(f"cache stats: {main.result_cache.stats()}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per model call")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,108 @@
+"""
+Concurrency benchmark for /analyze against a stubbed slow model.
+
+Fires concurrent scans while probing /health, and reports p50/p99 latency
+for both so event-loop stalls show up as inflated /health numbers.
+
+    python -m app.bench.concurrency --requests 64 --latency 0.5
+"""
+import argparse
+import asyncio
+import io
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+# Synthetic frames are flat or smooth noise, not photos: keep the
+# frame-quality gate out of the measurement
+os.environ.setdefault("FRAME_QUALITY_ENABLED", "false")
+# Every request sends the same frame: keep the result cache and product
+# index from answering repeats, so the analysis path is what's measured
+os.environ["RESULT_CACHE_ENABLED"] = "false"
+os.environ["PRODUCT_INDEX_ENABLED"] = "false"
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+)
+
+import httpx
+from PIL import Image
+
+from app import food_analyzer, main
+from app.bench.fakes import FakeModel
+from app.database import Base, engine
+
+def percentile(samples, pct):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def sample_jpeg() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), (200, 120, 40)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+async def run(args):
+    logging.disable(logging.INFO)
+    Base.metadata.create_all(bind=engine)
+    food_analyzer.model = FakeModel(args.latency)
+    payload = sample_jpeg()
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        scan_latencies, health_latencies, statuses = [], [], {}
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def scan():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(
+                    "/analyze", files={"file": ("bench.jpg", payload, "image/jpeg")}
+                )
+                scan_latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def probe(done: asyncio.Event):
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/health")
+                health_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.05)
+
+        done = asyncio.Event()
+        prober = asyncio.create_task(probe(done))
+        start = time.perf_counter()
+        await asyncio.gather(*(scan() for _ in range(args.requests)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await prober
+
+    print(f"requests={args.requests} concurrency={args.concurrency} model_latency={args.latency}s")
+    print(f"in_flight_limit={main.analysis_engine.max_in_flight} queue_cap={main.analysis_engine.max_queue}")
+    print(f"wall time: {elapsed:.2f}s  throughput: {args.requests / elapsed:.1f} req/s")
+    print(f"status codes: {statuses}")
+    for name, samples in (("/analyze", scan_latencies), ("/health", health_latencies)):
+        print(
+            f"{name:<9} n={len(samples):<4} "
+            f"p50={percentile(samples, 50) * 1000:.1f}ms "
+            f"p99={percentile(samples, 99) * 1000:.1f}ms "
+            f"mean={statistics.fmean(samples) * 1000 if samples else float('nan'):.1f}ms"
+        )
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per model call")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,113 @@
+"""
+Database load test: concurrent scan inserts and history reads.
+
+Writer threads insert one scan per transaction (as /analyze does) while
+reader threads page /history, for a fixed duration. Compare the engine
+settings by overriding them, e.g. the pre-WAL SQLite defaults:
+
+    python -m app.bench.db_load --writers 8 --readers 8 --seconds 10
+    python -m app.bench.db_load --journal-mode DELETE --synchronous FULL
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--seed-rows", type=int, default=10_000)
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite file")
+    parser.add_argument("--journal-mode")
+    parser.add_argument("--synchronous")
+    parser.add_argument("--busy-timeout-ms")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # Engine settings are read at import time, so set them up front
+    os.environ.setdefault("GOOGLE_API_KEY", "bench")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/load.db"
+    for name, value in (("SQLITE_JOURNAL_MODE", args.journal_mode),
+                        ("SQLITE_SYNCHRONOUS", args.synchronous),
+                        ("SQLITE_BUSY_TIMEOUT_MS", args.busy_timeout_ms)):
+        if value is not None:
+            os.environ[name] = value
+
+    from app import database, main as app_main
+    from app.bench.fakes import PACKAGED_RESULT
+    from app.bench.history import seed
+    from app.init_db import init_db
+
+    init_db()
+    seed(args.seed_rows)
+
+    counts = {"writes": 0, "reads": 0, "write_errors": 0, "read_errors": 0, "locked": 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def bump(name: str, error: Exception = None):
+        with lock:
+            counts[name] += 1
+            if error is not None and "locked" in str(error):
+                counts["locked"] += 1
+
+    def writer(worker: int):
+        while not stop.is_set():
+            db = database.SessionLocal()
+            try:
+                app_main.store_scan(db, f"load-{worker}.jpg", PACKAGED_RESULT)
+                bump("writes")
+            except Exception as e:
+                bump("write_errors", e)
+            finally:
+                db.close()
+
+    def reader():
+        while not stop.is_set():
+            db = database.SessionLocal()
+            try:
+                app_main.history_page(db, limit=50)
+                bump("reads")
+            except Exception as e:
+                bump("read_errors", e)
+            finally:
+                db.close()
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    with database.engine.connect() as connection:
+        dialect = connection.dialect.name
+        if dialect == "sqlite":
+            raw = connection.connection.dbapi_connection
+            journal = raw.execute("PRAGMA journal_mode").fetchone()[0]
+            synchronous = raw.execute("PRAGMA synchronous").fetchone()[0]
+            settings = f"journal_mode={journal} synchronous={synchronous}"
+        else:
+            settings = f"pool_size={database.engine.pool.size()}"
+
+    print(f"{dialect} {settings} writers={args.writers} readers={args.readers} "
+          f"seconds={elapsed:.1f}")
+    print(f"inserts/s={counts['writes'] / elapsed:.1f} reads/s={counts['reads'] / elapsed:.1f} "
+          f"write_errors={counts['write_errors']} read_errors={counts['read_errors']} "
+          f"locked={counts['locked']}")
+    return 1 if counts["write_errors"] or counts["read_errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Fake Gemini models and result documents shared by the benchmarks.
+"""
+import random
+
+from app.model_backend import (  # noqa: F401
+    PACKAGED_RESULT,
+    RAW_RESULT,
+    FakeBackend as FakeModel,
+    ModelResponse as FakeResponse,
+    is_packaged,
+)
+
+
+MACRONUTRIENTS = [
+    ("total_fat", "g"), ("saturated_fat", "g"), ("trans_fat", "g"),
+    ("polyunsaturated_fat", "g"), ("monounsaturated_fat", "g"), ("cholesterol", "mg"),
+    ("sodium", "mg"), ("total_carbohydrates", "g"), ("dietary_fiber", "g"),
+    ("total_sugars", "g"), ("added_sugars", "g"), ("protein", "g"),
+]
+MICRONUTRIENTS = [
+    ("vitamin_a", "mcg"), ("vitamin_c", "mg"), ("vitamin_d", "mcg"), ("vitamin_e", "mg"),
+    ("vitamin_k", "mcg"), ("thiamin", "mg"), ("riboflavin", "mg"), ("niacin", "mg"),
+    ("vitamin_b6", "mg"), ("folate", "mcg"), ("vitamin_b12", "mcg"), ("biotin", "mcg"),
+    ("pantothenic_acid", "mg"), ("calcium", "mg"), ("iron", "mg"), ("phosphorus", "mg"),
+    ("iodine", "mcg"), ("magnesium", "mg"), ("zinc", "mg"), ("selenium", "mcg"),
+    ("copper", "mg"), ("manganese", "mg"), ("potassium", "mg"),
+]
+INGREDIENTS = [
+    "whole grain oats", "brown rice syrup", "roasted peanuts", "cane sugar", "palm kernel oil",
+    "soy protein isolate", "inulin", "almonds", "dried cranberries", "honey", "sea salt",
+    "natural flavors", "sunflower lecithin", "cocoa", "vanilla extract", "tocopherols",
+    "rice flour", "glycerin", "calcium carbonate", "zinc oxide", "niacinamide",
+    "reduced iron", "pyridoxine hydrochloride", "folic acid",
+]
+
+
+def full_label(rng: random.Random) -> dict:
+    """
+    Packaged result with a complete nutrition panel
+    """
+    def panel(nutrients):
+        return {
+            name: {"amount": str(round(rng.uniform(0, 300), 1)), "unit": unit,
+                   "daily_value": str(rng.randint(0, 100))}
+            for name, unit in nutrients
+        }
+
+    return {
+        "product_info": {"product_name": f"Protein Crunch Bar {rng.randint(1, 999)}",
+                         "brand": rng.choice(["Acme", "Nature's Path", "Café Délice"]),
+                         "package_size": "12 x 40g"},
+        "nutrition_facts": {
+            "serving_size": {"amount": "40", "unit": "g", "servings_per_container": "12"},
+            "calories": str(rng.randint(120, 320)),
+            "macronutrients": panel(MACRONUTRIENTS),
+            "vitamins_minerals": panel(MICRONUTRIENTS),
+        },
+        "ingredients": rng.sample(INGREDIENTS, 18),
+        "allergens": ["peanuts", "almonds", "soy"],
+        "dietary_info": {"is_vegetarian": True, "is_vegan": False, "is_gluten_free": False},
+        "storage_instructions": "Store in a cool, dry place. Best before date on wrapper.",
+        "manufacturer_info": "Manufactured in a facility that also processes milk, eggs and wheat.",
+    }
+
+
+def raw_foods(rng: random.Random, items: int = 3) -> dict:
+    """
+    Raw-food result in the loose string format the model tends to return
+    """
+    foods = rng.sample(["apple", "banana", "broccoli", "salmon fillet", "avocado",
+                        "brown rice", "spinach", "almonds"], items)
+    return {
+        "food_identification": {"items": foods, "total_items": len(foods)},
+        "nutritional_info": [
+            {
+                "food_name": food,
+                "serving_size": "1 medium (182g)",
+                "nutrition_facts": {
+                    "calories": f"{rng.randint(30, 250)} kcal",
+                    "macronutrients": {
+                        "protein": f"{rng.uniform(0, 25):.1f}g",
+                        "carbohydrates": f"{rng.randint(0, 40)}-{rng.randint(41, 50)}g",
+                        "fiber": rng.choice(["<1g", "2.4 g", "4g"]),
+                        "sugars": f"{rng.uniform(0, 20):.1f} g",
+                        "total_fat": rng.choice(["0.3g", "trace", "15 g"]),
+                    },
+                    "vitamins_minerals": {
+                        "vitamin_c": f"{rng.randint(0, 100)}% DV",
+                        "vitamin_a": f"{rng.randint(0, 500)} mcg",
+                        "potassium": f"{rng.randint(100, 600)}mg",
+                        "calcium": f"{rng.randint(0, 20)}%",
+                    },
+                },
+                "health_benefits": ["Good source of fiber", "Rich in antioxidants"],
+                "storage_tips": ["Refrigerate to keep fresh"],
+            }
+            for food in foods
+        ],
+        "combination_suggestions": ["Pair with yogurt"],
+        "seasonal_info": {},
+    }
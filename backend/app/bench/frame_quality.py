@@ -0,0 +1,139 @@
+"""
+Frame-quality gate benchmark: cost per megapixel and verdicts on synthetic
+frames.
+
+Times FrameGate.check on frames of several sizes (prepared uploads are at
+most IMAGE_MAX_EDGE on the long side; larger sizes show how the cost
+scales), then measures a set of synthetic captures (a printed label, a
+textured food photo, both with camera-shake blur, dark, overexposed and
+blank frames) and prints the gate's verdict next to what it should be.
+
+    python -m app.bench.frame_quality --runs 50
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+
+from app.config import (
+    FRAME_QUALITY_MAX_BRIGHT_SHARE,
+    FRAME_QUALITY_MAX_DARK_SHARE,
+    FRAME_QUALITY_MAX_EDGE,
+    FRAME_QUALITY_MIN_ENTROPY,
+    FRAME_QUALITY_MIN_SHARPNESS,
+)
+from app.frame_quality import FrameGate, FrameRejected, measure
+
+SIZES = [(640, 480), (1024, 768), (1536, 1152), (2048, 1536), (4032, 3024)]
+
+
+def label_photo(size) -> Image.Image:
+    """
+    Nutrition-label-like frame: rows of dark text on a light panel over a
+    noisy background
+    """
+    rng = random.Random(1)
+    width, height = size
+    image = Image.effect_noise(size, 40).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((width // 8, height // 10, width * 7 // 8, height * 9 // 10), fill="white")
+    step = max(12, height // 40)
+    for y in range(height // 10 + step, height * 9 // 10 - step, step):
+        x = width // 8 + step
+        while x < width * 3 // 4:
+            word = "".join(rng.choice("Total Fat Sodium Protein 12g 5% ") for _ in range(6))
+            draw.text((x, y), word, fill="black")
+            x += len(word) * 7 + 10
+        draw.line((width // 8, y + step - 2, width * 7 // 8, y + step - 2), fill="black")
+    return image
+
+
+def food_photo(size) -> Image.Image:
+    """
+    Produce-like frame: smooth shaded blobs with fine surface texture
+    """
+    rng = random.Random(2)
+    image = Image.linear_gradient("L").resize(size).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    width, height = size
+    for _ in range(12):
+        x, y, r = rng.randrange(width), rng.randrange(height), rng.randint(width // 20, width // 6)
+        color = tuple(rng.randint(60, 220) for _ in range(3))
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=color, outline="black", width=3)
+    texture = Image.effect_noise(size, 25).convert("RGB")
+    return Image.blend(image, texture, 0.25)
+
+
+def samples(size) -> list:
+    """
+    (name, image, expected verdict)
+    """
+    label, food = label_photo(size), food_photo(size)
+    shake = max(size) / 200  # blur radius relative to the frame, like camera shake
+    return [
+        ("label", label, "ok"),
+        ("food", food, "ok"),
+        ("label, slight blur", label.filter(ImageFilter.GaussianBlur(shake / 4)), "ok"),
+        ("label, shaken", label.filter(ImageFilter.GaussianBlur(shake)), "blurry"),
+        ("food, shaken", food.filter(ImageFilter.GaussianBlur(shake)), "blurry"),
+        ("label, dim", ImageEnhance.Brightness(label).enhance(0.35), "ok"),
+        ("label, dark", ImageEnhance.Brightness(label).enhance(0.08), "too_dark"),
+        ("label, bright", ImageEnhance.Brightness(label).enhance(4.0), "ok"),
+        ("label, washed out", Image.blend(label, Image.new("RGB", size, "white"), 0.9),
+         "overexposed"),
+        ("lens cap", Image.effect_noise(size, 3).point(lambda v: v // 12).convert("RGB"),
+         "too_dark"),
+        ("blank wall", Image.effect_noise(size, 2).point(lambda v: 150 + v // 40).convert("RGB"),
+         "low_detail"),
+    ]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    gate = FrameGate(FRAME_QUALITY_MIN_SHARPNESS, FRAME_QUALITY_MAX_DARK_SHARE,
+                     FRAME_QUALITY_MAX_BRIGHT_SHARE, FRAME_QUALITY_MIN_ENTROPY,
+                     FRAME_QUALITY_MAX_EDGE)
+    measure(label_photo((64, 64)))  # import NumPy outside the timings
+
+    print(f"gate cost (measured at <= {gate.max_edge}px, median of {args.runs})")
+    for size in SIZES:
+        image = label_photo(size)
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            try:
+                gate.check(image)
+            except FrameRejected:
+                pass
+            timings.append(time.perf_counter() - start)
+        elapsed = statistics.median(timings) * 1000
+        megapixels = size[0] * size[1] / 1e6
+        print(f"  {size[0]:>4}x{size[1]:<4} {megapixels:5.1f}MP  {elapsed:6.2f}ms  "
+              f"{elapsed / megapixels:6.2f}ms/MP")
+
+    size = (1536, 1152)
+    print(f"\nverdicts at {size[0]}x{size[1]} with {gate.thresholds}")
+    print(f"  {'frame':<20} {'sharpness':>10} {'bright':>7} {'dark%':>6} {'white%':>7} "
+          f"{'entropy':>8}  verdict")
+    wrong = 0
+    for name, image, expected in samples(size):
+        quality = measure(image, gate.max_edge)
+        verdict = gate.reason(quality) or "ok"
+        wrong += verdict != expected
+        flag = "" if verdict == expected else f"  (expected {expected})"
+        print(f"  {name:<20} {quality.sharpness:>10.1f} {quality.brightness:>7.1f} "
+              f"{quality.dark_share:>6.1%} {quality.bright_share:>7.1%} "
+              f"{quality.entropy:>8.2f}  {verdict}{flag}")
+    print(f"\n{wrong} unexpected verdicts")
+
+
+if __name__ == "__main__":
+    main_cli()
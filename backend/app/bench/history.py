@@ -0,0 +1,111 @@
+"""
+/history benchmark: full-table load vs keyset pages over a large table.
+
+Seeds a fresh SQLite database with realistic scan rows, then compares the
+old query (every row, every scan_result blob) against summary and full
+pages, reporting latency and peak Python memory.
+
+    python -m app.bench.history --rows 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+)
+
+from sqlalchemy import insert
+
+from app import main
+from app.bench.fakes import PACKAGED_RESULT, RAW_RESULT
+from app.database import SessionLocal, engine
+from app.init_db import init_db
+from app.models import FoodScan
+from app.nutrients import extract_nutrients
+
+
+def seed(rows: int, chunk: int = 5000):
+    start = datetime.utcnow() - timedelta(minutes=rows)
+    with engine.begin() as connection:
+        for offset in range(0, rows, chunk):
+            batch = []
+            for i in range(offset, min(offset + chunk, rows)):
+                packaged = i % 3 != 0
+                result = PACKAGED_RESULT if packaged else RAW_RESULT
+                batch.append({
+                    "image_path": f"scan-{i}.jpg",
+                    "scan_result": result,
+                    # Several scans share a timestamp to exercise the id tiebreak
+                    "created_at": start + timedelta(minutes=i // 4),
+                    "food_type": "packaged" if packaged else "raw",
+                    **extract_nutrients(result),
+                })
+            connection.execute(insert(FoodScan), batch)
+
+
+def legacy_history():
+    db = SessionLocal()
+    try:
+        scans = db.query(FoodScan).order_by(FoodScan.created_at.desc()).all()
+        return [
+            {
+                "id": scan.id,
+                "image_path": scan.image_path,
+                "scan_result": scan.scan_result,
+                "created_at": scan.created_at,
+                "food_type": scan.food_type
+            }
+            for scan in scans
+        ]
+    finally:
+        db.close()
+
+
+def deep_page(limit: int, pages: int, include: str = None):
+    cursor = None
+    db = SessionLocal()
+    try:
+        for _ in range(pages):
+            page = main.history_page(db, limit, cursor, full=include == "full")
+            cursor = page["next_cursor"]
+    finally:
+        db.close()
+    return page
+
+
+def measure(name: str, func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<32} {elapsed * 1000:10.1f}ms  peak={peak / 1024 / 1024:8.2f}MB")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    init_db()
+    start = time.perf_counter()
+    seed(args.rows)
+    print(f"seeded {args.rows} rows in {time.perf_counter() - start:.1f}s")
+
+    if not args.skip_legacy:
+        measure("legacy: all rows + blobs", legacy_history)
+    measure("first page (summary)", deep_page, args.limit, 1)
+    measure("first page (include=full)", deep_page, args.limit, 1, "full")
+    measure("20 pages deep (summary)", deep_page, args.limit, 20)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,121 @@
+"""
+Result parsing and insight throughput: raw-dict insights vs typed results.
+
+Compares over a mix of full-label packaged results and loosely formatted
+raw-food results:
+
+- legacy: the old generate_health_insights, walking the dicts with float()
+  inside a try/except (counts how many scans it silently gave up on); it
+  reads five fields, so it is not a like-for-like speed baseline for
+  parse_result, which parses every nutrient on the label
+- parse: parse_result into the slotted result models
+- typed: analysis_summary + health_insights per parsed scan
+- batch: score_batch over every parsed scan at once (gathering the
+  nutrient matrix is a Python pass; the rules then run as array operations)
+
+and checks the batch scores and flags agree with the per-scan functions.
+
+    python -m app.bench.insights --scans 20000
+"""
+import argparse
+import gc
+import os
+import random
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+
+import numpy as np
+
+from app import insights
+from app.bench.fakes import full_label, raw_foods
+from app.result_models import parse_result
+
+
+def legacy_insights(result):
+    # generate_health_insights before typed results, kept for comparison
+    out = {"dietary_considerations": [], "nutrient_density_score": 0,
+           "health_benefits": [], "consumption_tips": []}
+    if "product_info" in result:
+        try:
+            nutrition = result["nutrition_facts"]
+            protein = float(nutrition["macronutrients"]["protein"]["amount"])
+            carbs = float(nutrition["macronutrients"]["total_carbohydrates"]["amount"])
+            fat = float(nutrition["macronutrients"]["total_fat"]["amount"])
+            total = protein + carbs + fat
+            if total > 0:
+                out["macro_distribution"] = {
+                    "protein_percentage": round(protein / total * 100, 1),
+                    "carbs_percentage": round(carbs / total * 100, 1),
+                    "fat_percentage": round(fat / total * 100, 1),
+                }
+            sugar = float(nutrition["macronutrients"]["total_sugars"]["amount"])
+            if sugar > 10:
+                out["dietary_considerations"].append("High in sugar")
+            sodium = float(nutrition["macronutrients"]["sodium"]["amount"])
+            if sodium > 400:
+                out["dietary_considerations"].append("High in sodium")
+            if result["allergens"]:
+                out["dietary_considerations"].append(
+                    f"Contains allergens: {', '.join(result['allergens'])}"
+                )
+        except Exception:
+            out["dietary_considerations"].append("Unable to complete full nutritional analysis")
+    else:
+        try:
+            for item in result["nutritional_info"]:
+                out["health_benefits"].extend(item["health_benefits"])
+                protein = float(item["nutrition_facts"]["macronutrients"]["protein"].replace("g", ""))
+                carbs = float(item["nutrition_facts"]["macronutrients"]["carbohydrates"].replace("g", ""))
+                out.setdefault("ratios", []).append(protein / carbs if carbs else None)
+        except Exception:
+            out["dietary_considerations"].append("Unable to complete full nutritional analysis")
+    return out
+
+
+def timed(label: str, func, count: int):
+    start = time.perf_counter()
+    value = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed * 1000:9.1f}ms  {count / elapsed:11,.0f} scans/s")
+    return value
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scans", type=int, default=20_000)
+    parser.add_argument("--raw-share", type=float, default=0.4)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    docs = [raw_foods(rng) if rng.random() < args.raw_share else full_label(rng)
+            for _ in range(args.scans)]
+    n = len(docs)
+    print(f"{n} scans ({args.raw_share:.0%} raw foods)\n")
+    # Keep the cyclic GC from rescanning the input documents on every pass
+    gc.collect()
+    gc.freeze()
+
+    legacy = timed("legacy dict insights", lambda: [legacy_insights(d) for d in docs], n)
+    parsed = timed("parse_result", lambda: [parse_result(d) for d in docs], n)
+    timed("typed summary + insights per scan",
+          lambda: [(insights.analysis_summary(p), insights.health_insights(p)) for p in parsed], n)
+    batch = timed("score_batch", lambda: insights.score_batch(parsed), n)
+    timed("parse + score_batch",
+          lambda: insights.score_batch([parse_result(d) for d in docs]), n)
+
+    failed = sum("Unable to complete full nutritional analysis" in r["dietary_considerations"]
+                 for r in legacy)
+    print(f"\nlegacy gave up on {failed}/{n} scans")
+
+    scores = np.array([insights.health_score(p) for p in parsed])
+    matched = [{text for text, _ in insights.considerations(p)} for p in parsed]
+    flags = [{rule[3] for rule, hit in zip(insights.THRESHOLD_RULES, row) if hit}
+             for row in batch["flags"]]
+    score_gap = np.abs(scores - batch["health_score"]).max()
+    print(f"batch vs per-scan: max score difference {score_gap:.2f}, "
+          f"flag mismatches {sum(a != b for a, b in zip(matched, flags))}")
+
+
+if __name__ == "__main__":
+    main_cli()
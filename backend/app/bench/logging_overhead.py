@@ -0,0 +1,151 @@
+"""
+Per-request logging overhead on /analyze, legacy setup vs the queued logger.
+
+Each mode serves the same sequential scans (fake model, no latency, cache
+off), interleaved in rounds to cancel drift, with logs written to a temp
+file whose writes take --write-latency-ms (a slow pipe or log collector).
+Modes are compared against a run with logging disabled:
+
+- legacy: synchronous handler at DEBUG and every raw model response logged
+  whole, like the old basicConfig(DEBUG) + print
+- queued: JSON records via the queue listener at INFO
+- queued-debug: queue listener at DEBUG with payloads sampled and truncated
+
+    python -m app.bench.logging_overhead --requests 300 --write-latency-ms 1
+"""
+import argparse
+import asyncio
+import io
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+# Synthetic frames are flat or smooth noise, not photos: keep the
+# frame-quality gate out of the measurement
+os.environ.setdefault("FRAME_QUALITY_ENABLED", "false")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ["MODEL_BACKEND"] = "fake"
+os.environ["FAKE_MODEL_LATENCY"] = "0"
+os.environ["RESULT_CACHE_ENABLED"] = "false"
+
+import httpx
+from PIL import Image
+
+from app import food_analyzer, main
+from app.config import LOG_PAYLOAD_MAX_CHARS, LOG_PAYLOAD_SAMPLE_RATE
+from app.init_db import init_db
+from app.logging_config import configure_logging, stop_logging
+
+
+class SlowSink(io.TextIOWrapper):
+    """
+    Text file whose every write takes ``delay`` seconds
+    """
+
+    def __init__(self, delay: float):
+        super().__init__(tempfile.TemporaryFile(), write_through=True)
+        self.delay = delay
+        self.written = 0
+
+    def write(self, text):
+        if self.delay:
+            time.sleep(self.delay)
+        self.written += len(text)
+        return super().write(text)
+
+
+def sample_jpeg() -> bytes:
+    buffer = io.BytesIO()
+    noise = Image.effect_noise((40, 30), 64).resize((320, 240)).convert("RGB")
+    noise.save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def setup(mode: str, log_file):
+    """
+    Configure logging for ``mode``; returns the payload (sample rate, max chars)
+    """
+    stop_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    logging.disable(logging.NOTSET)
+
+    if mode == "off":
+        logging.disable(logging.CRITICAL)
+        return 0.0, 0
+    if mode == "legacy":
+        handler = logging.StreamHandler(log_file)
+        handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+        root.addHandler(handler)
+        root.setLevel(logging.DEBUG)
+        return 1.0, 0
+    if mode == "queued":
+        configure_logging("INFO", "json", stream=log_file)
+        return LOG_PAYLOAD_SAMPLE_RATE, LOG_PAYLOAD_MAX_CHARS
+    configure_logging("DEBUG", "json", stream=log_file)
+    return LOG_PAYLOAD_SAMPLE_RATE, LOG_PAYLOAD_MAX_CHARS
+
+
+async def measure(client, payload: bytes, requests: int):
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await client.post("/analyze", files={"file": ("bench.jpg", payload, "image/jpeg")})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def run(args):
+    init_db()
+    payload = sample_jpeg()
+    modes = ("off", "legacy", "queued", "queued-debug")
+    results = {mode: ([], 0) for mode in modes}
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app), httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        await measure(client, payload, 20)  # warm up
+        per_round = max(1, args.requests // args.rounds)
+        for _ in range(args.rounds):
+            for mode in modes:
+                sink = SlowSink(args.write_latency_ms / 1000)
+                rate, max_chars = setup(mode, sink)
+                # The bench client's own request logs are not part of the app
+                logging.getLogger("httpx").setLevel(logging.WARNING)
+                food_analyzer.LOG_PAYLOAD_SAMPLE_RATE = rate
+                food_analyzer.LOG_PAYLOAD_MAX_CHARS = max_chars
+                latencies = await measure(client, payload, per_round)
+                stop_logging()  # drains the queue before the sink closes
+                results[mode][0].extend(latencies)
+                results[mode] = (results[mode][0], results[mode][1] + sink.written)
+                sink.close()
+        setup("off", None)
+
+    baseline = statistics.fmean(results["off"][0])
+    print(f"requests={per_round * args.rounds} per mode, "
+          f"sink write latency={args.write_latency_ms}ms")
+    for mode, (latencies, log_bytes) in results.items():
+        mean = statistics.fmean(latencies)
+        print(
+            f"{mode:<13} mean={mean * 1000:6.2f}ms p50={statistics.median(latencies) * 1000:6.2f}ms "
+            f"overhead={(mean - baseline) * 1000:+6.2f}ms/req "
+            f"log_bytes/req={log_bytes / len(latencies):7.0f}"
+        )
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--write-latency-ms", type=float, default=1.0,
+                        help="time each log write takes")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
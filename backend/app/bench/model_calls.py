@@ -0,0 +1,83 @@
+"""
+Compare model round-trips per scan for the single-pass and two-step flows.
+
+Runs the same set of packaged and raw images through analyze_food_image
+with a fake model that counts calls and bytes uploaded, and fails if the
+single-pass flow stops beating the two-step flow.
+
+    python -m app.bench.model_calls --images 20 --latency 0.3
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+
+from PIL import Image
+
+from app import food_analyzer
+from app.bench.fakes import FakeModel
+
+
+def sample_images(count: int, size=(1280, 960)):
+    noise = Image.effect_noise(size, 48).convert("RGB")
+    images = []
+    for i in range(count):
+        # Alternate dark (packaged) and light (raw) frames; noise keeps the
+        # encoded size close to a real photo instead of a flat colour
+        colour = (30, 30, 30) if i % 2 == 0 else (220, 200, 160)
+        images.append(Image.blend(Image.new("RGB", size, colour), noise, 0.2))
+    return images
+
+
+def measure(mode: str, images, model: FakeModel):
+    model.reset()
+    start = time.perf_counter()
+    for image in images:
+        result = food_analyzer.analyze_food_image(image, mode=mode)
+        if "error" in result:
+            raise RuntimeError(f"{mode} analysis failed: {result['error']}")
+    elapsed = time.perf_counter() - start
+    return {
+        "calls": model.calls,
+        "bytes": model.bytes_uploaded,
+        "seconds": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds per model call")
+    args = parser.parse_args()
+
+    model = FakeModel(args.latency)
+    food_analyzer.model = model
+    images = sample_images(args.images)
+
+    results = {mode: measure(mode, images, model) for mode in ("two_step", "single_pass")}
+
+    print(f"images={args.images} model_latency={args.latency}s")
+    for mode, stats in results.items():
+        print(
+            f"{mode:<12} calls/scan={stats['calls'] / args.images:.2f} "
+            f"KB uploaded/scan={stats['bytes'] / args.images / 1024:.1f} "
+            f"latency/scan={stats['seconds'] / args.images * 1000:.1f}ms"
+        )
+
+    two_step, single_pass = results["two_step"], results["single_pass"]
+    failures = []
+    if single_pass["calls"] != args.images:
+        failures.append(f"single_pass made {single_pass['calls']} calls for {args.images} images")
+    if single_pass["calls"] * 2 != two_step["calls"]:
+        failures.append("two_step should make exactly two calls per image")
+    if single_pass["bytes"] >= two_step["bytes"]:
+        failures.append("single_pass uploaded as many bytes as two_step")
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Preprocessing benchmark over a corpus of large synthetic phone photos.
+
+Compares the old path (full decode, PIL image handed to the SDK, which
+uploads it as lossless WebP) with prepare_image (draft decode, EXIF
+transpose, downscale, lossy re-encode).
+
+    python -m app.bench.preprocessing --images 5 --size 4032x3024
+"""
+import argparse
+import io
+import os
+import statistics
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+
+from PIL import Image
+from google.generativeai.types.content_types import image_to_blob
+
+from app.config import IMAGE_MAX_EDGE, IMAGE_UPLOAD_FORMAT, IMAGE_UPLOAD_QUALITY
+from app.preprocessing import prepare_image
+
+
+def synthetic_photo(size, seed: int) -> bytes:
+    """
+    Camera-like JPEG: smooth gradients plus sensor noise, rotated via EXIF
+    """
+    width, height = size
+    base = Image.linear_gradient("L").resize(size).convert("RGB")
+    noise = Image.effect_noise((width // 4, height // 4), 30 + seed).resize(size).convert("RGB")
+    photo = Image.blend(base, noise, 0.35)
+
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90 CW
+    exif[0x010F] = "Bench Camera"
+    buffer = io.BytesIO()
+    photo.save(buffer, "JPEG", quality=92, exif=exif)
+    return buffer.getvalue()
+
+
+def old_path(contents: bytes):
+    start = time.perf_counter()
+    image = Image.open(io.BytesIO(contents))
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    image.load()
+    decode = time.perf_counter() - start
+    start = time.perf_counter()
+    upload = len(image_to_blob(image).data)
+    encode = time.perf_counter() - start
+    return decode, encode, upload, image.size[0] * image.size[1]
+
+
+def new_path(contents: bytes, max_edge: int, image_format: str, quality: int):
+    start = time.perf_counter()
+    prepared = prepare_image(contents, max_edge, image_format, quality)
+    elapsed = time.perf_counter() - start
+    return elapsed, len(prepared.data), prepared.image.size[0] * prepared.image.size[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=5)
+    parser.add_argument("--size", default="4032x3024")
+    parser.add_argument("--max-edge", type=int, default=IMAGE_MAX_EDGE)
+    parser.add_argument("--format", default=IMAGE_UPLOAD_FORMAT)
+    parser.add_argument("--quality", type=int, default=IMAGE_UPLOAD_QUALITY)
+    args = parser.parse_args()
+
+    size = tuple(int(v) for v in args.size.split("x"))
+    corpus = [synthetic_photo(size, seed) for seed in range(args.images)]
+
+    old = [old_path(contents) for contents in corpus]
+    new = [new_path(contents, args.max_edge, args.format, args.quality) for contents in corpus]
+
+    avg_input = statistics.fmean(len(c) for c in corpus) / 1024
+    print(f"images={args.images} size={args.size} input={avg_input:.0f}KB "
+          f"max_edge={args.max_edge} format={args.format} quality={args.quality}")
+    print(
+        f"old: decode={statistics.fmean(o[0] for o in old) * 1000:.1f}ms "
+        f"sdk_encode={statistics.fmean(o[1] for o in old) * 1000:.1f}ms "
+        f"upload={statistics.fmean(o[2] for o in old) / 1024:.0f}KB "
+        f"pixels={statistics.fmean(o[3] for o in old) / 1e6:.2f}MP"
+    )
+    print(
+        f"new: prepare={statistics.fmean(n[0] for n in new) * 1000:.1f}ms "
+        f"upload={statistics.fmean(n[1] for n in new) / 1024:.0f}KB "
+        f"pixels={statistics.fmean(n[2] for n in new) / 1e6:.2f}MP"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Product index benchmark: match quality and cost on catalog-heavy traffic.
+
+Indexes a synthetic catalog, then replays scans where ``--repeat-share``
+are known products identified the way a model tends to vary (case, word
+order, brand repeated in the name, package size, a dropped letter, missing
+brand, sometimes a barcode) and the rest are new products, many of them
+other flavors of catalog products that must not match. Reports:
+
+- lookup latency and hit rate on repeats
+- wrong-product matches (repeats matched to another product, new products
+  matched at all)
+- model output per scan with and without the index, in characters of
+  JSON, when identifying with the model (PRODUCT_INDEX_IDENTIFY_WITH_MODEL:
+  identify answer on every scan plus a full extraction on misses, versus a
+  full extraction on every scan)
+
+    python -m app.bench.product_index --catalog 5000 --scans 20000
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+
+from app.bench.fakes import full_label
+from app.food_analyzer import COMBINED_PROMPT, IDENTIFY_PROMPT
+from app.product_index import ProductIndex, product_key
+
+BRANDS = [
+    "Acme", "Kellogg's", "General Mills", "Nature's Path", "Café Délice", "Quaker", "Kind",
+    "Clif", "Nestlé", "Danone", "Chobani", "Ben & Jerry's", "Lay's", "Pringles", "Barilla",
+    "Annie's", "Kashi", "Bob's Red Mill", "Trader Joe's", "Oatly", "Siggi's", "RXBAR",
+    "Larabar", "Nabisco", "Pepperidge Farm", "Häagen-Dazs", "Lindt", "Ghirardelli",
+]
+BASES = [
+    "Protein Bar", "Granola", "Greek Yogurt", "Potato Chips", "Corn Flakes", "Oat Milk",
+    "Almond Butter", "Crackers", "Cookies", "Ice Cream", "Pasta Sauce", "Trail Mix",
+    "Rice Cakes", "Energy Bar", "Instant Oatmeal", "Peanut Butter", "Dark Chocolate",
+    "Breakfast Cereal", "Veggie Straws", "Pretzels",
+]
+FLAVORS = [
+    "Vanilla", "Chocolate", "Strawberry", "Sea Salt", "Honey Nut", "Salted Caramel",
+    "Peanut Butter", "Blueberry", "Cinnamon", "Original", "Mint", "Coconut", "Maple",
+    "Barbecue", "Sour Cream Onion", "Cookies Cream", "Lemon", "Raspberry", "Mocha",
+    "Apple Cinnamon", "Double Chocolate", "Banana", "Matcha", "Pumpkin Spice",
+]
+SIZES = ["40g", "12 x 40 g", "500ml", "16 oz", "1.5 L", "8 ct"]
+
+
+def make_products(rng: random.Random, count: int, taken: set) -> list:
+    """
+    ``count`` distinct (name, brand, barcode) not already in ``taken``
+    """
+    products = []
+    while len(products) < count:
+        name = f"{rng.choice(FLAVORS)} {rng.choice(BASES)}"
+        if rng.random() < 0.15:
+            name += f" {rng.randint(2, 40)}"
+        brand = rng.choice(BRANDS)
+        key = product_key(name, brand)
+        if key in taken:
+            continue
+        taken.add(key)
+        products.append((name, brand, gtin(rng)))
+    return products
+
+
+def gtin(rng: random.Random) -> str:
+    body = [rng.randrange(10) for _ in range(12)]
+    total = sum(digit * (3 if i % 2 else 1) for i, digit in enumerate(body))
+    return "".join(map(str, body)) + str((10 - total % 10) % 10)
+
+
+def identify_like_model(rng: random.Random, product: tuple, barcode_share: float) -> dict:
+    """
+    The identify answer for ``product``, varied the way repeat photos vary
+    """
+    name, brand, barcode = product
+    words = name.split()
+    if rng.random() < 0.3:
+        rng.shuffle(words)
+    if rng.random() < 0.2:
+        words.insert(0, brand)
+    if rng.random() < 0.2:
+        words.append(rng.choice(SIZES))
+    if rng.random() < 0.15:
+        # A dropped trailing letter ("Cookie" for "Cookies")
+        i = rng.randrange(len(words))
+        if len(words[i]) > 4 and words[i].isalpha():
+            words[i] = words[i][:-1]
+    name = " ".join(words)
+    name = rng.choice([name, name.upper(), name.lower(), name.title()])
+    if rng.random() < 0.3:
+        brand = brand.replace("'", "").replace("é", "e")
+    return {
+        "product_name": name,
+        "brand": brand if rng.random() > 0.1 else "",
+        "barcode": barcode if rng.random() < barcode_share else "",
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--catalog", type=int, default=5000)
+    parser.add_argument("--scans", type=int, default=20_000)
+    parser.add_argument("--repeat-share", type=float, default=0.8)
+    parser.add_argument("--barcode-share", type=float, default=0.2)
+    parser.add_argument("--min-similarity", type=float, default=0.8)
+    parser.add_argument("--min-margin", type=float, default=0.1)
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    taken = set()
+    catalog = make_products(rng, args.catalog, taken)
+    index = ProductIndex(args.min_similarity, args.min_margin)
+    start = time.perf_counter()
+    for scan_id, (name, brand, barcode) in enumerate(catalog):
+        index.add(name, brand, barcode, scan_id=scan_id)
+    print(f"indexed {len(index)} products in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    repeats = int(args.scans * args.repeat_share)
+    new_products = make_products(rng, args.scans - repeats, taken)
+    scans = [(product, True) for product in rng.choices(catalog, k=repeats)]
+    scans += [(product, False) for product in new_products]
+    rng.shuffle(scans)
+    queries = [identify_like_model(rng, product, args.barcode_share if known else 0.0)
+               for product, known in scans]
+
+    start = time.perf_counter()
+    matches = [index.lookup(q["product_name"], q["brand"], q["barcode"]) for q in queries]
+    elapsed = time.perf_counter() - start
+
+    hits = wrong = false_new = 0
+    for (product, known), match in zip(scans, matches):
+        if match is None:
+            continue
+        if not known:
+            false_new += 1
+        elif catalog[match.entry.scan_id][:2] == product[:2]:
+            hits += 1
+        else:
+            wrong += 1
+    print(f"\n{len(scans)} scans, {repeats} of known products")
+    print(f"  lookup         {elapsed / len(scans) * 1e6:7.1f}us/scan")
+    print(f"  repeat hits    {hits}/{repeats} ({hits / max(repeats, 1):.1%})")
+    print(f"  wrong product  {wrong} repeats, {false_new}/{len(scans) - repeats} new products")
+    print(f"  outcomes       {index.stats()}")
+
+    label = json.dumps(full_label(rng))
+    identity = json.dumps(queries[0])
+    served = hits + wrong + false_new
+    without = len(label)
+    with_index = len(identity) + len(label) * (len(scans) - served) / len(scans)
+    print("\nmodel output per scan (JSON characters)")
+    print(f"  without index  {without:7.0f}  (full extraction, prompt {len(COMBINED_PROMPT)} chars)")
+    print(f"  with index     {with_index:7.0f}  (identify, prompt {len(IDENTIFY_PROMPT)} chars, "
+          f"+ full extraction on {1 - served / len(scans):.0%} of scans)")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,234 @@
+"""
+Prompt and response volume before and after structured output.
+
+For each model call (combined single pass, label, raw food, identify)
+compares what is sent and returned:
+
+- before: the prose prompt with the JSON template pasted in (all fields
+  empty), answered with the whole template echoed back, pretty-printed in
+  a ```json fence
+- after: the short prompt plus the response schema (counted as input, as
+  Gemini does), answered with compact JSON in the schema's shape, without
+  the fields the label doesn't show
+
+in characters and estimated tokens (characters / 4, the estimate the fake
+and replay backends report); both send the same image tokens. Responses
+come from MODEL_RECORDINGS_DIR when it has recordings (their recorded
+usage is shown too), otherwise from the benchmark fakes.
+
+    python -m app.bench.prompt_tokens --samples 200
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+from pathlib import Path
+
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+
+from app.bench.fakes import full_label, raw_foods
+from app.food_analyzer import (
+    COMBINED_PROMPT, IDENTIFY_PROMPT, PRODUCT_LABEL_PROMPT, RAW_FOOD_PROMPT
+)
+from app.model_backend import structured_output
+from app.response_schemas import (
+    COMBINED_SCHEMA, IDENTITY_SCHEMA, PRODUCT_LABEL_SCHEMA, RAW_FOOD_SCHEMA, expand_nutrients
+)
+from app.token_usage import image_tokens_for_size, text_tokens
+
+# Nutrients the label template used to list, with its units
+TEMPLATE_NUTRIENTS = {
+    "macronutrients": {
+        "total_fat": "g", "saturated_fat": "g", "trans_fat": "g", "cholesterol": "mg",
+        "sodium": "mg", "total_carbohydrates": "g", "dietary_fiber": "g", "total_sugars": "g",
+        "added_sugars": "g", "protein": "g",
+    },
+    "vitamins_minerals": {"vitamin_d": "mcg", "calcium": "mg", "iron": "mg", "potassium": "mg"},
+}
+
+# Prose of the template prompts, around the pasted templates
+BEFORE_COMBINED = """
+    Analyze this food image. Decide whether it shows a packaged product with a nutrition
+    label/packaging or a raw/unpackaged food item, and extract its information in the same response.
+    Respond with a single JSON object whose first field, "food_type", is either "packaged" or "raw".
+
+    If it is a packaged product, set "food_type" to "packaged" and fill the rest of the object
+    using the following JSON format. Extract exact values from the nutrition label.
+    Include units (g, mg, mcg) for all measurements.
+{label}
+    If it is a raw/unpackaged food, set "food_type" to "raw" and fill the rest of the object
+    using the following JSON format:
+{raw}    """
+BEFORE_LABEL = """
+    Analyze this product label and provide information in the following JSON format.
+    Extract exact values from the nutrition label. Include units (g, mg, mcg) for all measurements.
+{label}    """
+BEFORE_RAW = """
+    Analyze this food image and provide information in the following JSON format:
+{raw}    """
+BEFORE_IDENTIFY = """
+    Identify the packaged product in this image from its packaging.
+    Respond with only a JSON object {"product_name": "", "brand": "", "barcode": ""},
+    with "barcode" set to the digits printed under the barcode if they are readable.
+    If the image does not show a packaged product, respond with only {}.
+    """
+
+
+def template(schema: dict):
+    """
+    The empty JSON template a schema stands for, as the prompts used to
+    paste it (one element for a list of objects)
+    """
+    kind = schema["type"]
+    if kind == "object":
+        return {key: template(value) for key, value in schema["properties"].items()}
+    if kind == "array":
+        items = schema["items"]
+        return [template(items)] if items["type"] == "object" else []
+    return {"string": "", "boolean": False, "integer": 0}[kind]
+
+
+def label_template() -> dict:
+    # Nutrient panels were objects keyed by the nutrients listed in the template
+    result = template(PRODUCT_LABEL_SCHEMA)
+    for panel, units in TEMPLATE_NUTRIENTS.items():
+        result["nutrition_facts"][panel] = {
+            name: {"amount": "", "unit": unit, "daily_value": ""} for name, unit in units.items()
+        }
+    return result
+
+
+def indented(document: dict) -> str:
+    return "\n".join("    " + line for line in json.dumps(document, indent=4).splitlines()) + "\n"
+
+
+def fill(base, value):
+    """
+    ``value`` laid over the template ``base``: every template field stays,
+    as a model echoing the template answers
+    """
+    if isinstance(base, dict) and isinstance(value, dict):
+        merged = {key: fill(base_value, value.get(key, base_value))
+                  for key, base_value in base.items()}
+        merged.update((key, item) for key, item in value.items() if key not in base)
+        return merged
+    if isinstance(base, list) and base and isinstance(value, list):
+        return [fill(base[0], item) for item in value]
+    return value
+
+
+def prune(value):
+    """
+    ``value`` without the empty strings and objects a schema answer leaves out
+    """
+    if isinstance(value, dict):
+        pruned = {key: prune(item) for key, item in value.items()}
+        return {key: item for key, item in pruned.items() if item not in ("", {})}
+    if isinstance(value, list):
+        return [prune(item) for item in value]
+    return value
+
+
+def calls() -> dict:
+    label, raw = label_template(), template(RAW_FOOD_SCHEMA)
+    return {
+        "combined": (BEFORE_COMBINED.format(label=indented(label), raw=indented(raw)),
+                     {"food_type": "", **label, **raw}, COMBINED_PROMPT, COMBINED_SCHEMA),
+        "label": (BEFORE_LABEL.format(label=indented(label)), label,
+                  PRODUCT_LABEL_PROMPT, PRODUCT_LABEL_SCHEMA),
+        "raw": (BEFORE_RAW.format(raw=indented(raw)), raw, RAW_FOOD_PROMPT, RAW_FOOD_SCHEMA),
+        "identify": (BEFORE_IDENTIFY, {"product_name": "", "brand": "", "barcode": ""},
+                     IDENTIFY_PROMPT, IDENTITY_SCHEMA),
+    }
+
+
+def call_kind(response: dict) -> str:
+    if "food_type" in response:
+        return "combined"
+    if "product_info" in response:
+        return "label"
+    if "food_identification" in response:
+        return "raw"
+    return "identify"
+
+
+def fake_responses(rng: random.Random, samples: int) -> list:
+    responses = []
+    for i in range(samples):
+        label, raw = full_label(rng), raw_foods(rng, rng.randint(1, 4))
+        info = label["product_info"]
+        responses += [
+            {"food_type": "packaged", **label} if i % 2 else {"food_type": "raw", **raw},
+            label, raw,
+            {"product_name": info["product_name"], "brand": info["brand"], "barcode": ""},
+        ]
+    return [(response, None) for response in responses]
+
+
+def recorded_responses(directory: str) -> list:
+    responses = []
+    for path in sorted(Path(directory).glob("*.json")):
+        record = json.loads(path.read_text())
+        try:
+            response = json.loads(record["text"].strip().removeprefix("```json").strip("`\n "))
+        except ValueError:
+            continue
+        if isinstance(response, dict) and response:
+            expand_nutrients(response.get("nutrition_facts"))
+            responses.append((response, record.get("usage")))
+    return responses
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--recordings", default=os.getenv("MODEL_RECORDINGS_DIR",
+                                                          "./model_recordings"))
+    parser.add_argument("--image-size", type=int, nargs=2, default=(1536, 1152),
+                        metavar=("WIDTH", "HEIGHT"))
+    args = parser.parse_args()
+
+    responses = recorded_responses(args.recordings) if Path(args.recordings).is_dir() else []
+    source = f"{len(responses)} recordings from {args.recordings}"
+    if not responses:
+        responses = fake_responses(random.Random(11), args.samples)
+        source = f"{len(responses)} fake responses"
+    image = image_tokens_for_size(*args.image_size)
+    print(f"{source}; image {args.image_size[0]}x{args.image_size[1]} = {image} tokens "
+          "per call either way\n")
+
+    by_kind = {}
+    for response, usage in responses:
+        by_kind.setdefault(call_kind(response), []).append((response, usage))
+
+    print(f"{'call':<9} {'':<7} {'prompt':>8} {'schema':>8} {'output':>8} "
+          f"{'tokens/call':>12}")
+    for kind, (before_prompt, blank, after_prompt, schema) in calls().items():
+        samples = by_kind.get(kind)
+        if not samples:
+            continue
+        schema_text = json.dumps(schema, separators=(",", ":"))
+        before_out = statistics.mean(
+            len("```json\n" + json.dumps(fill(blank, response), indent=4) + "\n```")
+            for response, _ in samples
+        )
+        after_out = statistics.mean(len(structured_output(prune(response)))
+                                    for response, _ in samples)
+        before_tokens = text_tokens(before_prompt) + image + before_out / 4
+        after_tokens = text_tokens(after_prompt) + text_tokens(schema_text) + image + after_out / 4
+        print(f"{kind:<9} {'before':<7} {len(before_prompt):>8} {'-':>8} {before_out:>8.0f} "
+              f"{before_tokens:>12.0f}")
+        print(f"{'':<9} {'after':<7} {len(after_prompt):>8} {len(schema_text):>8} "
+              f"{after_out:>8.0f} {after_tokens:>12.0f}  ({after_tokens / before_tokens - 1:+.0%})")
+        recorded = [usage for _, usage in samples if usage]
+        if recorded:
+            prompt = statistics.mean(usage["prompt_token_count"] for usage in recorded)
+            output = statistics.mean(usage["candidates_token_count"] for usage in recorded)
+            print(f"{'':<9} recorded usage: prompt {prompt:.0f}, output {output:.0f} tokens "
+                  f"over {len(recorded)} calls")
+    print("\ncharacters per call; tokens = prompt + schema + output characters / 4 + image")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,144 @@
+"""
+Model client resilience under injected faults, against the fake backend.
+
+Phases run concurrent calls through ResilientModel while the fake backend's
+latency and failure rate are changed underneath it:
+
+- tail latency: p99 with and without hedged requests, with 3% stragglers
+- flaky: success rate with and without retries at a 30% failure rate
+- outage: every call fails; the circuit breaker should open and fail fast
+- recovery: after the reset timeout a probe closes the circuit again
+- rate limit: calls are held to the token-bucket rate
+
+    python -m app.bench.resilience --calls 200 --workers 16
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+
+from app.bench.fakes import FakeModel
+from app.model_client import CircuitBreaker, ModelUnavailable, ResilientModel, TokenBucket
+
+PROMPT = "Analyze this food image"
+
+
+def percentile(samples, pct):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def drive(client, calls: int, workers: int):
+    """
+    Make ``calls`` calls from ``workers`` threads; returns (ok, rejected, latencies)
+    """
+    outcomes, lock = [], threading.Lock()
+
+    def call(_):
+        start = time.perf_counter()
+        try:
+            client.generate_content([PROMPT])
+            ok = True
+        except Exception:
+            ok = False
+        with lock:
+            outcomes.append((ok, time.perf_counter() - start))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(call, range(calls)))
+    ok = sum(1 for success, _ in outcomes if success)
+    return ok, len(outcomes) - ok, [seconds for _, seconds in outcomes]
+
+
+def report(name: str, ok: int, failed: int, latencies, extra: str = ""):
+    print(f"{name:<26} ok={ok:<4} failed={failed:<4} "
+          f"p50={percentile(latencies, 50) * 1000:7.1f}ms "
+          f"p99={percentile(latencies, 99) * 1000:7.1f}ms {extra}")
+
+
+def run(args) -> int:
+    problems = []
+
+    # Tail latency: hedging should cut p99 when a few calls straggle
+    p99 = {}
+    for hedge in (False, True):
+        backend = FakeModel(args.latency, latency_sigma=0.2, seed=1, straggler_rate=0.03)
+        client = ResilientModel(backend, deadline=30, hedge=hedge, hedge_min_samples=20,
+                                hedge_workers=2 * args.workers)
+        drive(client, 40, args.workers)  # warm the latency window
+        ok, failed, latencies = drive(client, args.calls, args.workers)
+        p99[hedge] = percentile(latencies, 99)
+        report(f"tail latency hedge={hedge}", ok, failed, latencies,
+               f"hedges={client.counters['hedges']} wins={client.counters['hedge_wins']}")
+    if p99[True] >= p99[False]:
+        problems.append("hedging did not reduce p99 latency")
+
+    # Flaky backend: retries should absorb most failures
+    rates = {}
+    for retries in (0, 3):
+        backend = FakeModel(args.latency / 5, failure_rate=0.3, seed=2)
+        client = ResilientModel(backend, deadline=30, max_retries=retries, base_delay=0.02,
+                                breaker=CircuitBreaker(failure_threshold=50, reset_timeout=1))
+        ok, failed, latencies = drive(client, args.calls, args.workers)
+        rates[retries] = ok / args.calls
+        report(f"flaky 30% retries={retries}", ok, failed, latencies,
+               f"attempts={client.counters['attempts']}")
+    if rates[3] < 0.95:
+        problems.append(f"retries only reached {rates[3]:.0%} success")
+
+    # Outage: the breaker opens and later calls fail without touching the backend
+    backend = FakeModel(args.latency, failure_rate=1.0, seed=3)
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=1.0)
+    client = ResilientModel(backend, deadline=5, max_retries=2, base_delay=0.02, breaker=breaker)
+    ok, failed, latencies = drive(client, args.calls, args.workers)
+    report("outage", ok, failed, latencies,
+           f"backend_calls={backend.calls} breaker={breaker.stats()}")
+    if backend.calls > args.calls / 4:
+        problems.append(f"breaker let {backend.calls} calls through during the outage")
+    try:
+        client.generate_content([PROMPT])
+        problems.append("call succeeded while the circuit was open")
+    except ModelUnavailable as e:
+        print(f"{'':<26} open circuit -> {type(e).__name__} retry_after={e.retry_after:.1f}s")
+
+    # Recovery: once the backend is healthy a probe closes the circuit
+    backend.failure_rate = 0.0
+    time.sleep(breaker.reset_timeout)
+    client.generate_content([PROMPT])  # half-open probe
+    ok, failed, latencies = drive(client, args.calls // 4, args.workers)
+    report("recovery", ok, failed, latencies, f"breaker={breaker.state}")
+    if breaker.state != "closed":
+        problems.append("circuit did not close after recovery")
+
+    # Rate limit: throughput stays at the token-bucket rate
+    backend = FakeModel(0.0)
+    client = ResilientModel(backend, deadline=30, rate_limiter=TokenBucket(rate=50, burst=5))
+    start = time.perf_counter()
+    ok, failed, latencies = drive(client, 100, args.workers)
+    rate = backend.calls / (time.perf_counter() - start)
+    report("rate limit 50/s", ok, failed, latencies, f"achieved={rate:.1f}/s")
+    if rate > 50 * 1.2:
+        problems.append(f"rate limiter allowed {rate:.1f} calls/s")
+
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    return 1 if problems else 0
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05, help="median seconds per model call")
+    return run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,123 @@
+"""
+JSON serialization benchmark: stdlib json vs the fast path, plain vs
+compressed scan_result storage, and gzip on /history pages.
+
+Uses full-label result documents (a dozen macronutrients, twenty-odd
+vitamins and minerals, a long ingredient list) rather than the small
+fake-model result.
+
+    python -m app.bench.serialization --rows 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ["MODEL_BACKEND"] = "fake"
+
+import httpx
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, insert, select
+
+from app import main, serialization
+from app.bench.fakes import full_label
+from app.init_db import init_db
+from app.serialization import StoredJSON
+
+
+def stdlib_dumps(obj) -> bytes:
+    # What Starlette's JSONResponse.render does
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def per_call(func, arg, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(arg)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def bench_codec(docs, repeat: int):
+    doc = docs[0]
+    page = [{"id": i, "scan_result": d} for i, d in enumerate(docs[:200])]
+    encoded, page_encoded = stdlib_dumps(doc), stdlib_dumps(page)
+    print(f"\ncodec (one {len(encoded)} byte document / a 200-scan page), "
+          f"fast path = {serialization.BACKEND}")
+    rows = [
+        ("encode doc", stdlib_dumps, serialization.dumps, doc, repeat),
+        ("decode doc", json.loads, serialization.loads, encoded, repeat),
+        ("encode page", stdlib_dumps, serialization.dumps, page, max(1, repeat // 100)),
+        ("decode page", json.loads, serialization.loads, page_encoded, max(1, repeat // 100)),
+    ]
+    for name, slow, fast, arg, n in rows:
+        slow_us, fast_us = per_call(slow, arg, n), per_call(fast, arg, n)
+        print(f"  {name:<12} json={slow_us:9.1f}us  fast={fast_us:9.1f}us  "
+              f"x{slow_us / fast_us:4.1f}")
+
+
+def bench_storage(docs):
+    print(f"\nscan_result storage ({len(docs)} rows, SQLite)")
+    for label, min_bytes in (("plain", 0), ("zlib", 256)):
+        path = os.path.join(tempfile.mkdtemp(), "storage.db")
+        engine = create_engine(f"sqlite:///{path}")
+        table = Table("scans", MetaData(), Column("id", Integer, primary_key=True),
+                      Column("scan_result", StoredJSON(compress_min_bytes=min_bytes)))
+        table.metadata.create_all(engine)
+
+        start = time.perf_counter()
+        with engine.begin() as connection:
+            connection.execute(insert(table), [{"scan_result": doc} for doc in docs])
+        write = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with engine.connect() as connection:
+            rows = connection.execute(select(table.c.scan_result)).all()
+        read = time.perf_counter() - start
+        assert rows[-1].scan_result == docs[-1]
+        engine.dispose()
+        print(f"  {label:<6} file={os.path.getsize(path) / 1024 / 1024:7.2f}MB  "
+              f"write={write * 1000:7.0f}ms  read all={read * 1000:7.0f}ms")
+
+
+async def bench_history(docs, pages: int):
+    init_db()
+    rows = [main.scan_row(f"scan-{i}.jpg", doc) for i, doc in enumerate(docs)]
+    main.store_scans(rows)
+
+    print(f"\nGET /history?include=full&limit=200 ({pages} requests)")
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for encoding in ("identity", "gzip"):
+            wire = 0
+            start = time.perf_counter()
+            for _ in range(pages):
+                response = await client.get(
+                    "/history", params={"include": "full", "limit": 200},
+                    headers={"Accept-Encoding": encoding},
+                )
+                wire = response.num_bytes_downloaded
+            elapsed = (time.perf_counter() - start) / pages
+            print(f"  {encoding:<8} {wire / 1024:8.1f}KB on the wire  {elapsed * 1000:6.1f}ms/request")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=20_000)
+    parser.add_argument("--pages", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    docs = [full_label(rng) for _ in range(args.rows)]
+    bench_codec(docs, args.repeat)
+    bench_storage(docs)
+    asyncio.run(bench_history(docs[:1000], args.pages))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,104 @@
+"""
+Cold-start benchmark: import time of app.main and time until ready.
+
+Every measurement runs in a fresh interpreter so nothing is warm:
+
+- ``python -X importtime -c "import app.main"``, summarized as self time
+  per top-level package and the slowest first-party modules
+- import, then the lifespan startup (schema, DB pool, model client) until
+  the app would report ready, median over ``--runs``, for the fake
+  backend and for the Gemini backend (whose SDK is imported at startup,
+  not at import)
+
+    python -m app.bench.startup --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+READY_SCRIPT = """
+import asyncio, time
+start = time.perf_counter()
+import app.main as main
+imported = time.perf_counter()
+
+async def boot():
+    async with main.lifespan(main.app):
+        print(imported - start, time.perf_counter() - imported)
+
+asyncio.run(boot())
+"""
+
+
+def bench_env(backend: str) -> dict:
+    workdir = tempfile.mkdtemp()
+    return dict(
+        os.environ,
+        MODEL_BACKEND=backend,
+        GOOGLE_API_KEY="bench",
+        DATABASE_URL=f"sqlite:///{workdir}/bench.db",
+        BLOB_STORE_DIR=f"{workdir}/blobs",
+        LOG_LEVEL="WARNING",
+    )
+
+
+def import_profile(top: int):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        env=bench_env("fake"), capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    total = next(cumulative for name, _, cumulative in modules if name == "app.main")
+    by_package = defaultdict(int)
+    for name, self_us, _ in modules:
+        by_package[name.split(".")[0]] += self_us
+    print(f"import app.main: {total / 1000:.0f}ms across {len(modules)} modules\n")
+    print("self time by top-level package")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {package:<28} {self_us / 1000:8.1f}ms")
+    print("\nslowest app modules (cumulative)")
+    app_modules = [m for m in modules if m[0].startswith("app.") and m[0] != "app.main"]
+    for name, _, cumulative in sorted(app_modules, key=lambda m: -m[2])[:top]:
+        print(f"  {name:<28} {cumulative / 1000:8.1f}ms")
+
+
+def time_to_ready(backend: str, runs: int):
+    imports, startups = [], []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", READY_SCRIPT],
+            env=bench_env(backend), capture_output=True, text=True, check=True,
+        )
+        imported, started = map(float, result.stdout.split())
+        imports.append(imported)
+        startups.append(started)
+    import_ms = statistics.median(imports) * 1000
+    startup_ms = statistics.median(startups) * 1000
+    print(f"  {backend:<8} import={import_ms:7.0f}ms  lifespan startup={startup_ms:7.0f}ms  "
+          f"ready after {import_ms + startup_ms:7.0f}ms")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    import_profile(args.top)
+    print(f"\ncold start to ready (median of {args.runs})")
+    for backend in ("fake", "gemini"):
+        time_to_ready(backend, args.runs)
+
+
+if __name__ == "__main__":
+    main_cli()
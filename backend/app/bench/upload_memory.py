@@ -0,0 +1,119 @@
+"""
+Peak Python memory per upload: reading it into bytes vs decoding from the spool.
+
+Compares, for a large phone-sized JPEG already spooled to disk the way
+Starlette stores uploads:
+
+- read: ``await file.read()`` then prepare_image(bytes), the old path
+- spooled: sniff the magic bytes and hand PIL the spooled file
+
+then checks the full /analyze request and the 413/415 rejections.
+Peaks are tracemalloc's, i.e. Python-level buffers (PIL's own pixel
+buffers are not traced and are the same in both modes).
+
+    python -m app.bench.upload_memory --megapixels 12
+"""
+import argparse
+import asyncio
+import io
+import logging
+import os
+import tempfile
+import tracemalloc
+
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+# Synthetic frames are flat or smooth noise, not photos: keep the
+# frame-quality gate out of the measurement
+os.environ.setdefault("FRAME_QUALITY_ENABLED", "false")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ["MODEL_BACKEND"] = "fake"
+os.environ["FAKE_MODEL_LATENCY"] = "0"
+os.environ["RESULT_CACHE_ENABLED"] = "false"
+
+import httpx
+from PIL import Image
+
+from app import main
+from app.config import IMAGE_MAX_EDGE, UPLOAD_MAX_BYTES
+from app.init_db import init_db
+from app.preprocessing import prepare_image
+from app.uploads import sniff_upload
+
+
+def phone_jpeg(megapixels: float) -> bytes:
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = width * 3 // 4
+    noise = Image.effect_noise((width // 4, height // 4), 80)
+    frame = noise.resize((width, height), Image.Resampling.BICUBIC).convert("RGB")
+    buffer = io.BytesIO()
+    frame.save(buffer, "JPEG", quality=95)
+    return buffer.getvalue()
+
+
+def spool(data: bytes):
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spooled.write(data)
+    spooled.seek(0)
+    return spooled
+
+
+def peak(func, payload: bytes) -> int:
+    """
+    Peak traced memory of ``func(upload)`` for an upload spooled beforehand
+    """
+    with spool(payload) as upload:
+        tracemalloc.start()
+        try:
+            func(upload)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+
+async def run(args):
+    logging.disable(logging.INFO)
+    init_db()
+    payload = phone_jpeg(args.megapixels)
+    mb = 1024 * 1024
+    print(f"upload: {len(payload) / mb:.1f} MB JPEG, {args.megapixels:g} MP")
+
+    def read_path(upload):
+        contents = upload.read()
+        prepare_image(contents, IMAGE_MAX_EDGE)
+
+    def spooled_path(upload):
+        sniff_upload(upload)
+        prepare_image(upload, IMAGE_MAX_EDGE)
+
+    read_peak, spooled_peak = peak(read_path, payload), peak(spooled_path, payload)
+    print(f"read    peak={read_peak / mb:7.2f} MB")
+    print(f"spooled peak={spooled_peak / mb:7.2f} MB")
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app), httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        response = await client.post("/analyze", files={"file": ("big.jpg", payload, "image/jpeg")})
+        print(f"/analyze with the {len(payload) / mb:.1f} MB upload -> {response.status_code}")
+
+        oversized = b"\xff\xd8\xff" + b"\0" * (UPLOAD_MAX_BYTES + 1)
+        response = await client.post("/analyze", files={"file": ("huge.jpg", oversized, "image/jpeg")})
+        print(f"oversized upload ({len(oversized) / mb:.0f} MB) -> {response.status_code}")
+
+        response = await client.post("/analyze", files={"file": ("fake.jpg", b"%PDF-1.7 ...", "image/jpeg")})
+        print(f"non-image bytes labelled image/jpeg -> {response.status_code}")
+
+        buffer = io.BytesIO()
+        Image.new("L", (10000, 10000)).save(buffer, "PNG")
+        response = await client.post("/analyze", files={"file": ("bomb.png", buffer.getvalue(), "image/png")})
+        print(f"{len(buffer.getvalue()) // 1024} KB PNG of 100 MP -> {response.status_code}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--megapixels", type=float, default=12)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
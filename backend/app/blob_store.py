@@ -0,0 +1,142 @@
+import hashlib
+import io
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import BinaryIO, Union
+
+from PIL import Image, ImageOps
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+class BlobStore:
+    """
+    Content-addressed store for original uploads.
+
+    Blobs live at ``root/ab/cd/<sha256>``, so identical uploads are stored
+    once however many scans reference them. Thumbnails are generated on
+    first request and kept under ``root/thumbnails/<size>/``.
+    """
+
+    def __init__(self, root: str, thumbnail_quality: int = 80):
+        self.root = Path(root)
+        self.thumbnail_quality = thumbnail_quality
+        self._tmp = self.root / "tmp"
+        self._tmp.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def thumbnail_path(self, digest: str, size: int) -> Path:
+        return self.root / "thumbnails" / str(size) / digest[:2] / digest[2:4] / f"{digest}.jpg"
+
+    def exists(self, digest: str) -> bool:
+        return self.path_for(digest).exists()
+
+    def put(self, source: Union[bytes, BinaryIO]) -> str:
+        """
+        Store an upload (bytes or a seekable file) and return its SHA-256.
+
+        The data is hashed while it is copied to a temp file, which is then
+        renamed into place unless the blob is already stored.
+        """
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        position = source.tell()
+        source.seek(0)
+
+        sha256 = hashlib.sha256()
+        fd, temp_name = tempfile.mkstemp(dir=self._tmp)
+        try:
+            with os.fdopen(fd, "wb") as temp:
+                while chunk := source.read(_CHUNK_SIZE):
+                    sha256.update(chunk)
+                    temp.write(chunk)
+            digest = sha256.hexdigest()
+            path = self.path_for(digest)
+            if path.exists():
+                # Mark it in use again so a sweep leaves it alone
+                os.utime(path)
+                return digest
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(temp_name, path)
+            temp_name = None
+            return digest
+        finally:
+            source.seek(position)
+            if temp_name is not None:
+                os.unlink(temp_name)
+
+    def open(self, digest: str) -> BinaryIO:
+        return self.path_for(digest).open("rb")
+
+    def sweep(self, referenced, min_age: float, batch_size: int = 500) -> int:
+        """
+        Delete blobs untouched for ``min_age`` seconds that nothing refers
+        to; ``referenced(digests)`` returns the subset still in use. Returns
+        the number deleted (thumbnails are left to be reused).
+
+        Storing an upload refreshes its blob's mtime, so one a request has
+        just stored again is skipped even before a job or scan refers to it.
+        """
+        cutoff = time.time() - min_age
+        stale = [
+            blob.name
+            for shard in self.root.glob("[0-9a-f][0-9a-f]/[0-9a-f][0-9a-f]")
+            for blob in shard.iterdir()
+            if blob.stat().st_mtime < cutoff
+        ]
+        deleted = 0
+        for start in range(0, len(stale), batch_size):
+            batch = stale[start:start + batch_size]
+            for digest in set(batch) - referenced(batch):
+                path = self.path_for(digest)
+                try:
+                    # Checked again: a request may have stored it meanwhile
+                    if path.stat().st_mtime < cutoff:
+                        path.unlink()
+                        deleted += 1
+                except FileNotFoundError:
+                    pass
+        return deleted
+
+    def thumbnail(self, digest: str, size: int) -> Path:
+        """
+        Path of a JPEG thumbnail at most ``size`` pixels on its longest
+        edge, generating and caching it on first use
+        """
+        path = self.thumbnail_path(digest, size)
+        if path.exists():
+            return path
+
+        with Image.open(self.path_for(digest)) as image:
+            if image.format == "JPEG":
+                image.draft("RGB", (size, size))
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            image.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp_name = tempfile.mkstemp(dir=self._tmp, suffix=".jpg")
+            try:
+                with os.fdopen(fd, "wb") as temp:
+                    image.save(temp, "JPEG", quality=self.thumbnail_quality, optimize=True)
+                os.replace(temp_name, path)
+            except Exception:
+                os.unlink(temp_name)
+                raise
+        return path
+
+    def usage(self) -> dict:
+        """
+        Blob count and bytes on disk (walks the tree; for diagnostics)
+        """
+        blobs, size = 0, 0
+        for shard in self.root.glob("[0-9a-f][0-9a-f]/[0-9a-f][0-9a-f]"):
+            for blob in shard.iterdir():
+                blobs += 1
+                size += blob.stat().st_size
+        return {"blobs": blobs, "bytes": size}
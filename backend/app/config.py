@@ -1,15 +1,195 @@
 import os
 from dotenv import load_dotenv
-import google.generativeai as genai
+
+from .model_backend import build_backend
+from .model_client import CircuitBreaker, ResilientModel, TokenBucket
+from .token_usage import TokenUsage
 
 load_dotenv()
 
-# Add more debugging
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-print("API Key found:", "Yes" if GOOGLE_API_KEY else "No")
 
-if not GOOGLE_API_KEY:
-    raise ValueError("GOOGLE_API_KEY not found in environment variables")
+# Model backend: "gemini", "fake" (canned responses, for load tests),
+# "record" (gemini, saving responses) or "replay" (serve saved responses).
+# The Gemini key is only required once the gemini backend makes a call.
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "gemini")
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-2.0-flash-exp")
+MODEL_RECORDINGS_DIR = os.getenv("MODEL_RECORDINGS_DIR", "./model_recordings")
+FAKE_MODEL_LATENCY = float(os.getenv("FAKE_MODEL_LATENCY", "0.5"))
+FAKE_MODEL_LATENCY_SIGMA = float(os.getenv("FAKE_MODEL_LATENCY_SIGMA", "0.3"))
+FAKE_MODEL_FAILURE_RATE = float(os.getenv("FAKE_MODEL_FAILURE_RATE", "0"))
+FAKE_MODEL_STRAGGLER_RATE = float(os.getenv("FAKE_MODEL_STRAGGLER_RATE", "0"))
+FAKE_MODEL_SEED = int(os.getenv("FAKE_MODEL_SEED")) if os.getenv("FAKE_MODEL_SEED") else None
+
+# Logging: level, "json" or "text" records, and how much of the model's raw
+# output to log (fraction of calls at DEBUG, truncated to N chars; 0 = whole)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "512"))
+
+# Startup (app lifespan): create/migrate the schema, open this many pooled DB
+# connections and set up the model client before reporting ready
+STARTUP_INIT_DB = os.getenv("STARTUP_INIT_DB", "true").lower() == "true"
+STARTUP_DB_CONNECTIONS = int(os.getenv("STARTUP_DB_CONNECTIONS", "2"))
+STARTUP_WARM_MODEL = os.getenv("STARTUP_WARM_MODEL", "true").lower() == "true"
+# /health and /health/ready give up on the database after this long
+HEALTH_DB_TIMEOUT_SECONDS = float(os.getenv("HEALTH_DB_TIMEOUT_SECONDS", "2"))
+
+# Analysis scheduler: bounded concurrency for blocking model calls
+ANALYSIS_MAX_IN_FLIGHT = int(os.getenv("ANALYSIS_MAX_IN_FLIGHT", "4"))
+ANALYSIS_MAX_QUEUE = int(os.getenv("ANALYSIS_MAX_QUEUE", "16"))
+ANALYSIS_TIMEOUT_SECONDS = float(os.getenv("ANALYSIS_TIMEOUT_SECONDS", "60"))
+ANALYSIS_RETRY_AFTER_SECONDS = int(os.getenv("ANALYSIS_RETRY_AFTER_SECONDS", "5"))
+
+# Model client: retries with jittered backoff inside the call deadline,
+# optional hedged requests, circuit breaker and rate limit (0 disables it)
+MODEL_CALL_DEADLINE_SECONDS = float(
+    os.getenv("MODEL_CALL_DEADLINE_SECONDS", str(ANALYSIS_TIMEOUT_SECONDS))
+)
+MODEL_MAX_RETRIES = int(os.getenv("MODEL_MAX_RETRIES", "3"))
+MODEL_RETRY_BASE_DELAY = float(os.getenv("MODEL_RETRY_BASE_DELAY", "0.5"))
+MODEL_RETRY_MAX_DELAY = float(os.getenv("MODEL_RETRY_MAX_DELAY", "8"))
+MODEL_HEDGE_ENABLED = os.getenv("MODEL_HEDGE_ENABLED", "false").lower() == "true"
+MODEL_HEDGE_PERCENTILE = float(os.getenv("MODEL_HEDGE_PERCENTILE", "95"))
+MODEL_HEDGE_MIN_SAMPLES = int(os.getenv("MODEL_HEDGE_MIN_SAMPLES", "20"))
+MODEL_BREAKER_FAILURE_THRESHOLD = int(os.getenv("MODEL_BREAKER_FAILURE_THRESHOLD", "5"))
+MODEL_BREAKER_RESET_SECONDS = float(os.getenv("MODEL_BREAKER_RESET_SECONDS", "30"))
+MODEL_RATE_LIMIT_RPS = float(os.getenv("MODEL_RATE_LIMIT_RPS", "0"))
+MODEL_RATE_LIMIT_BURST = int(os.getenv("MODEL_RATE_LIMIT_BURST", "10"))
+
+# Prompt, image and output tokens of every model call, per endpoint
+token_usage = TokenUsage()
+
+model = ResilientModel(
+    build_backend(
+        MODEL_BACKEND,
+        api_key=GOOGLE_API_KEY,
+        model_name=GEMINI_MODEL_NAME,
+        recordings_dir=MODEL_RECORDINGS_DIR,
+        fake_latency=FAKE_MODEL_LATENCY,
+        fake_latency_sigma=FAKE_MODEL_LATENCY_SIGMA,
+        fake_failure_rate=FAKE_MODEL_FAILURE_RATE,
+        fake_seed=FAKE_MODEL_SEED,
+        fake_straggler_rate=FAKE_MODEL_STRAGGLER_RATE,
+    ),
+    deadline=MODEL_CALL_DEADLINE_SECONDS,
+    max_retries=MODEL_MAX_RETRIES,
+    base_delay=MODEL_RETRY_BASE_DELAY,
+    max_delay=MODEL_RETRY_MAX_DELAY,
+    breaker=CircuitBreaker(MODEL_BREAKER_FAILURE_THRESHOLD, MODEL_BREAKER_RESET_SECONDS),
+    rate_limiter=(
+        TokenBucket(MODEL_RATE_LIMIT_RPS, MODEL_RATE_LIMIT_BURST) if MODEL_RATE_LIMIT_RPS else None
+    ),
+    hedge=MODEL_HEDGE_ENABLED,
+    hedge_percentile=MODEL_HEDGE_PERCENTILE,
+    hedge_min_samples=MODEL_HEDGE_MIN_SAMPLES,
+    hedge_workers=2 * ANALYSIS_MAX_IN_FLIGHT,
+    usage=token_usage,
+)
+
+# "single_pass" classifies and extracts in one model call; "two_step" detects
+# the label first and then extracts with a type-specific prompt
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "single_pass")
+
+# Result cache keyed on image content (memory LRU + FoodScan rows)
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1024"))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "86400"))
+# Max dHash bit distance for near-duplicate frames; 0 (the default) disables
+# perceptual hits, which can match labels that differ only in their numbers
+RESULT_CACHE_PHASH_DISTANCE = int(os.getenv("RESULT_CACHE_PHASH_DISTANCE", "0"))
+RESULT_CACHE_PERSISTENT = os.getenv("RESULT_CACHE_PERSISTENT", "true").lower() == "true"
+RESULT_CACHE_PERSISTENT_MAX_AGE_SECONDS = float(
+    os.getenv("RESULT_CACHE_PERSISTENT_MAX_AGE_SECONDS", str(30 * 86400))
+)
+
+# Product identity index: answer packaged scans of products already in the
+# history with their stored result. Identification decodes a barcode locally
+# (when pyzbar is installed). PRODUCT_INDEX_IDENTIFY_WITH_MODEL adds a short
+# identify call when no barcode matches; it runs before the extraction on
+# every such scan, raw foods and new products included, so it is off by
+# default. Fuzzy name matches need this trigram similarity and a lead of
+# PRODUCT_INDEX_MIN_MARGIN over the next candidate. At most
+# PRODUCT_INDEX_MAX_RESULTS canonical results are kept in memory; the rest
+# are read from their stored scan when matched
+PRODUCT_INDEX_ENABLED = os.getenv("PRODUCT_INDEX_ENABLED", "true").lower() == "true"
+PRODUCT_INDEX_IDENTIFY_WITH_MODEL = (
+    os.getenv("PRODUCT_INDEX_IDENTIFY_WITH_MODEL", "false").lower() == "true"
+)
+PRODUCT_INDEX_MAX_RESULTS = int(os.getenv("PRODUCT_INDEX_MAX_RESULTS", "512"))
+PRODUCT_INDEX_MIN_SIMILARITY = float(os.getenv("PRODUCT_INDEX_MIN_SIMILARITY", "0.8"))
+PRODUCT_INDEX_MIN_MARGIN = float(os.getenv("PRODUCT_INDEX_MIN_MARGIN", "0.1"))
+
+# Upload limits: bytes per image (larger bodies get 413 before parsing) and
+# pixels per image (checked from the header, before decoding)
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", "80000000"))
+
+# gzip /history, /stats and /results responses at least this many bytes
+# long (0 disables)
+RESPONSE_GZIP_MIN_BYTES = int(os.getenv("RESPONSE_GZIP_MIN_BYTES", "1024"))
+
+# Encoded /results/{id} responses kept in memory for repeat views
+SCAN_CACHE_MAX_ENTRIES = int(os.getenv("SCAN_CACHE_MAX_ENTRIES", "2048"))
+
+# Content-addressed store for original uploads, served by /scans/{id}/image
+BLOB_STORE_ENABLED = os.getenv("BLOB_STORE_ENABLED", "true").lower() == "true"
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "./blobs")
+# Longest-edge sizes /scans/{id}/image?size= will generate and cache
+THUMBNAIL_SIZES = tuple(
+    int(size) for size in os.getenv("THUMBNAIL_SIZES", "128,256,512").split(",") if size.strip()
+)
+
+# Upload preprocessing before the model call
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1536"))
+IMAGE_UPLOAD_FORMAT = os.getenv("IMAGE_UPLOAD_FORMAT", "JPEG")
+IMAGE_UPLOAD_QUALITY = int(os.getenv("IMAGE_UPLOAD_QUALITY", "85"))
+
+# Frame-quality gate: answer 422 instead of calling the model for frames
+# that are blurry (Laplacian variance below the minimum), mostly near
+# black/white (share of pixels over the maximum) or nearly empty (histogram
+# entropy in bits below the minimum), measured on a grayscale copy at most
+# FRAME_QUALITY_MAX_EDGE px on the long side. 0 disables a check.
+FRAME_QUALITY_ENABLED = os.getenv("FRAME_QUALITY_ENABLED", "true").lower() == "true"
+FRAME_QUALITY_MAX_EDGE = int(os.getenv("FRAME_QUALITY_MAX_EDGE", "512"))
+FRAME_QUALITY_MIN_SHARPNESS = float(os.getenv("FRAME_QUALITY_MIN_SHARPNESS", "20"))
+FRAME_QUALITY_MAX_DARK_SHARE = float(os.getenv("FRAME_QUALITY_MAX_DARK_SHARE", "0.95"))
+FRAME_QUALITY_MAX_BRIGHT_SHARE = float(os.getenv("FRAME_QUALITY_MAX_BRIGHT_SHARE", "0.95"))
+FRAME_QUALITY_MIN_ENTROPY = float(os.getenv("FRAME_QUALITY_MIN_ENTROPY", "3"))
+
+# Batch analysis (/analyze/batch)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_INSERT_CHUNK = int(os.getenv("BATCH_INSERT_CHUNK", "100"))
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "5000"))
+# Whole request body (all files or the archive); each item is still held to
+# UPLOAD_MAX_BYTES
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Add a Server-Timing header with per-stage durations to every response
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+
+# /history page size cap
+HISTORY_MAX_LIMIT = int(os.getenv("HISTORY_MAX_LIMIT", "200"))
+
+# Background analysis jobs (/jobs), queued in the database: worker tasks per
+# app process, how long a claimed job is leased before another worker may
+# take it over (keep it above ANALYSIS_TIMEOUT_SECONDS), attempts before a
+# transiently failing job (model unavailable, timeouts) is given up on,
+# queued jobs accepted before POST /jobs answers 503, how often idle workers
+# poll, the longest GET /jobs/{id}?wait= long-poll, and how long finished
+# jobs are kept
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "1000"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+JOB_MAX_WAIT_SECONDS = float(os.getenv("JOB_MAX_WAIT_SECONDS", "30"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 86400)))
 
-genai.configure(api_key=GOOGLE_API_KEY)
-model = genai.GenerativeModel('gemini-2.0-flash-exp')
\ No newline at end of file
+# Write-behind persistence of scan results
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "true").lower() == "true"
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100"))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.5"))
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "10000"))
+WRITE_BEHIND_DRAIN_TIMEOUT = float(os.getenv("WRITE_BEHIND_DRAIN_TIMEOUT", "30"))
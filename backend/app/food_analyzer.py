@@ -1,22 +1,89 @@
-import re
-import json
+import logging
 from PIL import Image
-import google.generativeai as genai
 from typing import Union
-from .config import model  # Import model from config
+from .config import model, ANALYSIS_MODE, LOG_PAYLOAD_SAMPLE_RATE, LOG_PAYLOAD_MAX_CHARS  # Import model from config
+from . import insights
+from .logging_config import log_payload
+from .metrics import stage
+from .model_client import ModelUnavailable
+from .response_schemas import (
+    COMBINED_SCHEMA, IDENTITY_SCHEMA, PRODUCT_LABEL_SCHEMA, RAW_FOOD_SCHEMA, expand_nutrients,
+    generation_config
+)
+from .result_models import parse_result
+from .serialization import loads
+from .streaming import IncrementalJSONParser
+
+logger = logging.getLogger(__name__)
+
+# Top-level fields of each shape in a combined response; the first is required
+FOOD_TYPE_FIELDS = {
+    "packaged": ("product_info", "nutrition_facts", "ingredients", "allergens",
+                 "dietary_info", "storage_instructions", "manufacturer_info"),
+    "raw": ("food_identification", "nutritional_info", "combination_suggestions",
+            "seasonal_info"),
+}
+
+# The output shapes are enforced by the response schemas (app.response_schemas),
+# so the prompts only say what to extract
+COMBINED_PROMPT = f"""
+    Analyze this food image. Decide whether it shows a packaged product with a nutrition
+    label/packaging or a raw/unpackaged food item, set "food_type" to "packaged" or "raw",
+    and extract its information in the same response.
+    For a packaged product fill {", ".join(FOOD_TYPE_FIELDS["packaged"])}
+    with exact values from the nutrition label: units (g, mg, mcg) in "unit" and the
+    % Daily Value, without the % sign, in "daily_value".
+    For a raw food fill {", ".join(FOOD_TYPE_FIELDS["raw"])}.
+    Leave out the fields of the other kind and any value that is not shown or known.
+    """
+
+PRODUCT_LABEL_PROMPT = """
+    Analyze this product label. Extract exact values from the nutrition label: units
+    (g, mg, mcg) in "unit" and the % Daily Value, without the % sign, in "daily_value".
+    Leave out any value that is not shown on the label.
+    """
+
+RAW_FOOD_PROMPT = """
+    Analyze this food image: identify each raw/unpackaged food item and give its typical
+    nutrition per serving, health benefits, storage tips, foods it combines well with
+    and its season.
+    """
+
+# Short identification for the product index (app.product_index); its
+# answer is a few dozen tokens instead of a full label extraction
+IDENTIFY_PROMPT = """
+    Identify the packaged product in this image from its packaging, with "barcode" set to
+    the digits printed under the barcode if they are readable.
+    If the image does not show a packaged product, leave every field empty.
+    """
 
-def analyze_food_image(image: Image.Image) -> dict:
+def analyze_food_image(image: Union[Image.Image, dict], mode: str = None) -> dict:
     """
     Main function to analyze any food image (with or without label)
+
+    ``image`` is a PIL image or an already-encoded blob part
+    (``{"mime_type": ..., "data": ...}``). ``mode`` selects "single_pass" (one combined model call) or "two_step"
+    (label detection followed by extraction); defaults to ANALYSIS_MODE.
     """
+    mode = mode or ANALYSIS_MODE
     try:
         # Ensure image is in RGB mode
-        if image.mode not in ('RGB', 'L'):
+        if isinstance(image, Image.Image) and image.mode not in ('RGB', 'L'):
             image = image.convert('RGB')
 
+        if mode == "single_pass":
+            try:
+                return analyze_food_single_pass(image)
+            except ModelUnavailable:
+                raise
+            except Exception as e:
+                return {"error": f"Error during analysis: {str(e)}"}
+
         # First, determine if the image contains a product label
         try:
             has_label = detect_product_label(image)
+        except ModelUnavailable:
+            raise
         except Exception as e:
             return {"error": f"Error detecting label type: {str(e)}"}
 
@@ -25,9 +92,14 @@ def analyze_food_image(image: Image.Image) -> dict:
                 return analyze_product_label(image)
             else:
                 return analyze_raw_food(image)
+        except ModelUnavailable:
+            raise
         except Exception as e:
             return {"error": f"Error during analysis: {str(e)}"}
 
+    # Unavailability is not a problem with the image; let the caller shed the request
+    except ModelUnavailable:
+        raise
     except Exception as e:
         return {"error": f"Error processing image: {str(e)}"}
 
@@ -40,198 +112,139 @@ def detect_product_label(image: Image.Image) -> bool:
     Respond with only 'true' if it contains a product label, or 'false' if it's a raw/unpackaged food item.
     """
 
-    response = model.generate_content([prompt, image])
+    with stage("label_detection"):
+        response = model.generate_content([prompt, image])
     return 'true' in response.text.lower()
 
-def calculate_macro_ratio(nutrition):
+def identify_product(image: Union[Image.Image, dict]) -> dict:
     """
-    Calculate the ratio of protein to carbohydrates
+    Product name, brand and barcode of a packaged product, or {} when the
+    image shows something else or the answer can't be parsed
     """
+    with stage("identify"):
+        response = model.generate_content(
+            [IDENTIFY_PROMPT, image], generation_config=generation_config(IDENTITY_SCHEMA)
+        )
     try:
-        protein = float(nutrition["macronutrients"]["protein"].replace('g', ''))
-        carbs = float(nutrition["macronutrients"]["total_carbohydrates"].replace('g', ''))
+        identity = loads(response.text)
+    except ValueError:
+        return {}
+    if not isinstance(identity, dict) or not identity.get("product_name"):
+        return {}
+    return identity
+
+def analyze_food_single_pass(image: Image.Image) -> dict:
+    """
+    Classify and extract in a single model call
+    """
+    result = process_gemini_response(image, COMBINED_PROMPT, COMBINED_SCHEMA)
+    if "error" in result:
+        return result
+    return finalize_single_pass(result)
 
-        if carbs == 0:
-            return "N/A"
+def finalize_single_pass(result: dict) -> dict:
+    """
+    Check the "food_type" discriminator of a combined response and reduce
+    it to the packaged or raw shape (the combined schema allows the fields
+    of both)
+    """
+    food_type = str(result.pop("food_type", "")).lower()
+    if food_type not in FOOD_TYPE_FIELDS:
+        # Fall back to the shape of the payload when the discriminator is missing
+        packaged = any(key in result for key in FOOD_TYPE_FIELDS["packaged"])
+        food_type = "packaged" if packaged else "raw"
+    required = FOOD_TYPE_FIELDS[food_type][0]
+    if required not in result:
+        return {"error": f"Response missing '{required}' for {food_type} food"}
+
+    # Drop any fields of the other shape so the result matches the two-step output
+    other = "raw" if food_type == "packaged" else "packaged"
+    for key in FOOD_TYPE_FIELDS[other]:
+        result.pop(key, None)
+    return result
 
-        ratio = round(protein / carbs, 2)
-        return f"{ratio}:1"
-    except:
-        return "Unable to calculate ratio"
+def stream_food_analysis(image: Union[Image.Image, dict]):
+    """
+    Single-pass analysis streamed from the model. Yields each top-level
+    ``(key, value)`` section of the response as soon as it is complete.
+
+    Only sections of one shape are yielded, so finalize_single_pass keeps
+    all of them: the "food_type" discriminator picks the shape if it comes
+    first, otherwise the first field of either shape does. The
+    discriminator itself is not yielded.
+    """
+    food_type = None
+    parser = IncrementalJSONParser()
+    with stage("extraction"):
+        response = model.generate_content(
+            [COMBINED_PROMPT, image], stream=True,
+            generation_config=generation_config(COMBINED_SCHEMA)
+        )
+        # Read to the end even once the object is complete: the final chunk
+        # carries the call's token usage
+        for chunk in response:
+            for key, value in parser.feed(chunk.text):
+                if key == "food_type":
+                    if food_type is None and str(value).lower() in FOOD_TYPE_FIELDS:
+                        food_type = str(value).lower()
+                    continue
+                shape = next((name for name, fields in FOOD_TYPE_FIELDS.items()
+                              if key in fields), None)
+                if shape is not None:
+                    food_type = food_type or shape
+                    if shape != food_type:
+                        continue
+                if key == "nutrition_facts":
+                    expand_nutrients(value)
+                yield key, value
+
+def calculate_macro_ratio(nutrition):
+    """
+    Calculate the ratio of protein to carbohydrates from a label's
+    ``nutrition_facts``
+    """
+    return insights.macro_ratio(parse_result({"product_info": {}, "nutrition_facts": nutrition}))
 
 
 def analyze_product_label(image_path):
     """
     Enhanced analysis for product labels
     """
-    prompt = """
-    Analyze this product label and provide information in the following JSON format.
-    Extract exact values from the nutrition label. Include units (g, mg, mcg) for all measurements.
-    {
-        "product_info": {
-            "product_name": "",
-            "brand": "",
-            "package_size": ""
-        },
-        "nutrition_facts": {
-            "serving_size": {
-                "amount": "",
-                "unit": "",
-                "servings_per_container": ""
-            },
-            "calories": "",
-            "macronutrients": {
-                "total_fat": {
-                    "amount": "",
-                    "unit": "g",
-                    "daily_value": ""
-                },
-                "saturated_fat": {
-                    "amount": "",
-                    "unit": "g",
-                    "daily_value": ""
-                },
-                "trans_fat": {
-                    "amount": "",
-                    "unit": "g"
-                },
-                "cholesterol": {
-                    "amount": "",
-                    "unit": "mg",
-                    "daily_value": ""
-                },
-                "sodium": {
-                    "amount": "",
-                    "unit": "mg",
-                    "daily_value": ""
-                },
-                "total_carbohydrates": {
-                    "amount": "",
-                    "unit": "g",
-                    "daily_value": ""
-                },
-                "dietary_fiber": {
-                    "amount": "",
-                    "unit": "g",
-                    "daily_value": ""
-                },
-                "total_sugars": {
-                    "amount": "",
-                    "unit": "g"
-                },
-                "added_sugars": {
-                    "amount": "",
-                    "unit": "g",
-                    "daily_value": ""
-                },
-                "protein": {
-                    "amount": "",
-                    "unit": "g",
-                    "daily_value": ""
-                }
-            },
-            "vitamins_minerals": {
-                "vitamin_d": {
-                    "amount": "",
-                    "unit": "mcg",
-                    "daily_value": ""
-                },
-                "calcium": {
-                    "amount": "",
-                    "unit": "mg",
-                    "daily_value": ""
-                },
-                "iron": {
-                    "amount": "",
-                    "unit": "mg",
-                    "daily_value": ""
-                },
-                "potassium": {
-                    "amount": "",
-                    "unit": "mg",
-                    "daily_value": ""
-                }
-            }
-        },
-        "ingredients": [],
-        "allergens": [],
-        "dietary_info": {
-            "is_vegetarian": false,
-            "is_vegan": false,
-            "is_gluten_free": false
-        },
-        "storage_instructions": "",
-        "manufacturer_info": ""
-    }
-    """
-
-    return process_gemini_response(image_path, prompt)
+    return process_gemini_response(image_path, PRODUCT_LABEL_PROMPT, PRODUCT_LABEL_SCHEMA)
 
 def analyze_raw_food(image_path):
     """
     Analyze images of raw foods (fruits, vegetables, etc.)
     """
-    prompt = """
-    Analyze this food image and provide information in the following JSON format:
-    {
-        "food_identification": {
-            "items": [],
-            "total_items": 0
-        },
-        "nutritional_info": [
-            {
-                "food_name": "",
-                "serving_size": "",
-                "nutrition_facts": {
-                    "calories": "",
-                    "macronutrients": {
-                        "protein": "",
-                        "carbohydrates": "",
-                        "fiber": "",
-                        "sugars": "",
-                        "total_fat": ""
-                    },
-                    "vitamins_minerals": {
-                        "vitamin_c": "",
-                        "vitamin_a": "",
-                        "potassium": "",
-                        "calcium": ""
-                    }
-                },
-                "health_benefits": [],
-                "storage_tips": []
-            }
-        ],
-        "combination_suggestions": [],
-        "seasonal_info": {}
-    }
-    """
-
-    return process_gemini_response(image_path, prompt)
-
-def process_gemini_response(image: Image.Image, prompt: str) -> dict:
-    """
-    Process image with Gemini and handle response
+    return process_gemini_response(image_path, RAW_FOOD_PROMPT, RAW_FOOD_SCHEMA)
+
+def process_gemini_response(image: Image.Image, prompt: str, schema: dict) -> dict:
+    """
+    Process image with Gemini and handle response; the model answers with
+    JSON matching ``schema``
     """
     try:
-        response = model.generate_content([prompt, image])
+        with stage("extraction"):
+            response = model.generate_content(
+                [prompt, image], generation_config=generation_config(schema)
+            )
         
-        # Log the raw response for debugging
-        print("Raw Gemini response:", response.text)
-
-        # Extract and parse JSON
-        json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
-        if json_match:
-            json_str = json_match.group()
-            json_str = json_str.replace('True', 'true').replace('False', 'false')
+        # Log a sample of raw responses for debugging
+        log_payload(logger, "Raw Gemini response", response.text,
+                    LOG_PAYLOAD_SAMPLE_RATE, LOG_PAYLOAD_MAX_CHARS)
+
+        with stage("json_parse"):
             try:
-                result = json.loads(json_str)
-                return result
-            except json.JSONDecodeError as e:
+                result = loads(response.text)
+            except ValueError as e:
                 return {"error": f"Error parsing JSON response: {str(e)}"}
-        else:
+        if not isinstance(result, dict):
             return {"error": "No valid JSON found in response"}
+        expand_nutrients(result.get("nutrition_facts"))
+        return result
 
+    except ModelUnavailable:
+        raise
     except Exception as e:
         return {"error": f"Error processing with Gemini: {str(e)}"}
 
@@ -240,104 +253,13 @@ def generate_analysis_summary(result):
     """
     Generate summary based on the type of food (packaged or raw)
     """
-    summary = {
-        "type": "packaged" if "product_info" in result else "raw",
-        "nutritional_highlights": [],
-        "health_score": 0,
-        "recommendations": []
-    }
-
-    if summary["type"] == "packaged":
-        # Analysis for packaged products
-        calories = result["nutrition_facts"]["calories"]
-        protein = result["nutrition_facts"]["macronutrients"]["protein"]
-        summary["nutritional_highlights"].append(f"Calories per serving: {calories}")
-        summary["nutritional_highlights"].append(f"Protein per serving: {protein}")
-    else:
-        # Analysis for raw foods
-        for item in result["nutritional_info"]:
-            summary["nutritional_highlights"].append(
-                f"{item['food_name']}: {item['nutrition_facts']['calories']} calories per serving"
-            )
-
-    return summary
+    return insights.analysis_summary(parse_result(result))
 
 def generate_health_insights(result):
     """
     Generate health insights based on nutritional content
     """
-    insights = {
-        "dietary_considerations": [],
-        "nutrient_density_score": 0,
-        "health_benefits": [],
-        "consumption_tips": []
-    }
-
-    # Add relevant insights based on the type of food
-    if "product_info" in result:  # Packaged product
-        process_packaged_food_insights(result, insights)
-    else:  # Raw food
-        process_raw_food_insights(result, insights)
-
-    return insights
-
-def process_packaged_food_insights(result, insights):
-    """
-    Enhanced insights for packaged foods
-    """
-    try:
-        nutrition = result["nutrition_facts"]
-
-        # Analyze macronutrient balance
-        protein = float(nutrition["macronutrients"]["protein"]["amount"])
-        carbs = float(nutrition["macronutrients"]["total_carbohydrates"]["amount"])
-        fat = float(nutrition["macronutrients"]["total_fat"]["amount"])
-
-        # Calculate macronutrient distribution
-        total_macros = protein + carbs + fat
-        if total_macros > 0:
-            macro_distribution = {
-                "protein_percentage": round((protein / total_macros) * 100, 1),
-                "carbs_percentage": round((carbs / total_macros) * 100, 1),
-                "fat_percentage": round((fat / total_macros) * 100, 1)
-            }
-
-            insights["macro_distribution"] = macro_distribution
-
-        # Analyze sugar content
-        if "total_sugars" in nutrition["macronutrients"]:
-            sugar_content = float(nutrition["macronutrients"]["total_sugars"]["amount"])
-            if sugar_content > 10:
-                insights["dietary_considerations"].append("High in sugar")
-            elif sugar_content < 5:
-                insights["dietary_considerations"].append("Low in sugar")
-
-        # Analyze sodium content
-        if "sodium" in nutrition["macronutrients"]:
-            sodium = float(nutrition["macronutrients"]["sodium"]["amount"])
-            if sodium > 400:
-                insights["dietary_considerations"].append("High in sodium")
-            elif sodium < 140:
-                insights["dietary_considerations"].append("Low in sodium")
-
-        # Check for allergens
-        if result["allergens"]:
-            insights["dietary_considerations"].append(
-                f"Contains allergens: {', '.join(result['allergens'])}"
-            )
-
-    except Exception as e:
-        insights["dietary_considerations"].append("Unable to complete full nutritional analysis")
-
-def process_raw_food_insights(result, insights):
-    """
-    Process insights for raw foods
-    """
-    for item in result["nutritional_info"]:
-        insights["health_benefits"].extend(item["health_benefits"])
-        insights["consumption_tips"].append(
-            f"Best ways to consume {item['food_name']}: {item['storage_tips']}"
-        )
+    return insights.health_insights(parse_result(result))
 
 def print_comprehensive_report(result):
     """
@@ -446,6 +368,8 @@ def analyze_food(image_path):
         print(f"Error: {result['error']}")
         return
 
+    result["analysis_summary"] = generate_analysis_summary(result)
+    result["health_insights"] = generate_health_insights(result)
     print_comprehensive_report(result)
     return result
 
@@ -0,0 +1,137 @@
+"""
+Frame-quality gate: rejects frames the model can't read before calling it.
+
+Camera captures are often blurred, nearly black or of nothing at all, and
+the model answers those with a full-latency guess. The gate measures a
+grayscale copy reduced to at most ``max_edge`` pixels (a few milliseconds)
+and rejects, in this order, frames that are:
+
+- too_dark / overexposed: most pixels near black / near white
+- low_detail: a histogram with too little entropy and no sharp edges
+  (blank wall, table top); crisp black-on-white print has a low entropy
+  too, but strong edges
+- blurry: low variance of the Laplacian (no sharp edges left)
+"""
+import math
+from dataclasses import asdict, dataclass
+
+from PIL import Image
+
+# Pixel levels counted as near black / near white in the exposure check
+DARK_LEVEL = 32
+BRIGHT_LEVEL = 224
+
+MESSAGES = {
+    "too_dark": "The photo is too dark; add light and retake it",
+    "overexposed": "The photo is overexposed; avoid glare and retake it",
+    "low_detail": "The photo doesn't show anything recognizable; point the camera at the food",
+    "blurry": "The photo is too blurry; hold the camera steady and retake it",
+}
+
+
+@dataclass(frozen=True)
+class FrameQuality:
+    sharpness: float  # variance of the Laplacian at the measured size
+    brightness: float  # mean level, 0-255
+    dark_share: float  # share of pixels below DARK_LEVEL
+    bright_share: float  # share of pixels at or above BRIGHT_LEVEL
+    entropy: float  # bits per pixel of the level histogram, 0-8
+
+    def as_dict(self) -> dict:
+        return {name: round(value, 3) for name, value in asdict(self).items()}
+
+
+class FrameRejected(ValueError):
+    """
+    Raised for a frame that fails the gate; ``detail`` is the 422 body
+    """
+
+    def __init__(self, reason: str, quality: FrameQuality, thresholds: dict):
+        super().__init__(MESSAGES[reason])
+        self.reason = reason
+        self.quality = quality
+        self.thresholds = thresholds
+
+    @property
+    def detail(self) -> dict:
+        return {"reason": self.reason, "message": str(self), "quality": self.quality.as_dict(),
+                "thresholds": self.thresholds}
+
+
+def measure(image: Image.Image, max_edge: int = 512) -> FrameQuality:
+    """
+    Sharpness, exposure and entropy of ``image`` on a grayscale copy of at
+    most ``max_edge`` pixels
+    """
+    # Imported here so the app starts without paying for NumPy
+    import numpy as np
+
+    factor = math.ceil(max(image.size) / max_edge)
+    if factor > 1:
+        # Box-filtered integer reduction: much cheaper than resampling
+        image = image.reduce(factor)
+    gray = np.asarray(image.convert("L"))
+
+    histogram = np.bincount(gray.ravel(), minlength=256)
+    pixels = gray.size
+    probabilities = histogram[histogram > 0] / pixels
+    entropy = max(0.0, float(-(probabilities * np.log2(probabilities)).sum()))
+    brightness = float(histogram @ np.arange(256) / pixels)
+
+    # 4-neighbour Laplacian over the interior
+    levels = gray.astype(np.int16)
+    laplacian = (levels[:-2, 1:-1] + levels[2:, 1:-1] + levels[1:-1, :-2] + levels[1:-1, 2:]
+                 - 4 * levels[1:-1, 1:-1])
+    sharpness = float(laplacian.var()) if laplacian.size else 0.0
+
+    return FrameQuality(
+        sharpness=sharpness,
+        brightness=brightness,
+        dark_share=float(histogram[:DARK_LEVEL].sum() / pixels),
+        bright_share=float(histogram[BRIGHT_LEVEL:].sum() / pixels),
+        entropy=entropy,
+    )
+
+
+class FrameGate:
+    """
+    Checks frames against thresholds; 0 disables a check (low_detail
+    needs both the sharpness and the entropy check)
+    """
+
+    def __init__(self, min_sharpness: float = 20.0, max_dark_share: float = 0.95,
+                 max_bright_share: float = 0.95, min_entropy: float = 3.0,
+                 max_edge: int = 512):
+        self.min_sharpness = min_sharpness
+        self.max_dark_share = max_dark_share
+        self.max_bright_share = max_bright_share
+        self.min_entropy = min_entropy
+        self.max_edge = max_edge
+
+    @property
+    def thresholds(self) -> dict:
+        return {"min_sharpness": self.min_sharpness, "max_dark_share": self.max_dark_share,
+                "max_bright_share": self.max_bright_share, "min_entropy": self.min_entropy}
+
+    def reason(self, quality: FrameQuality):
+        """
+        Why ``quality`` fails the gate, or None if it passes
+        """
+        if self.max_dark_share and quality.dark_share > self.max_dark_share:
+            return "too_dark"
+        if self.max_bright_share and quality.bright_share > self.max_bright_share:
+            return "overexposed"
+        # Disabled (0) thresholds never compare true: both measures are >= 0
+        if quality.sharpness < self.min_sharpness:
+            return "low_detail" if quality.entropy < self.min_entropy else "blurry"
+        return None
+
+    def check(self, image: Image.Image) -> FrameQuality:
+        """
+        Measure ``image`` and raise FrameRejected if it fails the gate
+        """
+        quality = measure(image, self.max_edge)
+        reason = self.reason(quality)
+        if reason is not None:
+            raise FrameRejected(reason, quality, self.thresholds)
+        return quality
@@ -1,8 +1,37 @@
+from sqlalchemy import inspect, text
 from app.database import Base, engine
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    create_missing_indexes()
+
+def add_missing_columns():
+    """
+    Add columns introduced after a table was first created
+    """
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        missing = [column for column in table.columns if column.name not in existing]
+        if not missing:
+            continue
+
+        with engine.begin() as connection:
+            for column in missing:
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(
+                    text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+                )
+
+def create_missing_indexes():
+    """
+    Create indexes added to models after their table was first created
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
 
 if __name__ == "__main__":
     init_db()
-    print("Database initialized!")
\ No newline at end of file
+    print("Database initialized!")
@@ -0,0 +1,224 @@
+"""
+Summaries and health insights derived from parsed results.
+
+The per-scan functions work on a single ``app.result_models`` object;
+``score_batch`` gathers the amounts of many scans into one NumPy matrix
+(a Python pass) and evaluates the rules on it as array operations.
+"""
+import operator
+from typing import Optional, Sequence
+
+from app.result_models import PackagedResult, ParsedResult, parse_result
+
+# Bump whenever a rule below changes, so stored insights get recomputed
+INSIGHT_RULES_VERSION = 2
+
+# (nutrient, comparison, per-serving limit in its normal unit, consideration, recommendation)
+THRESHOLD_RULES = (
+    ("total_sugars", ">", 10, "High in sugar", "Watch portion size; this is high in sugar"),
+    ("total_sugars", "<", 5, "Low in sugar", None),
+    ("sodium", ">", 400, "High in sodium", "Balance with low-sodium foods for the rest of the day"),
+    ("sodium", "<", 140, "Low in sodium", None),
+    ("saturated_fat", ">", 5, "High in saturated fat", "Limit how often you eat this"),
+    ("dietary_fiber", ">=", 5, "Good source of fiber", None),
+    ("protein", ">=", 10, "Good source of protein", None),
+)
+
+# Rules and score terms on these nutrients need label values: raw-food
+# amounts are the model's rough per-item estimates, too loose for a high/low call
+LABEL_ONLY_NUTRIENTS = frozenset({"total_sugars", "sodium"})
+
+# Health score: start at 50, add up to 25 per positive nutrient and take off
+# up to 20 per negative one, each scaled by its share of the reference amount
+SCORE_BASE = 50.0
+SCORE_POSITIVE = {"protein": 50.0, "dietary_fiber": 28.0}
+SCORE_NEGATIVE = {"total_sugars": 50.0, "sodium": 2300.0, "saturated_fat": 20.0}
+SCORE_POSITIVE_WEIGHT = 25.0
+SCORE_NEGATIVE_WEIGHT = 20.0
+
+# Nutrients the batch matrix carries, in column order
+BATCH_NUTRIENTS = tuple(dict.fromkeys(
+    [rule[0] for rule in THRESHOLD_RULES] + list(SCORE_POSITIVE) + list(SCORE_NEGATIVE)
+))
+
+# Work on floats and, elementwise, on arrays
+_COMPARE = {">": operator.gt, "<": operator.lt, ">=": operator.ge}
+
+
+def amount(parsed: ParsedResult, name: str) -> Optional[float]:
+    nutrient = parsed.nutrient(name)
+    return nutrient.amount if nutrient is not None else None
+
+
+def macro_ratio(parsed: ParsedResult) -> str:
+    """
+    Protein to carbohydrate ratio, e.g. "0.38:1"
+    """
+    protein, carbs = amount(parsed, "protein"), amount(parsed, "total_carbohydrates")
+    if protein is None or carbs is None:
+        return "Unable to calculate ratio"
+    if carbs == 0:
+        return "N/A"
+    return f"{round(protein / carbs, 2)}:1"
+
+
+def macro_distribution(parsed: ParsedResult) -> Optional[dict]:
+    """
+    Protein/carbs/fat shares of their combined weight, in percent
+    """
+    values = [amount(parsed, name) or 0.0 for name in ("protein", "total_carbohydrates", "total_fat")]
+    total = sum(values)
+    if total <= 0:
+        return None
+    protein, carbs, fat = (round(value / total * 100, 1) for value in values)
+    return {"protein_percentage": protein, "carbs_percentage": carbs, "fat_percentage": fat}
+
+
+def health_score(parsed: ParsedResult) -> float:
+    label = isinstance(parsed, PackagedResult)
+
+    def shares(references: dict) -> float:
+        return sum(min((amount(parsed, name) or 0.0) / reference, 1.0)
+                   for name, reference in references.items()
+                   if label or name not in LABEL_ONLY_NUTRIENTS)
+
+    # Same operation order as score_batch, so both round identically
+    score = (SCORE_BASE + SCORE_POSITIVE_WEIGHT * shares(SCORE_POSITIVE)
+             - SCORE_NEGATIVE_WEIGHT * shares(SCORE_NEGATIVE))
+    return round(min(max(score, 0.0), 100.0), 1)
+
+
+def nutrient_density(parsed: ParsedResult) -> float:
+    """
+    Mean %DV (capped at 100) of the vitamins and minerals on the label
+    """
+    nutrients = (
+        parsed.vitamins_minerals.values() if isinstance(parsed, PackagedResult)
+        else [n for item in parsed.items for n in item.vitamins_minerals.values()]
+    )
+    values = [min(n.daily_value, 100.0) for n in nutrients if n.daily_value is not None]
+    return round(sum(values) / len(values), 1) if values else 0.0
+
+
+def considerations(parsed: ParsedResult) -> list:
+    """
+    ``(consideration, recommendation)`` for every threshold rule that applies
+    """
+    matched = []
+    label = isinstance(parsed, PackagedResult)
+    for name, op, limit, consideration, recommendation in THRESHOLD_RULES:
+        if name in LABEL_ONLY_NUTRIENTS and not label:
+            continue
+        value = amount(parsed, name)
+        if value is not None and _COMPARE[op](value, limit):
+            matched.append((consideration, recommendation))
+    return matched
+
+
+def analysis_summary(parsed: ParsedResult) -> dict:
+    summary = {
+        "type": parsed.food_type,
+        "nutritional_highlights": [],
+        "health_score": health_score(parsed),
+        "macro_ratio": macro_ratio(parsed),
+        "recommendations": [rec for _, rec in considerations(parsed) if rec],
+    }
+    if isinstance(parsed, PackagedResult):
+        if parsed.calories is not None:
+            summary["nutritional_highlights"].append(f"Calories per serving: {parsed.calories:g}")
+        protein = amount(parsed, "protein")
+        if protein is not None:
+            summary["nutritional_highlights"].append(f"Protein per serving: {protein:g}g")
+    else:
+        for item in parsed.items:
+            calories = f"{item.calories:g}" if item.calories is not None else "unknown"
+            summary["nutritional_highlights"].append(
+                f"{item.food_name or 'Unknown food'}: {calories} calories per serving"
+            )
+    return summary
+
+
+def health_insights(parsed: ParsedResult) -> dict:
+    insights = {
+        "dietary_considerations": [text for text, _ in considerations(parsed)],
+        "nutrient_density_score": nutrient_density(parsed),
+        "health_benefits": [],
+        "consumption_tips": [],
+    }
+    distribution = macro_distribution(parsed)
+    if distribution is not None:
+        insights["macro_distribution"] = distribution
+
+    if isinstance(parsed, PackagedResult):
+        if parsed.allergens:
+            insights["dietary_considerations"].append(
+                f"Contains allergens: {', '.join(parsed.allergens)}"
+            )
+    else:
+        for item in parsed.items:
+            insights["health_benefits"].extend(item.health_benefits)
+            if item.storage_tips:
+                insights["consumption_tips"].append(
+                    f"Best ways to consume {item.food_name}: {'; '.join(item.storage_tips)}"
+                )
+    return insights
+
+
+def derive_insights(result: dict) -> dict:
+    """
+    Everything stored in ``FoodScan.insights`` for a scan result
+    """
+    parsed = parse_result(result)
+    return {
+        "rules_version": INSIGHT_RULES_VERSION,
+        "analysis_summary": analysis_summary(parsed),
+        "health_insights": health_insights(parsed),
+    }
+
+
+def nutrient_matrix(parsed: Sequence[ParsedResult], names: Sequence[str] = BATCH_NUTRIENTS):
+    """
+    ``len(parsed) x len(names)`` float array of amounts, NaN where missing
+    """
+    # Imported here so per-scan insights don't put NumPy on the startup path
+    import numpy as np
+
+    # One flat list converted in a single call; None becomes NaN
+    values = [amount(result, name) for result in parsed for name in names]
+    return np.array(values, dtype=float).reshape(len(parsed), len(names))
+
+
+def score_batch(parsed: Sequence[ParsedResult]) -> dict:
+    """
+    Health scores and threshold flags for many scans at once.
+
+    Returns ``{"health_score": (n,) array, "flags": (n, len(THRESHOLD_RULES))
+    bool array}``; row i matches ``health_score`` and ``considerations``
+    for ``parsed[i]``.
+    """
+    import numpy as np
+
+    matrix = nutrient_matrix(parsed)
+    label = np.fromiter((isinstance(p, PackagedResult) for p in parsed), bool, len(parsed))
+    column = {name: i for i, name in enumerate(BATCH_NUTRIENTS)}
+    filled = np.nan_to_num(matrix, nan=0.0)
+    for name in LABEL_ONLY_NUTRIENTS:
+        filled[~label, column[name]] = 0.0
+
+    def shares(references: dict):
+        cols = [column[name] for name in references]
+        return np.minimum(filled[:, cols] / np.array(list(references.values())), 1.0).sum(axis=1)
+
+    scores = (SCORE_BASE + SCORE_POSITIVE_WEIGHT * shares(SCORE_POSITIVE)
+              - SCORE_NEGATIVE_WEIGHT * shares(SCORE_NEGATIVE))
+    # Python's round() so ties land the same way as health_score()
+    scores = np.array([round(score, 1) for score in np.clip(scores, 0.0, 100.0).tolist()])
+
+    flags = np.zeros((len(parsed), len(THRESHOLD_RULES)), dtype=bool)
+    with np.errstate(invalid="ignore"):
+        for i, (name, op, limit, _, _) in enumerate(THRESHOLD_RULES):
+            # NaN compares False, so missing nutrients never flag
+            flags[:, i] = _COMPARE[op](matrix[:, column[name]], limit)
+            if name in LABEL_ONLY_NUTRIENTS:
+                flags[:, i] &= label
+    return {"health_score": scores, "flags": flags}
@@ -0,0 +1,36 @@
+"""
+Standalone job worker: drains the /jobs queue without serving HTTP.
+
+Runs the app's startup and shutdown (schema, model client, write-behind)
+with ``--workers`` job workers, so API processes can run with
+JOB_WORKERS=0 and leave the model calls to dedicated processes sharing
+the same database and blob store.
+
+    python -m app.job_worker --workers 4
+"""
+import argparse
+import asyncio
+import os
+import signal
+
+
+async def serve():
+    from app import main
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    async with main.lifespan(main.app):
+        main.logger.info("Job worker running with %s workers", main.job_queue.workers)
+        await stop.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run /jobs workers without the HTTP server")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("JOB_WORKERS", "2")))
+    args = parser.parse_args()
+
+    # Read by app.config when app.main is imported
+    os.environ["JOB_WORKERS"] = str(args.workers)
+    asyncio.run(serve())
@@ -0,0 +1,450 @@
+"""
+Durable analysis jobs: a queue kept in the analysis_jobs table and drained
+by worker tasks.
+
+POST /jobs stores the upload in the blob store and inserts a queued row.
+Workers claim rows with a conditional UPDATE, so any number of workers in
+any number of app processes can share the table, run the normal analysis
+pipeline on the stored image and record the resulting scan. A claim is a
+lease: if its worker dies mid-job, the job is picked up again once the
+lease expires.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, func, or_
+from sqlalchemy.exc import IntegrityError
+
+from app.database import SessionLocal
+from app.models import AnalysisJob, FoodScan
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+
+class JobRetry(Exception):
+    """
+    Transient failure (model unavailable, overloaded, timed out); the job
+    goes back in the queue, after ``retry_after`` seconds if given
+    """
+
+    def __init__(self, detail: str, retry_after: float = None):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class JobFailed(Exception):
+    """
+    Permanent failure; recorded on the job with the HTTP status it maps to
+    """
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def referenced_blobs(digests: list) -> set:
+    """
+    The subset of ``digests`` a job or a scan still refers to
+    """
+    db = SessionLocal()
+    try:
+        jobs = db.query(AnalysisJob.blob_sha256).filter(AnalysisJob.blob_sha256.in_(digests))
+        scans = db.query(FoodScan.blob_sha256).filter(FoodScan.blob_sha256.in_(digests))
+        return {digest for (digest,) in jobs.union(scans)}
+    finally:
+        db.close()
+
+
+class JobQueueFull(Exception):
+    """
+    Raised when ``max_queued`` jobs are already waiting
+    """
+
+
+class IdempotencyConflict(Exception):
+    """
+    An idempotency key was reused for a different upload
+    """
+
+
+def job_dict(job: AnalysisJob, scan_result=None) -> dict:
+    return {
+        "id": job.id,
+        "status": job.status,
+        "filename": job.filename,
+        "blob_sha256": job.blob_sha256,
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "scan_id": job.scan_id,
+        "error": {"status_code": job.error_status, "detail": job.error} if job.error else None,
+        "result": scan_result,
+    }
+
+
+class JobQueue:
+    """
+    Database-backed job queue plus the worker tasks that drain it.
+
+    ``process(job)`` runs one claimed job (a dict from job_dict) and returns
+    the id of the scan it stored; it raises JobRetry or JobFailed, and any
+    other exception fails the job with a 500. Failed attempts are retried
+    with exponential backoff up to ``max_attempts`` in total. At most
+    ``max_queued`` jobs wait at once (0 = unbounded). Finished jobs are
+    deleted ``retention`` seconds after they finish; with a ``blob_store``,
+    stored uploads no job or scan refers to are deleted after that long too
+    (an upload whose job was never queued leaves one).
+    """
+
+    def __init__(self, process, workers: int, lease_seconds: float, max_attempts: int,
+                 max_queued: int, poll_interval: float, retention: float,
+                 retry_base_delay: float = 2.0, blob_store=None):
+        self.process = process
+        self.workers = workers
+        self.max_queued = max_queued
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.retry_base_delay = retry_base_delay
+        self.blob_store = blob_store
+        self._tasks = []
+        self._closed = False
+        self._wakeup = None
+        self._stopping = None
+        self._finished = {}  # job id -> [asyncio.Event, waiters], for long-polls in this process
+        self.counters = {"succeeded": 0, "failed": 0, "retried": 0, "reclaimed": 0, "purged": 0,
+                         "swept_blobs": 0}
+
+    # Database side; blocking, called through run_in_threadpool
+
+    def enqueue(self, filename: str, blob_digest: str, idempotency_key: str = None) -> tuple:
+        """
+        Insert a queued job; returns ``(job, created)``.
+
+        With an idempotency key that is already in use the existing job is
+        returned instead (``created`` False), or IdempotencyConflict raised
+        if it was for a different upload. Raises JobQueueFull when
+        ``max_queued`` jobs are waiting.
+        """
+        db = SessionLocal()
+        try:
+            if idempotency_key is not None:
+                existing = self._by_key(db, idempotency_key)
+                if existing is not None:
+                    return self._replay(db, existing, blob_digest), False
+            queued = db.query(AnalysisJob).filter(AnalysisJob.status == QUEUED)
+            if self.max_queued and queued.count() >= self.max_queued:
+                raise JobQueueFull(f"{self.max_queued} jobs are already queued")
+
+            job = AnalysisJob(
+                id=uuid.uuid4().hex, idempotency_key=idempotency_key, status=QUEUED,
+                filename=filename, blob_sha256=blob_digest, attempts=0,
+                created_at=datetime.utcnow(), available_at=datetime.utcnow(),
+            )
+            db.add(job)
+            try:
+                db.commit()
+                return job_dict(job), True
+            except IntegrityError:
+                # A concurrent request with the same key inserted first
+                db.rollback()
+                existing = self._by_key(db, idempotency_key) if idempotency_key else None
+                if existing is None:
+                    raise
+                return self._replay(db, existing, blob_digest), False
+        finally:
+            db.close()
+
+    def _by_key(self, db, idempotency_key: str) -> Optional[AnalysisJob]:
+        return db.query(AnalysisJob).filter(AnalysisJob.idempotency_key == idempotency_key).first()
+
+    def _replay(self, db, job: AnalysisJob, blob_digest: str) -> dict:
+        if job.blob_sha256 != blob_digest:
+            raise IdempotencyConflict("Idempotency-Key was already used for a different upload")
+        return self._load(db, job)
+
+    def counts(self) -> dict:
+        """
+        Jobs waiting (queued, including retries not yet due) and leased to
+        a worker (running)
+        """
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(AnalysisJob.status, func.count())
+                .filter(AnalysisJob.status.in_((QUEUED, RUNNING)))
+                .group_by(AnalysisJob.status)
+                .all()
+            )
+        finally:
+            db.close()
+        return {QUEUED: 0, RUNNING: 0, **dict(rows)}
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """
+        A job with its scan result once it has succeeded, or None
+        """
+        db = SessionLocal()
+        try:
+            job = db.get(AnalysisJob, job_id)
+            return self._load(db, job) if job is not None else None
+        finally:
+            db.close()
+
+    def _load(self, db, job: AnalysisJob) -> dict:
+        scan_result = None
+        if job.status == SUCCEEDED and job.scan_id is not None:
+            scan_result = db.query(FoodScan.scan_result).filter(
+                FoodScan.id == job.scan_id
+            ).scalar()
+        return job_dict(job, scan_result)
+
+    def claim(self) -> Optional[dict]:
+        """
+        Lease the oldest runnable job: queued and due, or running with an
+        expired lease. Returns None when there is nothing to do.
+        """
+        db = SessionLocal()
+        try:
+            while True:
+                now = datetime.utcnow()
+                candidate = (
+                    db.query(AnalysisJob.id, AnalysisJob.status, AnalysisJob.attempts)
+                    .filter(or_(
+                        and_(AnalysisJob.status == QUEUED, AnalysisJob.available_at <= now),
+                        and_(AnalysisJob.status == RUNNING, AnalysisJob.lease_expires_at < now),
+                    ))
+                    .order_by(AnalysisJob.available_at)
+                    .first()
+                )
+                if candidate is None:
+                    return None
+
+                # The status/attempts check makes this a compare-and-swap: of
+                # several workers picking the same row only one updates it
+                claimed = db.query(AnalysisJob).filter(
+                    AnalysisJob.id == candidate.id,
+                    AnalysisJob.status == candidate.status,
+                    AnalysisJob.attempts == candidate.attempts,
+                )
+                if candidate.status == RUNNING and candidate.attempts >= self.max_attempts:
+                    updated = claimed.update({
+                        "status": FAILED, "error_status": 500, "finished_at": now,
+                        "error": "Worker stopped before finishing the job",
+                    }, synchronize_session=False)
+                    db.commit()
+                    self.counters["failed"] += updated
+                    continue
+                updated = claimed.update({
+                    "status": RUNNING,
+                    "attempts": candidate.attempts + 1,
+                    "started_at": now,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                }, synchronize_session=False)
+                db.commit()
+                if updated:
+                    if candidate.status == RUNNING:
+                        logger.warning("Reclaimed job %s after its lease expired", candidate.id)
+                        self.counters["reclaimed"] += 1
+                    return job_dict(db.get(AnalysisJob, candidate.id))
+        finally:
+            db.close()
+
+    def _finish(self, job_id: str, attempts: int, values: dict) -> bool:
+        # Only the worker holding the current lease may record an outcome
+        db = SessionLocal()
+        try:
+            updated = db.query(AnalysisJob).filter(
+                AnalysisJob.id == job_id,
+                AnalysisJob.status == RUNNING,
+                AnalysisJob.attempts == attempts,
+            ).update({"lease_expires_at": None, **values}, synchronize_session=False)
+            db.commit()
+            return bool(updated)
+        finally:
+            db.close()
+
+    def complete(self, job: dict, scan_id: int) -> bool:
+        return self._finish(job["id"], job["attempts"], {
+            "status": SUCCEEDED, "scan_id": scan_id, "finished_at": datetime.utcnow(),
+            "error": None, "error_status": None,
+        })
+
+    def fail(self, job: dict, status_code: int, detail: str) -> bool:
+        return self._finish(job["id"], job["attempts"], {
+            "status": FAILED, "error_status": status_code, "error": detail,
+            "finished_at": datetime.utcnow(),
+        })
+
+    def retry(self, job: dict, detail: str, retry_after: float = None) -> bool:
+        delay = retry_after or self.retry_base_delay * 2 ** (job["attempts"] - 1)
+        return self._finish(job["id"], job["attempts"], {
+            "status": QUEUED, "error": detail, "error_status": 503,
+            "available_at": datetime.utcnow() + timedelta(seconds=delay),
+        })
+
+    def purge(self) -> int:
+        """
+        Delete jobs that finished more than ``retention`` seconds ago; their
+        scans and stored uploads are kept
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention)
+        db = SessionLocal()
+        try:
+            deleted = db.query(AnalysisJob).filter(
+                AnalysisJob.status.in_(FINISHED), AnalysisJob.finished_at < cutoff
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        if deleted:
+            logger.info("Purged %s finished jobs", deleted)
+            self.counters["purged"] += deleted
+        if self.blob_store is not None:
+            swept = self.blob_store.sweep(referenced_blobs, self.retention)
+            if swept:
+                logger.info("Deleted %s unreferenced uploads", swept)
+                self.counters["swept_blobs"] += swept
+        return deleted
+
+    # Workers; run on the event loop
+
+    def start(self):
+        """
+        Start the worker and purge tasks; call from the app lifespan
+        """
+        if self._tasks:
+            return
+        self._closed = False
+        self._wakeup = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        if self.retention:
+            self._tasks.append(asyncio.create_task(self._purge_periodically()))
+
+    def notify(self):
+        """
+        Wake idle workers after a job was queued
+        """
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def close(self, timeout: float = 30):
+        """
+        Stop claiming jobs and wait for the ones running to finish. Jobs
+        still running after ``timeout`` are cancelled and picked up again
+        once their lease expires.
+        """
+        if not self._tasks:
+            return
+        self._closed = True
+        self._stopping.set()
+        self.notify()
+        done, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.error("Job workers did not stop within %.0fs", timeout)
+        self._tasks = []
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[dict]:
+        """
+        The job once it has finished or ``timeout`` seconds have passed,
+        whichever is first; None if it doesn't exist. Jobs finishing in this
+        process wake the waiter at once, others are seen on the next poll.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        waiting = None
+        try:
+            while True:
+                job = await run_in_threadpool(self.get, job_id)
+                remaining = deadline - loop.time()
+                if job is None or job["status"] in FINISHED or remaining <= 0:
+                    return job
+                if waiting is None:
+                    waiting = self._finished.setdefault(job_id, [asyncio.Event(), 0])
+                    waiting[1] += 1
+                try:
+                    await asyncio.wait_for(waiting[0].wait(), min(remaining, self.poll_interval))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # The last waiter drops the event, unless the job already did
+            if waiting is not None:
+                waiting[1] -= 1
+                if not waiting[1] and self._finished.get(job_id) is waiting:
+                    del self._finished[job_id]
+
+    async def _work(self):
+        while not self._closed:
+            self._wakeup.clear()
+            try:
+                job = await run_in_threadpool(self.claim)
+            except Exception as e:
+                logger.error("Claiming a job failed: %s", e)
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: dict):
+        try:
+            scan_id = await self.process(job)
+            recorded = await run_in_threadpool(self.complete, job, scan_id)
+            outcome = "succeeded"
+        except JobRetry as e:
+            if job["attempts"] >= self.max_attempts:
+                recorded = await run_in_threadpool(self.fail, job, 503, e.detail)
+                outcome = "failed"
+            else:
+                recorded = await run_in_threadpool(self.retry, job, e.detail, e.retry_after)
+                outcome = "retried"
+        except JobFailed as e:
+            recorded = await run_in_threadpool(self.fail, job, e.status_code, e.detail)
+            outcome = "failed"
+        except Exception as e:
+            logger.error("Job %s failed: %s", job["id"], e)
+            recorded = await run_in_threadpool(self.fail, job, 500, str(e))
+            outcome = "failed"
+
+        if not recorded:
+            # The lease expired and another worker took the job over
+            logger.warning("Job %s finished after losing its lease", job["id"])
+            return
+        self.counters[outcome] += 1
+        logger.debug("Job %s %s", job["id"], outcome)
+        waiting = self._finished.pop(job["id"], None)
+        if waiting is not None:
+            waiting[0].set()
+
+    async def _purge_periodically(self):
+        interval = min(self.retention, 3600)
+        while not self._closed:
+            try:
+                await run_in_threadpool(self.purge)
+            except Exception as e:
+                logger.error("Purging finished jobs failed: %s", e)
+            try:
+                await asyncio.wait_for(self._stopping.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        workers = self._tasks[:self.workers]
+        return {"workers": sum(not task.done() for task in workers), **self.counters}
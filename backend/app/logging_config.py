@@ -0,0 +1,110 @@
+"""
+Logging setup: JSON (or plain text) records written by a background thread.
+
+Request threads only put the LogRecord on a queue; message interpolation,
+JSON encoding and the write itself happen on the QueueListener's thread.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; anything else was passed via ``extra=``
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+# Libraries that log every request at INFO; only their warnings are kept
+QUIET_LOGGERS = ("httpx", "httpcore")
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line with the message, level, logger and any
+    ``extra`` fields
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that enqueues the record untouched.
+
+    The stock handler formats the message in the calling thread so records
+    can be pickled; the queue here never leaves the process, so formatting
+    is left to the listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configure_logging(level: str = "INFO", fmt: str = "json", stream=None):
+    """
+    Route all logging through a queue to a writer thread (stderr by default)
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(
+        JsonFormatter() if fmt == "json"
+        else logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    )
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.setLevel(level.upper())
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+    return _listener
+
+
+def stop_logging():
+    """
+    Flush queued records and stop the writer thread
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+def log_payload(logger: logging.Logger, label: str, text: str,
+                sample_rate: float, max_chars: int):
+    """
+    Log a model payload at DEBUG for a ``sample_rate`` fraction of calls,
+    truncated to ``max_chars`` (0 keeps it whole)
+    """
+    if not logger.isEnabledFor(logging.DEBUG) or random.random() >= sample_rate:
+        return
+    size = len(text)
+    if max_chars and size > max_chars:
+        text = text[:max_chars] + "..."
+    logger.debug("%s (%d chars): %s", label, size, text)
@@ -1,18 +1,217 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+import asyncio
+import base64
+import math
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+import tempfile
+from fastapi import Depends, FastAPI, File, Header, UploadFile, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from PIL import Image
-import io
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
+from sqlalchemy import and_, func, insert, or_
+from sqlalchemy.orm import Session
 import logging
-from app.food_analyzer import analyze_food_image
-from app.database import get_db, SessionLocal
+from app.analysis_engine import AnalysisEngine, EngineOverloaded, EngineTimeout
+from app.batch import is_archive, iter_archive, iterate_in_threadpool, read_item, run_batch
+from app.blob_store import BlobStore
+from app.config import (
+    ANALYSIS_MAX_IN_FLIGHT,
+    ANALYSIS_MAX_QUEUE,
+    ANALYSIS_TIMEOUT_SECONDS,
+    ANALYSIS_RETRY_AFTER_SECONDS,
+    BATCH_CONCURRENCY,
+    BLOB_STORE_DIR,
+    BLOB_STORE_ENABLED,
+    BATCH_INSERT_CHUNK,
+    BATCH_MAX_BYTES,
+    BATCH_MAX_FILES,
+    FRAME_QUALITY_ENABLED,
+    FRAME_QUALITY_MAX_BRIGHT_SHARE,
+    FRAME_QUALITY_MAX_DARK_SHARE,
+    FRAME_QUALITY_MAX_EDGE,
+    FRAME_QUALITY_MIN_ENTROPY,
+    FRAME_QUALITY_MIN_SHARPNESS,
+    HEALTH_DB_TIMEOUT_SECONDS,
+    HISTORY_MAX_LIMIT,
+    IMAGE_MAX_EDGE,
+    IMAGE_UPLOAD_FORMAT,
+    IMAGE_UPLOAD_QUALITY,
+    IMAGE_MAX_PIXELS,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_MAX_QUEUED,
+    JOB_MAX_WAIT_SECONDS,
+    JOB_POLL_INTERVAL,
+    JOB_RETENTION_SECONDS,
+    JOB_WORKERS,
+    LOG_FORMAT,
+    LOG_LEVEL,
+    PRODUCT_INDEX_ENABLED,
+    PRODUCT_INDEX_IDENTIFY_WITH_MODEL,
+    PRODUCT_INDEX_MAX_RESULTS,
+    PRODUCT_INDEX_MIN_MARGIN,
+    PRODUCT_INDEX_MIN_SIMILARITY,
+    RESULT_CACHE_ENABLED,
+    RESULT_CACHE_MAX_ENTRIES,
+    RESULT_CACHE_TTL_SECONDS,
+    RESULT_CACHE_PHASH_DISTANCE,
+    RESULT_CACHE_PERSISTENT,
+    RESULT_CACHE_PERSISTENT_MAX_AGE_SECONDS,
+    RESPONSE_GZIP_MIN_BYTES,
+    SCAN_CACHE_MAX_ENTRIES,
+    SERVER_TIMING_ENABLED,
+    STARTUP_DB_CONNECTIONS,
+    STARTUP_INIT_DB,
+    STARTUP_WARM_MODEL,
+    THUMBNAIL_SIZES,
+    UPLOAD_MAX_BYTES,
+    WRITE_BEHIND_ENABLED,
+    WRITE_BEHIND_BATCH_SIZE,
+    WRITE_BEHIND_FLUSH_INTERVAL,
+    WRITE_BEHIND_MAX_QUEUE,
+    WRITE_BEHIND_DRAIN_TIMEOUT,
+    model,
+    token_usage,
+)
+from app.food_analyzer import (
+    analyze_food_image,
+    finalize_single_pass,
+    identify_product,
+    stream_food_analysis,
+)
+from app.database import get_db, ping as ping_db, SessionLocal, warm_pool
+from app.frame_quality import FrameGate, FrameRejected
+from app.init_db import init_db
+from app.insights import INSIGHT_RULES_VERSION, derive_insights
+from app.jobs import IdempotencyConflict, JobFailed, JobQueue, JobQueueFull, JobRetry
+from app.logging_config import configure_logging
+from app.metrics import (
+    ANALYSIS_ERRORS,
+    CACHE_LOOKUPS,
+    FRAME_CHECKS,
+    Gauge,
+    MetricsMiddleware,
+    PRODUCT_LOOKUPS,
+    endpoint,
+    render as render_metrics,
+    stage,
+)
+from app.model_client import ModelUnavailable
 from app.models import FoodScan
+from app.nutrients import extract_nutrients
+from app.preprocessing import ImageTooLarge, prepare_image
+from app.product_index import ProductIndex, decode_barcode
+from app.result_cache import ResultCache, image_keys, phash_to_hex
+from app.scan_cache import ScanCache, make_cached_scan
+from app.serialization import FastJSONResponse, PathGZipMiddleware, dumps
+from app.streaming import sse_event
+from app.uploads import (
+    MULTIPART_OVERHEAD, BodySizeLimitMiddleware, file_size, sniff_upload, too_large_detail
+)
+from app.write_behind import WriteBehindQueue
 
 # Set up logging
-logging.basicConfig(level=logging.DEBUG)
+configure_logging(LOG_LEVEL, LOG_FORMAT)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Food Analyzer API")
+analysis_engine = AnalysisEngine(
+    max_in_flight=ANALYSIS_MAX_IN_FLIGHT,
+    max_queue=ANALYSIS_MAX_QUEUE,
+    timeout=ANALYSIS_TIMEOUT_SECONDS,
+    retry_after=ANALYSIS_RETRY_AFTER_SECONDS,
+)
+
+result_cache = ResultCache(
+    max_entries=RESULT_CACHE_MAX_ENTRIES,
+    ttl=RESULT_CACHE_TTL_SECONDS,
+    phash_distance=RESULT_CACHE_PHASH_DISTANCE,
+    persistent=RESULT_CACHE_PERSISTENT,
+    persistent_max_age=RESULT_CACHE_PERSISTENT_MAX_AGE_SECONDS,
+)
+
+scan_cache = ScanCache(max_entries=SCAN_CACHE_MAX_ENTRIES)
+insights_cache = ScanCache(max_entries=SCAN_CACHE_MAX_ENTRIES)
+
+blob_store = BlobStore(BLOB_STORE_DIR) if BLOB_STORE_ENABLED else None
+
+product_index = (
+    ProductIndex(PRODUCT_INDEX_MIN_SIMILARITY, PRODUCT_INDEX_MIN_MARGIN,
+                 PRODUCT_INDEX_MAX_RESULTS)
+    if PRODUCT_INDEX_ENABLED else None
+)
+
+frame_gate = (
+    FrameGate(FRAME_QUALITY_MIN_SHARPNESS, FRAME_QUALITY_MAX_DARK_SHARE,
+              FRAME_QUALITY_MAX_BRIGHT_SHARE, FRAME_QUALITY_MIN_ENTROPY, FRAME_QUALITY_MAX_EDGE)
+    if FRAME_QUALITY_ENABLED else None
+)
+
+Gauge("analysis_in_flight", "Analyses running on the engine",
+      callback=lambda: analysis_engine.in_flight)
+Gauge("analysis_queue_depth", "Analyses waiting for an engine slot",
+      callback=lambda: analysis_engine.queue_depth)
+Gauge("write_behind_queue_depth", "Scan rows accepted but not yet written",
+      callback=lambda: write_behind.depth)
+
+def job_counts() -> dict:
+    """
+    Queued and running job counts for the analysis_jobs gauge; empty when
+    the database can't be reached, so /metrics still answers
+    """
+    try:
+        return {(status,): count for status, count in job_queue.counts().items()}
+    except Exception as e:
+        logger.warning("Could not count jobs for /metrics: %s", e)
+        return {}
+
+Gauge("analysis_jobs", "Background jobs waiting (queued) or leased to a worker (running)",
+      labels=("status",), callback=job_counts)
+
+# Set by the lifespan; /health/ready reports ready only between startup and shutdown
+startup_state = {"ready": False, "seconds": None, "model": "not_initialized"}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    if STARTUP_INIT_DB:
+        await run_in_threadpool(init_db)
+    if STARTUP_DB_CONNECTIONS:
+        await run_in_threadpool(warm_pool, STARTUP_DB_CONNECTIONS)
+    if product_index is not None:
+        await run_in_threadpool(product_index.load)
+    if STARTUP_WARM_MODEL:
+        try:
+            await run_in_threadpool(model.warm)
+            startup_state["model"] = "ready"
+        except Exception as e:
+            # Still serve history and cached results; analyses will fail until fixed
+            logger.warning("Model client not initialized: %s", e)
+            startup_state["model"] = "unavailable"
+    if WRITE_BEHIND_ENABLED:
+        write_behind.start()
+    if JOB_WORKERS:
+        job_queue.start()
+    startup_state.update(ready=True, seconds=round(time.perf_counter() - started, 3))
+    logger.info("Startup complete in %.3fs", startup_state["seconds"])
+    yield
+    startup_state["ready"] = False
+    # Let running jobs finish; unfinished ones are retried once their lease expires
+    await job_queue.close(timeout=ANALYSIS_TIMEOUT_SECONDS)
+    # Flush queued scan rows before the worker exits
+    await write_behind.close(timeout=WRITE_BEHIND_DRAIN_TIMEOUT)
+    analysis_engine.shutdown(wait=False)
+
+app = FastAPI(title="Food Analyzer API", lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# Refuse oversized uploads before the multipart body is parsed; added
+# before CORS so the 413 still carries the CORS headers
+app.add_middleware(BodySizeLimitMiddleware, limits={
+    "/analyze": UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD,
+    "/analyze/stream": UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD,
+    "/jobs": UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD,
+    "/analyze/batch": BATCH_MAX_BYTES + MULTIPART_OVERHEAD,
+})
 
 # Enable CORS - Update this with all your frontend URLs
 app.add_middleware(
@@ -26,8 +225,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Compress the larger read-side JSON payloads
+if RESPONSE_GZIP_MIN_BYTES:
+    app.add_middleware(PathGZipMiddleware, prefixes=("/history", "/stats", "/results/"),
+                       minimum_size=RESPONSE_GZIP_MIN_BYTES)
+
+# Request counts and latency for /metrics, plus optional Server-Timing headers
+app.add_middleware(MetricsMiddleware, trace=SERVER_TIMING_ENABLED)
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -36,134 +244,976 @@ async def root():
         "version": "1.0",
         "endpoints": {
             "analyze": "/analyze",
+            "analyze_batch": "/analyze/batch",
+            "analyze_stream": "/analyze/stream",
             "health": "/health",
-            "history": "/history"
+            "health_live": "/health/live",
+            "health_ready": "/health/ready",
+            "history": "/history",
+            "jobs": "/jobs",
+            "job": "/jobs/{job_id}",
+            "history_search": "/history/search",
+            "results": "/results/{scan_id}",
+            "result_insights": "/results/{scan_id}/insights",
+            "stats": "/stats",
+            "cache_stats": "/cache/stats",
+            "metrics": "/metrics",
+            "token_usage": "/usage/tokens",
+            "scan_image": "/scans/{scan_id}/image"
         }
     }
 
+async def check_database() -> dict:
+    try:
+        latency = await asyncio.wait_for(run_in_threadpool(ping_db), HEALTH_DB_TIMEOUT_SECONDS)
+        return {"status": "connected", "latency_ms": round(latency * 1000, 2)}
+    except asyncio.TimeoutError:
+        return {"status": "unavailable", "error": "timed out"}
+    except Exception as e:
+        return {"status": "unavailable", "error": str(e)}
+
+@app.get("/health/live")
+async def liveness():
+    """
+    The process is up and serving requests; no dependencies are checked
+    """
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    """
+    200 once startup has finished and the database answers, 503 otherwise
+    (while starting, shutting down, or with the database unreachable)
+    """
+    database = await check_database() if startup_state["ready"] else None
+    ready = database is not None and database["status"] == "connected"
+    return FastJSONResponse(
+        {"status": "ready" if ready else "not_ready",
+         "startup_complete": startup_state["ready"], "database": database},
+        status_code=200 if ready else 503
+    )
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
-    return {
-        "status": "healthy",
+    """
+    Dependency report: database round trip, model client state, write-behind
+    queue and startup; 503 when the database is unreachable
+    """
+    database = await check_database()
+    breaker = (model.breaker.stats() if model.breaker else {}).get("state")
+    if database["status"] != "connected":
+        status = "unhealthy"
+    elif breaker == "open" or startup_state["model"] == "unavailable":
+        status = "degraded"
+    else:
+        status = "healthy"
+    return FastJSONResponse({
+        "status": status,
         "api_version": "1.0",
-        "database": "connected"
+        "database": database["status"],
+        "database_check": database,
+        "startup": startup_state,
+        "write_behind": write_behind.stats(),
+        "jobs": job_queue.stats(),
+        "model_client": model.stats()
+    }, status_code=503 if status == "unhealthy" else 200)
+
+def encode_cursor(created_at: datetime, scan_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{scan_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, scan_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(scan_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def history_page(db, limit: int, cursor: str = None, full: bool = False,
+                 filters=(), columns=()) -> dict:
+    """
+    One page of scans, newest first, using keyset pagination on (created_at, id)
+    """
+    columns = [FoodScan.id, FoodScan.image_path, FoodScan.created_at, FoodScan.food_type,
+               *columns]
+    if full:
+        columns.append(FoodScan.scan_result)
+
+    query = db.query(*columns).filter(*filters)
+    if cursor:
+        created_at, scan_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            FoodScan.created_at < created_at,
+            and_(FoodScan.created_at == created_at, FoodScan.id < scan_id)
+        ))
+    rows = (
+        query.order_by(FoodScan.created_at.desc(), FoodScan.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+
+    items = [row._asdict() for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.get("/history")
+def get_history(
+    limit: int = Query(50, ge=1, le=HISTORY_MAX_LIMIT),
+    cursor: str = None,
+    include: str = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Paginated scan history. Pass ``next_cursor`` back as ``cursor`` for the
+    next page; ``include=full`` adds each scan's ``scan_result``.
+    """
+    return FastJSONResponse(history_page(db, limit, cursor, full=include == "full"))
+
+# Columns that /history/search and /stats accept min_<name>/max_<name> filters for
+NUTRIENT_COLUMNS = {
+    "calories": FoodScan.calories,
+    "protein_g": FoodScan.protein_g,
+    "carbohydrates_g": FoodScan.carbohydrates_g,
+    "fat_g": FoodScan.fat_g,
+    "sugar_g": FoodScan.sugar_g,
+    "sodium_mg": FoodScan.sodium_mg,
+}
+
+STATS_GROUPS = {
+    "food_type": FoodScan.food_type,
+    "brand": FoodScan.brand,
+    "day": func.date(FoodScan.created_at),
+}
+
+def scan_filters(request: Request, food_type: str = None, q: str = None,
+                 since: datetime = None, until: datetime = None) -> list:
+    """
+    SQL filters shared by /history/search and /stats
+    """
+    filters = []
+    if food_type:
+        filters.append(FoodScan.food_type == food_type)
+    if q:
+        pattern = f"%{q}%"
+        filters.append(or_(FoodScan.product_name.ilike(pattern), FoodScan.brand.ilike(pattern)))
+    if since:
+        filters.append(FoodScan.created_at >= since)
+    if until:
+        filters.append(FoodScan.created_at < until)
+
+    for name, column in NUTRIENT_COLUMNS.items():
+        for prefix, compare in (("min_", column.__ge__), ("max_", column.__le__)):
+            value = request.query_params.get(prefix + name)
+            if value is None:
+                continue
+            try:
+                filters.append(compare(float(value)))
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"{prefix + name} must be a number")
+    return filters
+
+@app.get("/history/search")
+def search_history(
+    request: Request,
+    food_type: str = None,
+    q: str = None,
+    since: datetime = None,
+    until: datetime = None,
+    limit: int = Query(50, ge=1, le=HISTORY_MAX_LIMIT),
+    cursor: str = None,
+    include: str = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Filter scans in SQL, e.g. ``?min_sodium_mg=400&since=2024-06-01``.
+
+    Accepts ``min_``/``max_`` bounds for every nutrient column, a product
+    name/brand substring ``q``, and the same paging as /history.
+    """
+    filters = scan_filters(request, food_type, q, since, until)
+    return FastJSONResponse(history_page(
+        db, limit, cursor, full=include == "full", filters=filters,
+        columns=[FoodScan.product_name, FoodScan.brand, *NUTRIENT_COLUMNS.values()]
+    ))
+
+@app.get("/stats")
+def scan_stats(
+    request: Request,
+    food_type: str = None,
+    q: str = None,
+    since: datetime = None,
+    until: datetime = None,
+    group_by: str = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Count and nutrient aggregates over the filtered scans, optionally
+    grouped by food_type, brand or day
+    """
+    if group_by is not None and group_by not in STATS_GROUPS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"group_by must be one of: {', '.join(STATS_GROUPS)}"
+        )
+    filters = scan_filters(request, food_type, q, since, until)
+
+    aggregates = [func.count(FoodScan.id).label("count")]
+    for name, column in NUTRIENT_COLUMNS.items():
+        aggregates += [
+            func.avg(column).label(f"avg_{name}"),
+            func.min(column).label(f"min_{name}"),
+            func.max(column).label(f"max_{name}"),
+        ]
+
+    totals = db.query(*aggregates).filter(*filters).one()._asdict()
+    response = {"count": totals.pop("count"), "nutrients": nutrient_summary(totals)}
+
+    if group_by:
+        key = STATS_GROUPS[group_by].label("key")
+        rows = (
+            db.query(key, *aggregates)
+            .filter(*filters)
+            .group_by(key)
+            .order_by(key)
+            .all()
+        )
+        response["groups"] = [
+            {"key": row.key, "count": row.count,
+             "nutrients": nutrient_summary(row._asdict())}
+            for row in rows
+        ]
+    return response
+
+def nutrient_summary(row: dict) -> dict:
+    return {
+        name: {
+            stat: round(row[f"{stat}_{name}"], 2) if row[f"{stat}_{name}"] is not None else None
+            for stat in ("avg", "min", "max")
+        }
+        for name in NUTRIENT_COLUMNS
     }
 
-@app.post("/analyze")
-async def analyze_food(file: UploadFile = File(...)):
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Whether the request's If-None-Match covers ``etag``
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+def load_scan(scan_id: int):
+    """
+    Encode one stored scan for /results/{id}, or None if it doesn't exist
+    """
+    db = SessionLocal()
     try:
-        logger.info(f"Received file: {file.filename}")
-        
-        # Read file contents
-        contents = await file.read()
-        logger.info(f"File size: {len(contents)} bytes")
-        
-        try:
-            image = Image.open(io.BytesIO(contents))
-            logger.info(f"Image opened successfully. Size: {image.size}, Mode: {image.mode}")
-            
-            if image.mode not in ('RGB', 'L'):
-                image = image.convert('RGB')
-                logger.info("Converted image to RGB mode")
-            
-            # Analyze image
-            result = analyze_food_image(image)
-            logger.info("Analysis completed")
-            
-            return JSONResponse(content=result)
-            
-        except Exception as e:
-            logger.error(f"Error processing image: {str(e)}")
-            raise HTTPException(status_code=400, detail=str(e))
+        row = (
+            db.query(FoodScan.id, FoodScan.image_path, FoodScan.created_at, FoodScan.food_type,
+                     FoodScan.blob_sha256, FoodScan.scan_result)
+            .filter(FoodScan.id == scan_id)
+            .first()
+        )
+    finally:
+        db.close()
+    if row is None:
+        return None
+    scan = {
+        "id": row.id,
+        "image_path": row.image_path,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "food_type": row.food_type,
+        "image_url": f"/scans/{row.id}/image" if row.blob_sha256 else None,
+        "scan_result": row.scan_result,
+    }
+    return make_cached_scan(dumps(scan))
+
+def load_insights(scan_id: int):
+    """
+    Encode a scan's stored insights for /results/{id}/insights, deriving
+    and saving them first if they predate the current rules; None if the
+    scan doesn't exist
+    """
+    db = SessionLocal()
+    try:
+        row = (
+            db.query(FoodScan.scan_result, FoodScan.insights, FoodScan.insights_version)
+            .filter(FoodScan.id == scan_id)
+            .first()
+        )
+        if row is None:
+            return None
+        derived = row.insights
+        if derived is None or row.insights_version != INSIGHT_RULES_VERSION:
+            derived = derive_insights(row.scan_result)
+            db.query(FoodScan).filter(FoodScan.id == scan_id).update(
+                {"insights": derived, "insights_version": derived["rules_version"]}
+            )
+            db.commit()
+            logger.debug("Recomputed insights for scan %s", scan_id)
+    finally:
+        db.close()
+    return make_cached_scan(dumps({"scan_id": scan_id, **derived}))
+
+async def cached_scan_response(request: Request, cache: ScanCache, scan_id: int, load) -> Response:
+    """
+    Serve an encoded per-scan document from ``cache``, loading it on a
+    miss, with a strong ETag and 304 for a matching ``If-None-Match``
+    """
+    cached = cache.get(scan_id)
+    if cached is None:
+        cached = await run_in_threadpool(load, scan_id)
+        if cached is None:
+            raise HTTPException(status_code=404, detail="Scan not found")
+        cache.put(scan_id, cached)
+
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, cached.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+@app.get("/results/{scan_id}")
+async def get_result(scan_id: int, request: Request):
+    """
+    One stored scan by id, with a strong ETag over the response body;
+    ``If-None-Match`` with the current ETag gets 304
+    """
+    return await cached_scan_response(request, scan_cache, scan_id, load_scan)
+
+@app.get("/results/{scan_id}/insights")
+async def get_result_insights(scan_id: int, request: Request):
+    """
+    Analysis summary and health insights for a stored scan.
+
+    Derived when the scan is stored and only recomputed once, on read,
+    after the insight rules change; ``rules_version`` says which rules
+    produced them.
+    """
+    return await cached_scan_response(request, insights_cache, scan_id, load_insights)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {**result_cache.stats(), "scans": scan_cache.stats(),
+            "insights": insights_cache.stats(),
+            "products": product_index.stats() if product_index is not None else None}
+
+@app.get("/usage/tokens")
+async def token_usage_stats():
+    """
+    Model tokens since startup per calling endpoint: calls, prompt text,
+    image (estimated) and output tokens, and the average per call
+    """
+    return token_usage.stats()
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus text exposition of request, stage, model and cache metrics
+    """
+    # Off the event loop: the job gauge queries the database
+    body = await run_in_threadpool(render_metrics)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+# Originals never change under a digest, so clients may cache them forever
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@app.get("/scans/{scan_id}/image")
+def scan_image(scan_id: int, request: Request, size: int = None, db: Session = Depends(get_db)):
+    """
+    The original upload for a scan, or with ``size`` a JPEG thumbnail at
+    most that many pixels on its longest edge (one of THUMBNAIL_SIZES),
+    generated on first request and cached in the blob store
+    """
+    if size is not None and size not in THUMBNAIL_SIZES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"size must be one of: {', '.join(map(str, THUMBNAIL_SIZES))}"
+        )
+    digest = db.query(FoodScan.blob_sha256).filter(FoodScan.id == scan_id).scalar()
+    if blob_store is None or digest is None or not blob_store.exists(digest):
+        raise HTTPException(status_code=404, detail="No stored image for this scan")
+
+    etag = f'"{digest}"' if size is None else f'"{digest}-{size}"'
+    headers = {"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    if size is None:
+        with blob_store.open(digest) as blob:
+            media_type = sniff_upload(blob) or "application/octet-stream"
+        return FileResponse(blob_store.path_for(digest), media_type=media_type, headers=headers)
+    with stage("thumbnail"):
+        path = blob_store.thumbnail(digest, size)
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
+
+def scan_row(image_path: str, result: dict, keys=None, blob_digest: str = None) -> dict:
+    insights = derive_insights(result)
+    return {
+        "image_path": image_path,
+        "scan_result": result,
+        "food_type": "packaged" if "product_info" in result else "raw",
+        "image_hash": keys.digest if keys else None,
+        "perceptual_hash": phash_to_hex(keys.phash) if keys else None,
+        "blob_sha256": blob_digest,
+        "insights": insights,
+        "insights_version": insights["rules_version"],
+        **extract_nutrients(result),
+    }
 
+def store_scan(db: Session, image_path: str, result: dict, keys=None,
+               blob_digest: str = None) -> int:
+    try:
+        food_scan = FoodScan(**scan_row(image_path, result, keys, blob_digest))
+        db.add(food_scan)
+        with stage("db_commit"):
+            db.commit()
+        logger.debug("Result stored successfully")
+        return food_scan.id
     except Exception as e:
-        logger.error(f"Error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        db.rollback()
+        logger.error("Database error: %s", e)
+        raise
 
-@app.get("/history")
-async def get_history():
+def store_scans(rows: list):
+    """
+    Insert many scan rows in a single executemany + commit
+    """
+    if not rows:
+        return
     db = SessionLocal()
     try:
-        scans = db.query(FoodScan).order_by(FoodScan.created_at.desc()).all()
-        return [
-            {
-                "id": scan.id,
-                "image_path": scan.image_path,
-                "scan_result": scan.scan_result,
-                "created_at": scan.created_at,
-                "food_type": scan.food_type
-            }
-            for scan in scans
-        ]
+        with stage("db_commit"):
+            db.execute(insert(FoodScan), rows)
+            db.commit()
+        logger.debug("Stored %s results", len(rows))
+    except Exception as e:
+        logger.error("Database error: %s", e)
+        raise
     finally:
         db.close()
 
+write_behind = WriteBehindQueue(
+    store_rows=store_scans,
+    batch_size=WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=WRITE_BEHIND_FLUSH_INTERVAL,
+    max_queue=WRITE_BEHIND_MAX_QUEUE,
+)
+
+async def persist_scan(image_path: str, result: dict, keys=None, blob_digest: str = None):
+    """
+    Hand a scan row to the write-behind queue, writing it inline when
+    write-behind is disabled or the queue is full
+    """
+    row = scan_row(image_path, result, keys, blob_digest)
+    if WRITE_BEHIND_ENABLED and write_behind.submit(row):
+        return
+    await run_in_threadpool(store_scans, [row])
+
+async def save_blob(source):
+    """
+    Copy an upload (bytes or a file object) into the blob store and return
+    its digest, or None if the store is disabled or the write failed.
+
+    File objects are read from the start, so only call this once nothing
+    else is reading the same file.
+    """
+    if blob_store is None:
+        return None
+    try:
+        with stage("blob_write"):
+            return await run_in_threadpool(blob_store.put, source)
+    except Exception as e:
+        logger.error("Failed to store upload: %s", e)
+        return None
+
+async def read_upload(file: UploadFile):
+    """
+    Check an uploaded image's size and magic bytes and return its spooled
+    file, rewound, for the decoder to read from; nothing is copied into memory
+    """
+    with stage("upload_read"):
+        size = file.size if file.size is not None else await run_in_threadpool(file_size, file.file)
+        if size > UPLOAD_MAX_BYTES:
+            ANALYSIS_ERRORS.inc(type="too_large")
+            raise HTTPException(status_code=413, detail=too_large_detail(UPLOAD_MAX_BYTES))
+        mime_type = await run_in_threadpool(sniff_upload, file.file)
+    if mime_type is None:
+        ANALYSIS_ERRORS.inc(type="unsupported_media_type")
+        raise HTTPException(status_code=415, detail="Unsupported image format")
+    logger.debug("Upload is %s bytes of %s", size, mime_type)
+    return file.file
+
+async def prepare_upload(source):
+    """
+    Preprocess an upload (bytes or a file object) and look it up in the
+    result cache.
+
+    Returns ``(prepared, keys, cached_result)``; ``cached_result`` is None
+    on a miss. Undecodable images raise HTTPException, and frames failing
+    the quality gate a 422 whose detail has the ``reason``, a ``message``
+    for the user and the measured ``quality``.
+    """
+    # Decode, orient, downscale and re-encode before anything else
+    try:
+        prepared = await run_in_threadpool(
+            prepare_image, source, IMAGE_MAX_EDGE, IMAGE_UPLOAD_FORMAT, IMAGE_UPLOAD_QUALITY,
+            IMAGE_MAX_PIXELS
+        )
+        image = prepared.image
+        logger.debug(
+            "Image prepared. Size: %s -> %s, saved %s bytes and %s pixels",
+            prepared.original_size, image.size, prepared.bytes_saved, prepared.pixels_saved
+        )
+    except ImageTooLarge as e:
+        ANALYSIS_ERRORS.inc(type="too_large")
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        logger.error("Error processing image: %s", e)
+        ANALYSIS_ERRORS.inc(type="invalid_image")
+        raise HTTPException(status_code=400, detail="Invalid image format")
+
+    # Don't spend a model call on a frame it can't read
+    if frame_gate is not None:
+        try:
+            with stage("quality_gate"):
+                await run_in_threadpool(frame_gate.check, image)
+        except FrameRejected as e:
+            FRAME_CHECKS.inc(result=e.reason)
+            ANALYSIS_ERRORS.inc(type="poor_frame")
+            raise HTTPException(status_code=422, detail=e.detail)
+        FRAME_CHECKS.inc(result="ok")
+
+    # Serve repeat scans of the same image without calling the model
+    keys, cached = None, None
+    if RESULT_CACHE_ENABLED:
+        with stage("cache_lookup"):
+            keys = await run_in_threadpool(image_keys, image, RESULT_CACHE_PHASH_DISTANCE > 0)
+            cached = await run_in_threadpool(result_cache.get, keys)
+        CACHE_LOOKUPS.inc(result="miss" if cached is None else "hit")
+        if cached is not None:
+            logger.debug("Result cache hit")
+    return prepared, keys, cached
+
+async def match_product(prepared):
+    """
+    Canonical stored result for an upload of a product already in the
+    product index, or None.
+
+    Tries a barcode decoded locally first, then, only with
+    PRODUCT_INDEX_IDENTIFY_WITH_MODEL, a short identify call (a second
+    serial model call whenever it misses). Never raises: any failure just
+    means a full analysis.
+    """
+    if product_index is None or not len(product_index):
+        return None
+    try:
+        with stage("product_match"):
+            barcode = await run_in_threadpool(decode_barcode, prepared.image)
+            match = product_index.lookup(barcode=barcode) if barcode else None
+            if match is None and PRODUCT_INDEX_IDENTIFY_WITH_MODEL:
+                identity = await analysis_engine.run(identify_product, prepared.as_part())
+                match = product_index.lookup(
+                    identity.get("product_name"), identity.get("brand"),
+                    identity.get("barcode") or barcode
+                )
+            result = None
+            if match is not None:
+                result = await run_in_threadpool(product_index.result_for, match.entry)
+    except Exception as e:
+        logger.warning("Product identification failed: %s", e)
+        PRODUCT_LOOKUPS.inc(result="error")
+        return None
+    PRODUCT_LOOKUPS.inc(result=match.kind if result is not None else "miss")
+    if result is not None:
+        logger.debug("Product index %s match (score %s)", match.kind, match.score)
+    return result
+
+def index_product(result: dict):
+    """
+    Make a freshly extracted packaged result the canonical one for its product
+    """
+    if product_index is not None and "product_info" in result:
+        product_index.add_result(result)
+
+async def analyze_upload(source):
+    """
+    Run the analysis pipeline for one uploaded image (bytes or a file object).
+
+    Returns ``(result, keys, cached)``; failures raise HTTPException.
+    """
+    prepared, keys, cached = await prepare_upload(source)
+    return await analyze_prepared(prepared, keys, cached)
+
+async def analyze_prepared(prepared, keys, cached):
+    """
+    Model call for an upload prepare_upload() has already decoded
+    """
+    if cached is not None:
+        return cached, keys, True
+
+    # Known products are answered from their stored result
+    matched = await match_product(prepared)
+    if matched is not None:
+        if keys is not None:
+            result_cache.put(keys, matched)
+        return matched, keys, True
+
+    # Analyze image off the event loop
+    logger.debug("Starting image analysis...")
+    try:
+        result = await analysis_engine.run(analyze_food_image, prepared.as_part())
+    except EngineOverloaded as e:
+        logger.warning("Analysis queue full, shedding request")
+        ANALYSIS_ERRORS.inc(type="overloaded")
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except EngineTimeout as e:
+        logger.error("Analysis timed out: %s", e)
+        ANALYSIS_ERRORS.inc(type="timeout")
+        raise HTTPException(status_code=504, detail=str(e))
+    except ModelUnavailable as e:
+        logger.warning("Model unavailable, shedding request: %s", e)
+        ANALYSIS_ERRORS.inc(type="model_unavailable")
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    logger.debug("Analysis completed")
+
+    if isinstance(result, dict) and "error" in result:
+        logger.error("Analysis error: %s", result['error'])
+        ANALYSIS_ERRORS.inc(type="analysis_error")
+        raise HTTPException(status_code=400, detail=result["error"])
+
+    if keys is not None:
+        result_cache.put(keys, result)
+    index_product(result)
+    return result, keys, False
+
 @app.post("/analyze")
 async def analyze_food(file: UploadFile = File(...)):
     try:
-        logger.info(f"Starting analysis for file: {file.filename}")
-        
-        # Log file details
-        contents = await file.read()
-        logger.info(f"File size: {len(contents)} bytes")
+        logger.debug("Starting analysis for file: %s", file.filename)
         
         # Validate file type
         if not file.content_type.startswith('image/'):
-            logger.warning(f"Invalid content type received: {file.content_type}")
+            logger.warning("Invalid content type received: %s", file.content_type)
             raise HTTPException(
                 status_code=400,
                 detail=f"File must be an image. Received: {file.content_type}"
             )
 
-        # Process image
-        try:
-            image = Image.open(io.BytesIO(contents))
-            logger.info(f"Image opened successfully. Size: {image.size}, Mode: {image.mode}")
-            
-            if image.mode not in ('RGB', 'L'):
-                logger.info(f"Converting image from {image.mode} to RGB")
-                image = image.convert('RGB')
-            
-        except Exception as e:
-            logger.error(f"Error processing image: {str(e)}")
-            raise HTTPException(status_code=400, detail="Invalid image format")
+        # Decode straight from the spooled upload instead of reading it into memory
+        upload = await read_upload(file)
+        prepared, keys, cached = await prepare_upload(upload)
 
-        # Analyze image
-        logger.info("Starting image analysis...")
-        result = analyze_food_image(image)
-        logger.info("Analysis completed")
-        
-        if isinstance(result, dict) and "error" in result:
-            logger.error(f"Analysis error: {result['error']}")
-            raise HTTPException(status_code=400, detail=result["error"])
-
-        # Store in database
-        logger.info("Storing result in database...")
-        db = SessionLocal()
+        # The decoder is done with the upload; copy it to the blob store
+        # while the model runs
+        blob = asyncio.ensure_future(save_blob(upload))
         try:
-            food_scan = FoodScan(
-                image_path=file.filename,
-                scan_result=result,
-                food_type="packaged" if "product_info" in result else "raw"
-            )
-            db.add(food_scan)
-            db.commit()
-            logger.info("Result stored successfully")
-        except Exception as e:
-            logger.error(f"Database error: {str(e)}")
-            raise
+            result, keys, _ = await analyze_prepared(prepared, keys, cached)
         finally:
-            db.close()
+            blob_digest = await blob
+
+        # Persist off the response path
+        await persist_scan(file.filename, result, keys, blob_digest)
 
-        return JSONResponse(content=result)
+        return FastJSONResponse(content=result)
 
     except HTTPException as he:
         raise he
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
+        logger.error("Unexpected error: %s", e)
+        ANALYSIS_ERRORS.inc(type="unexpected")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def stream_events(filename: str, prepared, keys, cached, blob=None):
+    """
+    Server-sent events for /analyze/stream
+    """
+    try:
+        async for event in analysis_events(filename, prepared, keys, cached, blob):
+            yield event
+    finally:
+        # Don't leave the blob write reading an upload that's about to close
+        if blob is not None:
+            await blob
+
+async def analysis_events(filename: str, prepared, keys, cached, blob):
+    if cached is None:
+        cached = await match_product(prepared)
+        if cached is not None and keys is not None:
+            result_cache.put(keys, cached)
+    if cached is not None:
+        for key, value in cached.items():
+            yield sse_event("section", {"key": key, "value": value})
+        await persist_scan(filename, cached, keys, blob and await blob)
+        yield sse_event("result", cached)
+        return
+
+    loop = asyncio.get_running_loop()
+    sections = asyncio.Queue()
+
+    def pump():
+        # Runs on the analysis pool; hands sections to the event loop
+        for section in stream_food_analysis(prepared.as_part()):
+            loop.call_soon_threadsafe(sections.put_nowait, section)
+
+    job = asyncio.ensure_future(analysis_engine.run(pump))
+    job.add_done_callback(lambda _: sections.put_nowait(None))
+
+    result = {}
+    while (section := await sections.get()) is not None:
+        key, value = section
+        result[key] = value
+        yield sse_event("section", {"key": key, "value": value})
+
+    try:
+        await job
+    except EngineOverloaded as e:
+        ANALYSIS_ERRORS.inc(type="overloaded")
+        yield sse_event("error", {"status_code": 503, "detail": str(e),
+                                  "retry_after": e.retry_after})
+        return
+    except EngineTimeout as e:
+        ANALYSIS_ERRORS.inc(type="timeout")
+        yield sse_event("error", {"status_code": 504, "detail": str(e)})
+        return
+    except ModelUnavailable as e:
+        ANALYSIS_ERRORS.inc(type="model_unavailable")
+        yield sse_event("error", {"status_code": 503, "detail": str(e),
+                                  "retry_after": math.ceil(e.retry_after)})
+        return
+    except Exception as e:
+        logger.error("Streaming analysis failed: %s", e)
+        ANALYSIS_ERRORS.inc(type="model_error")
+        yield sse_event("error", {"status_code": 502,
+                                  "detail": f"Error processing with Gemini: {str(e)}"})
+        return
+
+    result = finalize_single_pass(result)
+    if "error" in result:
+        ANALYSIS_ERRORS.inc(type="analysis_error")
+        yield sse_event("error", {"status_code": 400, "detail": result["error"]})
+        return
+    if keys is not None:
+        result_cache.put(keys, result)
+    index_product(result)
+    await persist_scan(filename, result, keys, blob and await blob)
+    yield sse_event("result", result)
+
+@app.post("/analyze/stream")
+async def analyze_food_stream(file: UploadFile = File(...)):
+    """
+    Streamed single-pass analysis over server-sent events.
+
+    Emits a ``section`` event (``{"key", "value"}``) as each top-level part
+    of the result completes, then ``result`` with the full result, or
+    ``error`` with ``status_code`` and ``detail``.
+    """
+    if not file.content_type.startswith('image/'):
+        raise HTTPException(
+            status_code=400,
+            detail=f"File must be an image. Received: {file.content_type}"
+        )
+    upload = await read_upload(file)
+    prepared, keys, cached = await prepare_upload(upload)
+    # The upload stays open until the response finishes
+    blob = asyncio.ensure_future(save_blob(upload))
+
+    return StreamingResponse(
+        stream_events(file.filename, prepared, keys, cached, blob),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def run_job(job: dict) -> int:
+    """
+    Analyze a claimed job's stored upload like /analyze and store the scan
+    inline, returning its id. 503/504 outcomes are retried, other errors
+    fail the job.
+    """
+    if blob_store is None:
+        raise JobFailed(503, "Blob store is disabled")
+    try:
+        with blob_store.open(job["blob_sha256"]) as upload:
+            prepared, keys, cached = await prepare_upload(upload)
+        # Workers run outside any request; bill their model calls to /jobs
+        with endpoint("/jobs"):
+            result, keys, _ = await analyze_prepared(prepared, keys, cached)
+    except HTTPException as e:
+        if e.status_code in (503, 504):
+            retry_after = (e.headers or {}).get("Retry-After")
+            raise JobRetry(e.detail, float(retry_after) if retry_after else None)
+        # Structured details (e.g. a rejected frame) carry a message for the user
+        detail = e.detail["message"] if isinstance(e.detail, dict) else e.detail
+        raise JobFailed(e.status_code, detail)
+
+    def store() -> int:
+        db = SessionLocal()
+        try:
+            return store_scan(db, job["filename"], result, keys, job["blob_sha256"])
+        finally:
+            db.close()
+    return await run_in_threadpool(store)
+
+job_queue = JobQueue(
+    process=run_job,
+    workers=JOB_WORKERS,
+    lease_seconds=JOB_LEASE_SECONDS,
+    max_attempts=JOB_MAX_ATTEMPTS,
+    max_queued=JOB_MAX_QUEUED,
+    poll_interval=JOB_POLL_INTERVAL,
+    retention=JOB_RETENTION_SECONDS,
+    blob_store=blob_store,
+)
+
+def job_response(job: dict) -> dict:
+    job = {key: value for key, value in job.items() if key != "blob_sha256"}
+    return {
+        **job,
+        "status_url": f"/jobs/{job['id']}",
+        "result_url": f"/results/{job['scan_id']}" if job["scan_id"] is not None else None,
+    }
+
+@app.post("/jobs", status_code=202)
+async def create_job(
+    file: UploadFile = File(...),
+    idempotency_key: str = Header(None, max_length=255),
+):
+    """
+    Queue an analysis and answer at once with the job; poll
+    ``GET /jobs/{id}`` (optionally long-polling with ``?wait=``) for the
+    result.
+
+    With an ``Idempotency-Key`` header, retrying the same upload with the
+    same key returns the original job (200, ``Idempotent-Replayed: true``)
+    instead of queuing another; reusing a key for a different upload is a 422.
+    """
+    if blob_store is None:
+        raise HTTPException(status_code=503, detail="Background jobs need the blob store")
+    if not file.content_type.startswith('image/'):
+        raise HTTPException(
+            status_code=400,
+            detail=f"File must be an image. Received: {file.content_type}"
+        )
+    upload = await read_upload(file)
+    digest = await save_blob(upload)
+    if digest is None:
+        raise HTTPException(status_code=503, detail="Could not store the upload")
+
+    try:
+        job, created = await run_in_threadpool(
+            job_queue.enqueue, file.filename, digest, idempotency_key
+        )
+    except IdempotencyConflict as e:
+        # A blob no job was queued for is left to the job queue's sweep:
+        # another request may have stored the same bytes meanwhile
+        raise HTTPException(status_code=422, detail=str(e))
+    except JobQueueFull as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(ANALYSIS_RETRY_AFTER_SECONDS)}
+        )
+    headers = {"Location": f"/jobs/{job['id']}"}
+    if created:
+        job_queue.notify()
+    else:
+        headers["Idempotent-Replayed"] = "true"
+    return FastJSONResponse(job_response(job), status_code=202 if created else 200,
+                            headers=headers)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = Query(0, ge=0, le=JOB_MAX_WAIT_SECONDS)):
+    """
+    A job's status: ``result`` once it has succeeded, ``error``
+    (``status_code``, ``detail``) after a failure or while it waits to be
+    retried. With ``wait`` the request is held for up to that many seconds
+    until the job finishes.
+    """
+    job = await job_queue.wait(job_id, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return FastJSONResponse(job_response(job))
+
+async def batch_items(uploads, spool=None):
+    """
+    Yield ``(filename, contents)`` from uploaded files, expanding archives;
+    items over UPLOAD_MAX_BYTES or not images come with the HTTPException
+    to report instead of their bytes
+    """
+    try:
+        if spool is not None:
+            async for item in iterate_in_threadpool(iter_archive(spool, UPLOAD_MAX_BYTES)):
+                yield item
+        for upload in uploads:
+            if is_archive(upload.filename, upload.content_type):
+                archive = iter_archive(upload.file, UPLOAD_MAX_BYTES)
+                async for item in iterate_in_threadpool(archive):
+                    yield item
+            elif upload.size is not None and upload.size > UPLOAD_MAX_BYTES:
+                yield upload.filename, HTTPException(
+                    status_code=413, detail=too_large_detail(UPLOAD_MAX_BYTES)
+                )
+            else:
+                await upload.seek(0)
+                yield upload.filename, await run_in_threadpool(
+                    read_item, upload.file, UPLOAD_MAX_BYTES
+                )
+    finally:
+        if spool is not None:
+            spool.close()
+
+@app.post("/analyze/batch")
+async def analyze_batch(request: Request):
+    """
+    Analyze many images and stream one NDJSON line per item as it finishes.
+
+    Accepts multipart ``files`` (images and/or zip/tar archives) or a raw
+    zip/tar request body.
+    """
+    # The body is spooled before streaming starts: once the response is
+    # streaming, the server owns receive() to watch for disconnects.
+    content_type = request.headers.get("content-type", "")
+    uploads, spool = [], None
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form(max_files=BATCH_MAX_FILES)
+        uploads = form.getlist("files")
+    elif is_archive("", content_type):
+        # Roll over to disk for large archives
+        spool = tempfile.SpooledTemporaryFile(max_size=32 * 1024 * 1024)
+        async for chunk in request.stream():
+            await run_in_threadpool(spool.write, chunk)
+    else:
+        raise HTTPException(
+            status_code=415,
+            detail="Send multipart 'files' or a zip/tar archive body"
+        )
+
+    return StreamingResponse(
+        run_batch(
+            batch_items(uploads, spool),
+            analyze=analyze_upload,
+            make_row=scan_row,
+            store_rows=store_scans,
+            store_blob=save_blob,
+            concurrency=BATCH_CONCURRENCY,
+            chunk_size=BATCH_INSERT_CHUNK,
+        ),
+        media_type="application/x-ndjson"
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
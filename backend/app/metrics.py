@@ -0,0 +1,285 @@
+"""
+Prometheus-style metrics and per-request stage timing.
+
+Counters, gauges and histograms render in the Prometheus text exposition
+format for /metrics. ``stage(name)`` times one step of the analysis pipeline
+into ``analysis_stage_seconds`` and, when the request is being traced, into
+its ``Server-Timing`` header.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REGISTRY = []
+
+# Stage timings of the current request, or None when it is not traced
+_trace = contextvars.ContextVar("metrics_trace", default=None)
+# ASGI scope of the current request (its route is resolved once routed), or
+# a fixed name set with ``endpoint``; None outside requests
+_endpoint = contextvars.ContextVar("metrics_endpoint", default=None)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down; ``callback`` computes it at scrape time
+    (for a gauge with labels, as a dict of label-value tuples to values)
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), callback=None):
+        super().__init__(name, documentation, labels)
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> list:
+        if self.callback is not None:
+            value = self.callback()
+            if self.labels:
+                with self._lock:
+                    self._values = dict(value)
+            else:
+                self.set(value)
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (),
+                 buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket counts, then the sum and count of observations
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((key, (list(counts), total, count))
+                           for key, (counts, total, count) in self._values.items())
+        for key, (counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.labels, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            labels = _format_labels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "analysis_stage_seconds", "Time spent in each analysis pipeline stage", ("stage",)
+)
+MODEL_CALLS = Counter(
+    "model_calls_total", "Model backend calls by outcome", ("outcome",)
+)
+MODEL_TOKENS = Counter(
+    "model_tokens_total", "Model tokens by calling endpoint and kind (prompt, image, output)",
+    ("endpoint", "kind")
+)
+CACHE_LOOKUPS = Counter(
+    "result_cache_lookups_total", "Result cache lookups by outcome", ("result",)
+)
+PRODUCT_LOOKUPS = Counter(
+    "product_index_lookups_total", "Product index lookups by outcome", ("result",)
+)
+FRAME_CHECKS = Counter(
+    "frame_quality_checks_total", "Frame-quality gate verdicts (ok or rejection reason)",
+    ("result",)
+)
+ANALYSIS_ERRORS = Counter(
+    "analysis_errors_total", "Failed analyses by error type", ("type",)
+)
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+)
+HTTP_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency until the response starts",
+    ("method", "route")
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being handled")
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a pipeline stage into analysis_stage_seconds and the request trace
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append((name, elapsed))
+
+
+@contextmanager
+def endpoint(name: str):
+    """
+    Attribute work done outside a request (e.g. a background job) to ``name``
+    """
+    token = _endpoint.set(name)
+    try:
+        yield
+    finally:
+        _endpoint.reset(token)
+
+
+def current_endpoint() -> str:
+    """
+    Route template of the current request, the name set with ``endpoint``,
+    or "background"
+    """
+    value = _endpoint.get()
+    if value is None:
+        return "background"
+    return value if isinstance(value, str) else _route(value)
+
+
+def server_timing(trace: list) -> str:
+    """
+    Format stage timings as a Server-Timing header value (durations in ms)
+    """
+    totals = {}
+    for name, elapsed in trace:
+        totals[name] = totals.get(name, 0.0) + elapsed
+    return ", ".join(f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in totals.items())
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting requests by route and status, and adding a
+    Server-Timing header with the request's stage timings when ``trace`` is on
+    """
+
+    def __init__(self, app, trace: bool = False):
+        self.app = app
+        self.trace = trace
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = [] if self.trace else None
+        token = _trace.set(trace)
+        endpoint_token = _endpoint.set(scope)
+        start = time.perf_counter()
+        status = 500
+        HTTP_IN_FLIGHT.inc()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = time.perf_counter() - start
+                route = _route(scope)
+                HTTP_SECONDS.observe(elapsed, method=scope["method"], route=route)
+                if trace is not None:
+                    timing = server_timing(trace + [("total", elapsed)])
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", timing.encode("latin-1"))
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            HTTP_REQUESTS.inc(method=scope["method"], route=_route(scope), status=status)
+            _trace.reset(token)
+            _endpoint.reset(endpoint_token)
+
+
+def _route(scope) -> str:
+    # The route template keeps label cardinality bounded (no ids or queries)
+    route = scope.get("route")
+    return getattr(route, "path", "unmatched")
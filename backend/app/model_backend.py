@@ -0,0 +1,378 @@
+"""
+Model backends used by food_analyzer.
+
+Every backend exposes ``generate_content(contents, stream=False)`` and returns
+an object with ``.text`` and ``.usage_metadata`` attributes (or, when
+streaming, an iterable of them with the usage on the last), i.e. the subset
+of ``genai.GenerativeModel`` the analyzer relies on.
+
+- GeminiBackend: the real model, configured on first use
+- FakeBackend: canned packaged/raw responses with simulated latency and failures
+- RecordingBackend: wraps another backend and saves its responses to disk
+- ReplayBackend: serves responses saved by RecordingBackend
+"""
+import hashlib
+import io
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from app.response_schemas import NUTRIENT_PANELS
+from app.token_usage import Usage, estimate_usage
+
+logger = logging.getLogger(__name__)
+
+PACKAGED_RESULT = {
+    "product_info": {"product_name": "Bench Bar", "brand": "Bench", "package_size": "40g",
+                     "barcode": "4006381333931"},
+    "nutrition_facts": {
+        "serving_size": {"amount": "40", "unit": "g", "servings_per_container": "1"},
+        "calories": "200",
+        "macronutrients": {
+            "total_fat": {"amount": "8", "unit": "g", "daily_value": "10"},
+            "sodium": {"amount": "150", "unit": "mg", "daily_value": "7"},
+            "total_carbohydrates": {"amount": "24", "unit": "g", "daily_value": "9"},
+            "total_sugars": {"amount": "12", "unit": "g"},
+            "protein": {"amount": "9", "unit": "g", "daily_value": "18"},
+        },
+        "vitamins_minerals": {},
+    },
+    "ingredients": ["oats", "honey", "peanuts"],
+    "allergens": ["peanuts"],
+    "dietary_info": {"is_vegetarian": True, "is_vegan": False, "is_gluten_free": False},
+    "storage_instructions": "Store in a cool, dry place",
+    "manufacturer_info": "",
+}
+
+RAW_RESULT = {
+    "food_identification": {"items": ["apple"], "total_items": 1},
+    "nutritional_info": [
+        {
+            "food_name": "apple",
+            "serving_size": "1 medium (182g)",
+            "nutrition_facts": {
+                "calories": "95",
+                "macronutrients": {"protein": "0.5g", "carbohydrates": "25g", "fiber": "4g",
+                                   "sugars": "19g", "total_fat": "0.3g"},
+                "vitamins_minerals": {"vitamin_c": "8.4mg", "potassium": "195mg"},
+            },
+            "health_benefits": ["Good source of fiber"],
+            "storage_tips": ["Refrigerate to keep crisp"],
+        }
+    ],
+    "combination_suggestions": ["peanut butter"],
+    "seasonal_info": {},
+}
+
+
+class ModelResponse:
+    def __init__(self, text: str, usage_metadata: Usage = None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class ReplayMiss(LookupError):
+    """
+    No recorded response matches the request
+    """
+
+
+class GeminiBackend:
+    """
+    ``genai.GenerativeModel`` created lazily, so the app imports without an API key
+    """
+
+    def __init__(self, api_key: str, model_name: str):
+        self.api_key = api_key
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    if not self.api_key:
+                        raise ValueError("GOOGLE_API_KEY not found in environment variables")
+                    import google.generativeai as genai
+
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def warm(self):
+        """
+        Import and configure the SDK now rather than on the first call
+        """
+        self._get_model()
+
+    def generate_content(self, contents, stream: bool = False, timeout: float = None, **kwargs):
+        if timeout is not None:
+            kwargs.setdefault("request_options", {"timeout": timeout})
+        return self._get_model().generate_content(contents, stream=stream, **kwargs)
+
+
+class FakeBackend:
+    """
+    Deterministic stand-in for Gemini that counts calls and bytes uploaded.
+
+    Latency is log-normal around ``latency`` seconds (``latency_sigma`` = 0
+    makes it constant), ``straggler_rate`` of calls take ``straggler_factor``
+    times longer and ``failure_rate`` of calls raise ConnectionError (retried
+    like Gemini's ServiceUnavailable, without needing the Google SDK).
+    Images whose top-left pixel is dark are treated as packaged products,
+    everything else as raw food, so both branches get exercised.
+    """
+
+    def __init__(self, latency: float = 0.0, latency_sigma: float = 0.0,
+                 failure_rate: float = 0.0, seed: int = None,
+                 straggler_rate: float = 0.0, straggler_factor: float = 10.0):
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.failure_rate = failure_rate
+        self.straggler_rate = straggler_rate
+        self.straggler_factor = straggler_factor
+        self.calls = 0
+        self.failures = 0
+        self.bytes_uploaded = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.failures = 0
+            self.bytes_uploaded = 0
+
+    def generate_content(self, contents, stream: bool = False, **kwargs):
+        uploaded = 0
+        image = None
+        for part in contents:
+            if isinstance(part, str):
+                uploaded += len(part.encode("utf-8"))
+            elif isinstance(part, Image.Image):
+                # Sized as a JPEG, without going through the Google SDK
+                image = part
+                encoded = io.BytesIO()
+                rgb = part if part.mode in ("RGB", "L") else part.convert("RGB")
+                rgb.save(encoded, "JPEG")
+                uploaded += encoded.tell()
+            elif isinstance(part, dict) and "data" in part:
+                image = Image.open(io.BytesIO(part["data"]))
+                uploaded += len(part["data"])
+
+        with self._lock:
+            self.calls += 1
+            self.bytes_uploaded += uploaded
+            delay = self.latency
+            if delay and self.latency_sigma:
+                delay *= math.exp(self._random.gauss(0, self.latency_sigma))
+            if self._random.random() < self.straggler_rate:
+                delay *= self.straggler_factor
+            failed = self._random.random() < self.failure_rate
+            if failed:
+                self.failures += 1
+
+        if failed:
+            # Fail after part of the latency, like a backend error would
+            time.sleep(delay / 2)
+            raise ConnectionError("Fake backend failure")
+
+        text = self.respond(contents[0], image, structured=schema_chars(kwargs) > 0)
+        usage = estimate_usage(contents, text, schema_chars(kwargs))
+        if stream:
+            return stream_text(text, delay, usage)
+        if delay:
+            time.sleep(delay)
+        return ModelResponse(text, usage)
+
+    def respond(self, prompt: str, image, structured: bool = False) -> str:
+        """
+        Canned answer to ``prompt``; ``structured`` answers in the shape of
+        the response schemas (nutrient panels as lists)
+        """
+        packaged = image is None or is_packaged(image)
+        encode = structured_output if structured else json.dumps
+        if "Identify the packaged product" in prompt:
+            info = PACKAGED_RESULT["product_info"] if packaged else {}
+            return json.dumps({key: info.get(key, "")
+                               for key in ("product_name", "brand", "barcode")})
+        if "Respond with only 'true'" in prompt:
+            return "true" if packaged else "false"
+        if '"food_type"' in prompt:
+            result = {"food_type": "packaged" if packaged else "raw"}
+            result.update(PACKAGED_RESULT if packaged else RAW_RESULT)
+            return encode(result)
+        if "product label" in prompt:
+            return encode(PACKAGED_RESULT)
+        return encode(RAW_RESULT)
+
+
+class RecordingBackend:
+    """
+    Passes calls through to ``backend`` and saves each response under
+    ``directory`` for later replay
+    """
+
+    def __init__(self, backend, directory: str):
+        self.backend = backend
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def warm(self):
+        self.backend.warm()
+
+    def generate_content(self, contents, stream: bool = False, **kwargs):
+        key, prompt_key = request_keys(contents)
+        response = self.backend.generate_content(contents, stream=stream, **kwargs)
+        if not stream:
+            self._save(key, prompt_key, response.text, response.usage_metadata)
+            return response
+        return self._record_stream(key, prompt_key, response)
+
+    def _record_stream(self, key: str, prompt_key: str, response):
+        parts, usage = [], None
+        for chunk in response:
+            parts.append(chunk.text)
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            yield chunk
+        self._save(key, prompt_key, "".join(parts), usage)
+
+    def _save(self, key: str, prompt_key: str, text: str, usage=None):
+        record = {"key": key, "prompt_key": prompt_key, "text": text}
+        if usage is not None:
+            record["usage"] = {name: getattr(usage, name, 0) for name in
+                               ("prompt_token_count", "candidates_token_count",
+                                "total_token_count")}
+        path = self.directory / f"{key}.json"
+        temp = path.with_suffix(".tmp")
+        temp.write_text(json.dumps(record))
+        os.replace(temp, path)
+
+
+class ReplayBackend:
+    """
+    Serves responses saved by RecordingBackend.
+
+    Requests are matched on prompt and image. With ``match_prompt`` a request
+    for an unseen image falls back to a recording of the same prompt (picked
+    deterministically from the image), which lets recorded runs be replayed
+    against new load-test images. Responses report their recorded token
+    usage, estimated for recordings made without one.
+    """
+
+    def __init__(self, directory: str, latency: float = 0.0, match_prompt: bool = True):
+        self.latency = latency
+        self.match_prompt = match_prompt
+        self._by_key = {}
+        self._by_prompt = {}
+        for path in sorted(Path(directory).glob("*.json")):
+            record = json.loads(path.read_text())
+            self._by_key[record["key"]] = record
+            self._by_prompt.setdefault(record["prompt_key"], []).append(record)
+        logger.info("Loaded %s recorded model responses from %s", len(self._by_key), directory)
+
+    def generate_content(self, contents, stream: bool = False, **kwargs):
+        key, prompt_key = request_keys(contents)
+        record = self._by_key.get(key)
+        if record is None and self.match_prompt and prompt_key in self._by_prompt:
+            candidates = self._by_prompt[prompt_key]
+            record = candidates[int(key[:8], 16) % len(candidates)]
+        if record is None:
+            raise ReplayMiss(f"No recorded response for request {key[:12]}")
+
+        text = record["text"]
+        if "usage" in record:
+            usage = Usage(**record["usage"])
+        else:
+            usage = estimate_usage(contents, text, schema_chars(kwargs))
+        if stream:
+            return stream_text(text, self.latency, usage)
+        if self.latency:
+            time.sleep(self.latency)
+        return ModelResponse(text, usage)
+
+
+def stream_text(text: str, latency: float = 0.0, usage: Usage = None, chunks: int = 8):
+    """
+    Yield ``text`` in pieces, spreading ``latency`` across them; the last
+    piece carries ``usage``
+    """
+    size = max(1, -(-len(text) // chunks))
+    for start in range(0, len(text), size):
+        if latency:
+            time.sleep(latency / chunks)
+        last = start + size >= len(text)
+        yield ModelResponse(text[start:start + size], usage if last else None)
+
+
+def structured_output(result: dict) -> str:
+    """
+    ``result`` as JSON in the shape of the response schemas, with label
+    nutrient panels as lists of named entries (see expand_nutrients)
+    """
+    facts = result.get("nutrition_facts")
+    if isinstance(facts, dict):
+        facts = dict(facts)
+        for panel in NUTRIENT_PANELS:
+            if isinstance(facts.get(panel), dict):
+                facts[panel] = [{"name": name, **entry} for name, entry in facts[panel].items()]
+        result = {**result, "nutrition_facts": facts}
+    return json.dumps(result)
+
+
+def schema_chars(kwargs: dict) -> int:
+    """
+    Length of the response schema in a call's ``generation_config``, if any
+    """
+    schema = (kwargs.get("generation_config") or {}).get("response_schema")
+    return len(json.dumps(schema, separators=(",", ":"))) if schema else 0
+
+
+def request_keys(contents) -> tuple:
+    """
+    Digest of the whole request and of its text parts only
+    """
+    full, prompt = hashlib.sha256(), hashlib.sha256()
+    for part in contents:
+        if isinstance(part, str):
+            data = part.encode("utf-8")
+            prompt.update(data)
+        elif isinstance(part, Image.Image):
+            data = f"{part.mode}{part.size}".encode() + part.tobytes()
+        elif isinstance(part, dict) and "data" in part:
+            data = part["data"]
+        else:
+            data = repr(part).encode("utf-8")
+        full.update(hashlib.sha256(data).digest())
+    return full.hexdigest(), prompt.hexdigest()
+
+
+def is_packaged(image: Image.Image) -> bool:
+    pixel = image.convert("L").getpixel((0, 0))
+    return pixel < 128
+
+
+def build_backend(name: str, **settings):
+    """
+    Create the backend selected by MODEL_BACKEND
+    """
+    if name == "gemini":
+        return GeminiBackend(settings["api_key"], settings["model_name"])
+    if name == "fake":
+        return FakeBackend(settings["fake_latency"], settings["fake_latency_sigma"],
+                           settings["fake_failure_rate"], settings["fake_seed"],
+                           settings["fake_straggler_rate"])
+    if name == "record":
+        gemini = GeminiBackend(settings["api_key"], settings["model_name"])
+        return RecordingBackend(gemini, settings["recordings_dir"])
+    if name == "replay":
+        return ReplayBackend(settings["recordings_dir"], settings["fake_latency"])
+    raise ValueError(f"Unknown MODEL_BACKEND: {name}")
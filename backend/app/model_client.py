@@ -0,0 +1,380 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+
+from app.metrics import MODEL_CALLS
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def retryable_errors() -> tuple:
+    """
+    Errors worth another attempt: quota, overload and transient server
+    failures. The Google SDK's are imported on first use (an ``except``
+    clause only evaluates this once an error is raised), so the fake and
+    replay backends run without the SDK installed.
+    """
+    try:
+        from google.api_core import exceptions as google_exceptions
+    except ImportError:
+        return ConnectionError, TimeoutError
+    return (
+        google_exceptions.TooManyRequests,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.InternalServerError,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        ConnectionError,
+        TimeoutError,
+    )
+
+
+class ModelUnavailable(Exception):
+    """
+    Raised when the model cannot be reached in time; callers should shed the
+    request and ask the client to retry after ``retry_after`` seconds
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpen(ModelUnavailable):
+    """
+    Raised without calling the model while the circuit breaker is open
+    """
+
+
+class RateLimited(ModelUnavailable):
+    """
+    Raised when no rate-limit token frees up before the call's deadline
+    """
+
+
+class TokenBucket:
+    """
+    Allows ``rate`` calls per second on average with bursts of up to ``burst``
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self, deadline: float):
+        """
+        Wait for a token, raising RateLimited if none frees up before ``deadline``
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_for = (1 - self._tokens) / self.rate
+            if now + wait_for > deadline:
+                raise RateLimited("Model rate limit reached", retry_after=wait_for)
+            time.sleep(wait_for)
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures and rejects calls
+    for ``reset_timeout`` seconds, then lets a single probe call through
+    (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.counters = {"opened": 0, "rejected": 0}
+
+    def allow(self):
+        """
+        Raise CircuitOpen unless a call may go ahead
+        """
+        with self._lock:
+            if self.state == "closed":
+                return
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if self.state == "open" and remaining <= 0:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return
+            self.counters["rejected"] += 1
+            raise CircuitOpen("Model backend is unavailable", retry_after=max(remaining, 1))
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self.state = "closed"
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning("Model circuit opened after %s failures", self._failures)
+                    self.counters["opened"] += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def release_probe(self):
+        """
+        Give back a half-open probe slot that was granted but not used
+        """
+        with self._lock:
+            self._probing = False
+
+    def stats(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self._failures, **self.counters}
+
+
+class ResilientModel:
+    """
+    Wraps a model backend with deadline-aware retries, optional hedging, a
+    circuit breaker and a rate limiter. Exposes the same
+    ``generate_content`` as the backend.
+
+    Retryable failures back off with full jitter and are retried while the
+    call's ``deadline`` allows. With ``hedge`` enabled, a second attempt is
+    started when the first has run longer than the ``hedge_percentile`` of
+    recent latencies, and whichever finishes first wins; both run on a pool
+    of ``hedge_workers`` threads, which must cover twice the callers. Once retries are
+    exhausted, or the breaker or rate limiter rejects the call,
+    ModelUnavailable is raised. Each answered call's token usage is added
+    to ``usage`` (a TokenUsage), losing hedges included.
+    """
+
+    def __init__(self, backend, deadline: float, max_retries: int = 3,
+                 base_delay: float = 0.5, max_delay: float = 8.0,
+                 breaker: CircuitBreaker = None, rate_limiter: TokenBucket = None,
+                 hedge: bool = False, hedge_percentile: float = 95,
+                 hedge_min_samples: int = 20, hedge_workers: int = 8, usage=None):
+        self.backend = backend
+        self.usage = usage
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker
+        self.rate_limiter = rate_limiter
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self._latencies = deque(maxlen=200)
+        self._hedge_executor = (
+            ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="model-hedge")
+            if hedge else None
+        )
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "attempts": 0, "retries": 0, "hedges": 0,
+                         "hedge_wins": 0, "failures": 0}
+
+    def warm(self):
+        """
+        Set up the backend's client ahead of the first call, if it has one
+        """
+        warm = getattr(self.backend, "warm", None)
+        if warm is not None:
+            warm()
+
+    def generate_content(self, contents, stream: bool = False, deadline: float = None, **kwargs):
+        """
+        Call the backend, retrying retryable errors until ``deadline``
+        seconds from now (the client default when omitted)
+        """
+        expires = time.monotonic() + (deadline or self.deadline)
+        self._count("calls")
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if self.breaker:
+                self.breaker.allow()
+            if self.rate_limiter:
+                try:
+                    self.rate_limiter.acquire(expires)
+                except RateLimited:
+                    if self.breaker:
+                        self.breaker.release_probe()
+                    raise
+            try:
+                if stream:
+                    return self._stream(contents, expires, **kwargs)
+                return self._attempt(contents, expires, **kwargs)
+            except retryable_errors() as e:
+                last_error = e
+                self._count("failures")
+
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+            if attempt == self.max_retries or time.monotonic() + delay >= expires:
+                break
+            logger.warning("Model call failed (%s), retrying in %.2fs", last_error, delay)
+            self._count("retries")
+            time.sleep(delay)
+
+        raise ModelUnavailable(
+            f"Model call failed: {last_error}", retry_after=self.breaker_retry_after()
+        ) from last_error
+
+    def _attempt(self, contents, expires: float, **kwargs):
+        hedge_after = self.hedge_delay()
+        if hedge_after is None or hedge_after >= expires - time.monotonic():
+            return self._call(contents, expires, **kwargs)
+
+        primary = self._hedge_executor.submit(self._call, contents, expires, **kwargs)
+        done, _ = wait([primary], timeout=hedge_after)
+        if done:
+            return primary.result()
+        # The hedge is a call of its own: it needs the breaker's permission (an
+        # open or probing circuit gets no second call) and a rate-limit token
+        if self.breaker:
+            try:
+                self.breaker.allow()
+            except CircuitOpen:
+                return primary.result()
+        if self.rate_limiter and not self.rate_limiter.try_acquire():
+            if self.breaker:
+                self.breaker.release_probe()
+            return primary.result()
+
+        # Slower than usual: race a second request against the first
+        self._count("hedges")
+        hedged = self._hedge_executor.submit(self._call, contents, expires, **kwargs)
+        pending, error = {primary, hedged}, None
+        while pending:
+            done, pending = wait(pending, timeout=max(0, expires - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError("Model call exceeded its deadline")
+            for future in done:
+                if future.exception() is None:
+                    if future is hedged:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def _call(self, contents, expires: float, **kwargs):
+        self._count("attempts")
+        start = time.monotonic()
+        try:
+            response = self.backend.generate_content(
+                contents, timeout=max(0.1, expires - start), **kwargs
+            )
+        except retryable_errors():
+            MODEL_CALLS.inc(outcome="retryable_error")
+            if self.breaker:
+                self.breaker.record_failure()
+            raise
+        except Exception:
+            # The backend answered (e.g. rejected the request), so it is healthy
+            MODEL_CALLS.inc(outcome="error")
+            if self.breaker:
+                self.breaker.record_success()
+            raise
+        MODEL_CALLS.inc(outcome="ok")
+        if self.breaker:
+            self.breaker.record_success()
+        with self._lock:
+            self._latencies.append(time.monotonic() - start)
+        if self.usage is not None:
+            self.usage.record(contents, getattr(response, "usage_metadata", None))
+        return response
+
+    def _stream(self, contents, expires: float, **kwargs):
+        """
+        Open a streaming call; retries only cover the initial request, since
+        chunks already handed to the caller cannot be taken back
+        """
+        self._count("attempts")
+        try:
+            response = self.backend.generate_content(
+                contents, stream=True, timeout=max(0.1, expires - time.monotonic()), **kwargs
+            )
+        except retryable_errors():
+            MODEL_CALLS.inc(outcome="retryable_error")
+            if self.breaker:
+                self.breaker.record_failure()
+            raise
+        except Exception:
+            MODEL_CALLS.inc(outcome="error")
+            if self.breaker:
+                self.breaker.record_success()
+            raise
+        return self._track_stream(contents, response)
+
+    def _track_stream(self, contents, response):
+        last = None
+        try:
+            for last in response:
+                yield last
+        except retryable_errors():
+            MODEL_CALLS.inc(outcome="retryable_error")
+            if self.breaker:
+                self.breaker.record_failure()
+            raise
+        MODEL_CALLS.inc(outcome="ok")
+        if self.breaker:
+            self.breaker.record_success()
+        if self.usage is not None:
+            # The final chunk carries the usage of the whole response
+            self.usage.record(contents, getattr(last, "usage_metadata", None))
+
+    def hedge_delay(self):
+        """
+        Seconds to wait before hedging, or None when hedging is off or there
+        are too few latency samples yet
+        """
+        if not self.hedge:
+            return None
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))
+        return ordered[index]
+
+    def breaker_retry_after(self) -> float:
+        if self.breaker and self.breaker.state == "open":
+            return self.breaker.reset_timeout
+        return self.base_delay
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self) -> dict:
+        stats = dict(self.counters)
+        if self.breaker:
+            stats["breaker"] = self.breaker.stats()
+        stats["hedge_delay"] = self.hedge_delay()
+        return stats
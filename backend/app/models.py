@@ -1,12 +1,59 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Index, Float, Text
 from datetime import datetime
-from .database import Base
+from .database import SCAN_RESULT_COMPRESS_MIN_BYTES, Base
+from .serialization import StoredJSON
 
 class FoodScan(Base):
     __tablename__ = "food_scans"
+    __table_args__ = (
+        # Keyset pagination for /history walks (created_at, id) newest first
+        Index("ix_food_scans_created_at_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     image_path = Column(String)
-    scan_result = Column(JSON)
+    scan_result = Column(StoredJSON(compress_min_bytes=SCAN_RESULT_COMPRESS_MIN_BYTES))
     created_at = Column(DateTime, default=datetime.utcnow)
-    food_type = Column(String)  # 'packaged' or 'raw'
\ No newline at end of file
+    food_type = Column(String)  # 'packaged' or 'raw'
+    image_hash = Column(String(64), index=True)  # SHA-256 of the normalized pixels
+    perceptual_hash = Column(String(16), index=True)  # 64-bit dHash, hex
+    blob_sha256 = Column(String(64), index=True)  # original upload in the blob store
+
+    # Summary and health insights derived from scan_result (see app.insights),
+    # recomputed on read when insights_version is behind the current rules
+    insights = Column(StoredJSON())
+    insights_version = Column(Integer)
+
+    # Denormalized from scan_result at write time (see app.nutrients)
+    product_name = Column(String(255), index=True)
+    brand = Column(String(255), index=True)
+    barcode = Column(String(14), index=True)  # GTIN-14, see app.product_index
+    calories = Column(Float, index=True)
+    protein_g = Column(Float, index=True)
+    carbohydrates_g = Column(Float)
+    fat_g = Column(Float)
+    sugar_g = Column(Float, index=True)
+    sodium_mg = Column(Float, index=True)
+
+
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+    __table_args__ = (
+        # Workers claim the oldest runnable job (see app.jobs)
+        Index("ix_analysis_jobs_status_available_at", "status", "available_at"),
+    )
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    idempotency_key = Column(String(255), unique=True)
+    status = Column(String(16), nullable=False)  # queued, running, succeeded, failed
+    filename = Column(String)
+    blob_sha256 = Column(String(64), nullable=False)  # the upload, in the blob store
+    attempts = Column(Integer, nullable=False, default=0)
+    scan_id = Column(Integer)  # FoodScan written by a successful run
+    error_status = Column(Integer)  # HTTP status the failure maps to
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    available_at = Column(DateTime)  # not claimed before this (retry backoff)
+    started_at = Column(DateTime)
+    lease_expires_at = Column(DateTime)  # a running job past this is reclaimed
+    finished_at = Column(DateTime, index=True)
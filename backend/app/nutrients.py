@@ -0,0 +1,252 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+# Grams per unit, for converting label amounts to a common unit
+UNIT_GRAMS = {"g": 1.0, "mg": 1e-3, "mcg": 1e-6, "µg": 1e-6, "ug": 1e-6}
+UNIT_GRAMS.update({f"{prefix}gram{plural}": UNIT_GRAMS[unit]
+                   for prefix, unit in (("", "g"), ("milli", "mg"), ("micro", "mcg"))
+                   for plural in ("", "s")})
+
+# "1,050" and "12,345.6" group thousands; any other comma is a decimal
+# separator ("1,5")
+_NUMBER = r"\d{1,3}(?:,\d{3}(?!\d))+(?:\.\d+)?|\d+(?:[.,]\d+)?"
+_THOUSANDS = re.compile(r"\d{1,3}(?:,\d{3})+(?:\.\d+)?")
+
+# "9g", "150 mg", "<1g", "less than 0.5 g", "5-7g", "2 to 3 mg", "10%"
+_QUANTITY = re.compile(
+    r"(?P<below><|less than|under)?\s*"
+    rf"(?P<low>{_NUMBER})"
+    rf"(?:\s*(?:-|–|to)\s*(?P<high>{_NUMBER}))?"
+    r"\s*(?:(?P<unit>[a-zµ]+)|(?P<percent>%))?",
+    re.IGNORECASE,
+)
+
+# Label keys the two result shapes use for the same nutrient
+NUTRIENT_ALIASES = {
+    "carbohydrates": "total_carbohydrates",
+    "fiber": "dietary_fiber",
+    "sugars": "total_sugars",
+    "fat": "total_fat",
+}
+
+# FDA reference daily values (adults), used to convert between amounts and %DV
+DAILY_VALUES = {
+    "total_fat": (78, "g"),
+    "saturated_fat": (20, "g"),
+    "cholesterol": (300, "mg"),
+    "sodium": (2300, "mg"),
+    "total_carbohydrates": (275, "g"),
+    "dietary_fiber": (28, "g"),
+    "added_sugars": (50, "g"),
+    "protein": (50, "g"),
+    "vitamin_a": (900, "mcg"),
+    "vitamin_c": (90, "mg"),
+    "vitamin_d": (20, "mcg"),
+    "vitamin_e": (15, "mg"),
+    "vitamin_k": (120, "mcg"),
+    "calcium": (1300, "mg"),
+    "iron": (18, "mg"),
+    "magnesium": (420, "mg"),
+    "potassium": (4700, "mg"),
+    "zinc": (11, "mg"),
+}
+
+# Unit each nutrient is normalized to; anything else is kept in grams
+NUTRIENT_UNITS = {name: unit for name, (_, unit) in DAILY_VALUES.items()}
+NUTRIENT_UNITS.update(trans_fat="g", total_sugars="g")
+
+# Typed column -> (packaged macronutrient key, raw macronutrient key, unit)
+NUTRIENT_FIELDS = {
+    "protein_g": ("protein", "protein", "g"),
+    "carbohydrates_g": ("total_carbohydrates", "carbohydrates", "g"),
+    "fat_g": ("total_fat", "total_fat", "g"),
+    "sugar_g": ("total_sugars", "sugars", "g"),
+    "sodium_mg": ("sodium", "sodium", "mg"),
+}
+
+
+@dataclass(slots=True)
+class Nutrient:
+    amount: Optional[float]  # in ``unit``
+    unit: str
+    daily_value: Optional[float] = None  # percent of the reference daily value
+    approximate: bool = False  # from a range, "<1g" or "trace"
+
+
+def parse_quantity(value, default_unit: str = "g"):
+    """
+    Parse a label value into ``(amount, unit, percent, approximate)``.
+
+    Ranges give their midpoint and "<x" half of x, both flagged
+    approximate; "10%" gives a percent of daily value and no amount.
+    Returns None when there is no number.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value), default_unit, None, False
+    return _parse_text(str(value), default_unit)
+
+
+# Label values repeat heavily ("0", "5g", "<1g", "10%"), so parses are memoized
+@lru_cache(maxsize=8192)
+def _parse_text(text: str, default_unit: str):
+    text = text.strip()
+    try:
+        return float(text), default_unit, None, False
+    except ValueError:
+        pass
+    if text.lower() == "trace":
+        return 0.0, default_unit, None, True
+    match = _QUANTITY.search(text)
+    if not match:
+        return None
+    amount = _number(match["low"])
+    approximate = False
+    if match["high"]:
+        amount = (amount + _number(match["high"])) / 2
+        approximate = True
+    if match["below"]:
+        amount /= 2
+        approximate = True
+    if match["percent"]:
+        return None, default_unit, amount, approximate
+    return amount, (match["unit"] or default_unit).lower(), None, approximate
+
+
+def _number(text: str) -> float:
+    if _THOUSANDS.fullmatch(text):
+        return float(text.replace(",", ""))
+    return float(text.replace(",", "."))
+
+
+def convert(amount: float, unit: str, target_unit: str) -> float:
+    if unit not in UNIT_GRAMS or target_unit not in UNIT_GRAMS:
+        return amount
+    return amount * UNIT_GRAMS[unit] / UNIT_GRAMS[target_unit]
+
+
+def parse_nutrient(name: str, value, default_unit: str = None) -> Optional[Nutrient]:
+    """
+    Parse one label entry (a string or ``{"amount", "unit", "daily_value"}``)
+    into a Nutrient in the nutrient's normal unit, filling in whichever of
+    amount and %DV is missing from the other
+    """
+    unit = NUTRIENT_UNITS.get(name, "g")
+    percent = None
+    if isinstance(value, dict):
+        dv = parse_quantity(value.get("daily_value"))
+        if dv is not None:
+            percent = dv[0] if dv[2] is None else dv[2]
+        value, default_unit = value.get("amount"), value.get("unit") or default_unit
+    parsed = parse_quantity(value, str(default_unit or unit).lower())
+
+    amount, approximate = None, False
+    if parsed is not None:
+        amount, label_unit, label_percent, approximate = parsed
+        if amount is not None:
+            # An amount in a unit we can't convert ("1.5 oz") is unknown
+            amount = convert(amount, label_unit, unit) if label_unit in UNIT_GRAMS else None
+        percent = label_percent if label_percent is not None else percent
+    if amount is None and percent is None:
+        return None
+
+    reference = DAILY_VALUES.get(name)
+    if reference is not None:
+        if amount is None:
+            amount = percent / 100 * reference[0]
+        elif percent is None:
+            percent = amount / reference[0] * 100
+    return Nutrient(amount, unit, percent, approximate)
+
+
+def parse_amount(value, default_unit: str = "g", target_unit: str = "g") -> Optional[float]:
+    """
+    Parse a label amount ("9g", "150 mg", "<1g", {"amount": "8", "unit": "g"})
+    into ``target_unit``; None when there is no number
+    """
+    if isinstance(value, dict):
+        return parse_amount(value.get("amount"), value.get("unit") or default_unit, target_unit)
+    parsed = parse_quantity(value, default_unit)
+    if parsed is None or parsed[0] is None:
+        return None
+    amount, unit, _, _ = parsed
+    unit = (unit or default_unit).lower()
+    # "1.5 oz" is not 1.5 of the default unit; leave it unknown
+    if unit not in UNIT_GRAMS:
+        return None
+    return convert(amount, unit, target_unit)
+
+
+def parse_calories(value) -> Optional[float]:
+    if isinstance(value, dict):
+        value = value.get("amount")
+    parsed = parse_quantity(value, "kcal")
+    return parsed[0] if parsed is not None else None
+
+
+def extract_nutrients(result: dict) -> dict:
+    """
+    Pull the typed, queryable fields out of a scan result.
+
+    Packaged results use the per-serving label values; raw results sum
+    the per-item values of every identified food.
+    """
+    fields = {column: None for column in NUTRIENT_FIELDS}
+    fields.update(calories=None, product_name=None, brand=None, barcode=None)
+    if not isinstance(result, dict):
+        return fields
+
+    if "product_info" in result:
+        info = result.get("product_info") or {}
+        fields["product_name"] = clean_text(info.get("product_name"))
+        fields["brand"] = clean_text(info.get("brand"))
+        fields["barcode"] = normalize_barcode(info.get("barcode"))
+        facts = result.get("nutrition_facts") or {}
+        fields["calories"] = parse_calories(facts.get("calories"))
+        macros = facts.get("macronutrients") or {}
+        for column, (key, _, unit) in NUTRIENT_FIELDS.items():
+            fields[column] = parse_amount(macros.get(key), unit, unit)
+        return fields
+
+    items = [item for item in result.get("nutritional_info") or [] if isinstance(item, dict)]
+    names = [clean_text(item.get("food_name")) for item in items]
+    fields["product_name"] = ", ".join(name for name in names if name) or None
+    totals = {}
+    for item in items:
+        facts = item.get("nutrition_facts") or {}
+        macros = facts.get("macronutrients") or {}
+        values = {"calories": parse_calories(facts.get("calories"))}
+        for column, (_, key, unit) in NUTRIENT_FIELDS.items():
+            values[column] = parse_amount(macros.get(key), unit, unit)
+        for column, value in values.items():
+            if value is not None:
+                totals[column] = totals.get(column, 0.0) + value
+    fields.update(totals)
+    return fields
+
+
+def clean_text(value) -> Optional[str]:
+    """
+    Stripped text of at most 255 characters (the column width); None when empty
+    """
+    value = str(value).strip() if value is not None else ""
+    return value[:255] or None
+
+
+def normalize_barcode(value) -> Optional[str]:
+    """
+    GTIN-8/12/13/14 digits ("0 12345 67890 5", "012345678905") as a
+    zero-padded 14-digit GTIN; None unless the check digit is valid
+    """
+    digits = re.sub(r"\D", "", str(value or ""))
+    if len(digits) not in (8, 12, 13, 14):
+        return None
+    body, check = digits[:-1], int(digits[-1])
+    # Weights alternate 3, 1, ... from the digit next to the check digit
+    total = sum(int(digit) * (3 if i % 2 == 0 else 1) for i, digit in enumerate(reversed(body)))
+    if (10 - total % 10) % 10 != check:
+        return None
+    return digits.zfill(14)
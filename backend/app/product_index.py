@@ -0,0 +1,321 @@
+"""
+Product identity index: known packaged products by barcode and by
+normalized name + brand.
+
+Loaded from stored packaged scans at startup and extended as new labels
+are extracted, so a repeat scan of a known product can be answered with
+its canonical stored result after a cheap identification step (a locally
+decoded barcode or a short identify prompt) instead of a full extraction.
+"""
+import logging
+import math
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image
+
+from app.database import SessionLocal
+from app.models import FoodScan
+from app.nutrients import normalize_barcode
+
+try:
+    from pyzbar import pyzbar
+except ImportError:  # pragma: no cover - optional, needs the zbar system library
+    pyzbar = None
+
+logger = logging.getLogger(__name__)
+
+# Package sizes and counts ("40g", "1.5 L", "12 x") differ between photos of
+# the same product and are not part of its identity
+_SIZE = re.compile(
+    r"\b\d+(?:[.,]\d+)?\s*(?:kg|mg|g|ml|cl|l|fl\.?\s*oz|oz|lbs?|ct|count|pk|pack)\b|\b\d+\s*x\b"
+)
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def tokens(text) -> list:
+    """
+    Lower-case ASCII words of ``text`` without accents, apostrophes or sizes
+    """
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    text = "".join(char for char in text if not unicodedata.combining(char)).casefold()
+    text = _SIZE.sub(" ", text.replace("'", "").replace("’", ""))
+    return _NON_ALNUM.sub(" ", text).split()
+
+
+def product_key(name, brand) -> tuple:
+    """
+    ``(name, brand)`` normalized so word order, case, punctuation and a
+    brand repeated in the name don't matter
+    """
+    brand_words = tokens(brand)
+    name_words = tokens(name)
+    # "Kellogg's Corn Flakes" by "Kellogg's" is the same product as "Corn Flakes"
+    without_brand = [word for word in name_words if word not in brand_words]
+    return (" ".join(sorted(set(without_brand or name_words))),
+            " ".join(sorted(set(brand_words))))
+
+
+def trigrams(key: str) -> frozenset:
+    """
+    Trigrams of each word padded as "  word ", like pg_trgm
+    """
+    grams = set()
+    for word in key.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def similarity(a: frozenset, b: frozenset) -> float:
+    """
+    Share of trigrams two keys have in common (Jaccard, as pg_trgm)
+    """
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def words_align(a: str, b: str, min_similarity: float = 0.5) -> bool:
+    """
+    Whether two keys have the same number of words and every word of each
+    is spelled like some word of the other ("cheerio"/"cheerios" but not
+    "chip"/"chunk" or "12"/"13"), so a fuzzy match never adds or drops a
+    flavor
+    """
+    words_a, words_b = a.split(), b.split()
+    if len(words_a) != len(words_b):
+        return False
+    grams_a, grams_b = [trigrams(w) for w in words_a], [trigrams(w) for w in words_b]
+    return all(
+        any(similarity(x, y) >= min_similarity for y in others)
+        for side, others in ((grams_a, grams_b), (grams_b, grams_a))
+        for x in side
+    )
+
+
+def decode_barcode(image: Image.Image) -> Optional[str]:
+    """
+    First valid EAN/UPC barcode in the image as a GTIN-14, or None (always
+    None when pyzbar isn't installed)
+    """
+    if pyzbar is None:
+        return None
+    for symbol in pyzbar.decode(image):
+        barcode = normalize_barcode(symbol.data.decode("ascii", "ignore"))
+        if barcode is not None:
+            return barcode
+    return None
+
+
+@dataclass
+class ProductEntry:
+    name: str  # normalized, see product_key
+    brand: str
+    grams: frozenset  # trigrams of ``name``
+    brand_grams: frozenset
+    barcode: Optional[str] = None
+    scan_id: Optional[int] = None  # stored scan holding the canonical result
+
+
+@dataclass(frozen=True)
+class ProductMatch:
+    entry: ProductEntry
+    kind: str  # "barcode", "exact" or "fuzzy"
+    score: float
+
+
+class ProductIndex:
+    """
+    In-memory index of known products.
+
+    Barcodes and exact normalized keys match directly. Otherwise candidates
+    sharing name trigrams are scored by trigram similarity; a fuzzy match
+    needs ``min_similarity`` on the name and on the brand (a product with a
+    brand never matches a query without one), words that align one for one
+    (see words_align), and a lead of ``min_margin`` over the runner-up so
+    near-identical variants are left to the model. The newest scan of a
+    product is its canonical result.
+
+    Entries only hold the id of that scan; the results themselves are kept
+    in an LRU of ``max_results`` and read back from the database on a miss.
+    """
+
+    def __init__(self, min_similarity: float = 0.8, min_margin: float = 0.1,
+                 max_results: int = 512):
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.max_results = max_results
+        self._entries = {}  # (name, brand) -> ProductEntry
+        self._barcodes = {}  # GTIN-14 -> (name, brand)
+        self._postings = {}  # trigram -> set of (name, brand)
+        self._results = OrderedDict()  # (name, brand) -> canonical result
+        self._lock = threading.Lock()
+        self.counters = {
+            "barcode_hits": 0,
+            "exact_hits": 0,
+            "fuzzy_hits": 0,
+            "ambiguous": 0,
+            "misses": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, name, brand=None, barcode=None, scan_id: int = None, result: dict = None):
+        """
+        Make a stored scan (``scan_id``) or a fresh ``result`` the canonical
+        one for its product; ignored without a product name. A fresh result
+        not yet stored is only kept in the LRU, so once evicted its product
+        misses until the index is next loaded.
+        """
+        key = product_key(name, brand)
+        if not key[0]:
+            return
+        barcode = normalize_barcode(barcode)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = ProductEntry(
+                    key[0], key[1], trigrams(key[0]), trigrams(key[1])
+                )
+                for gram in entry.grams:
+                    self._postings.setdefault(gram, set()).add(key)
+            entry.scan_id = scan_id
+            self._results.pop(key, None)
+            if result is not None:
+                self._remember(key, result)
+            if barcode is not None:
+                entry.barcode = barcode
+                self._barcodes[barcode] = key
+
+    def add_result(self, result: dict):
+        info = result.get("product_info") or {}
+        self.add(info.get("product_name"), info.get("brand"), info.get("barcode"), result=result)
+
+    def lookup(self, name=None, brand=None, barcode=None) -> Optional[ProductMatch]:
+        """
+        Best confident match for an identification, or None
+        """
+        barcode = normalize_barcode(barcode)
+        key = product_key(name, brand)
+        with self._lock:
+            outcome, match = self._lookup(key, barcode)
+            self.counters[outcome] += 1
+        return match
+
+    def _lookup(self, key: tuple, barcode: Optional[str]) -> tuple:
+        # (counter to bump, match or None)
+        if barcode in self._barcodes:
+            entry = self._entries[self._barcodes[barcode]]
+            return "barcode_hits", ProductMatch(entry, "barcode", 1.0)
+        if not key[0]:
+            return "misses", None
+        if key in self._entries:
+            return "exact_hits", ProductMatch(self._entries[key], "exact", 1.0)
+
+        grams = trigrams(key[0])
+        brand_grams = trigrams(key[1])
+        # Prefix filter: reaching min_similarity takes at least that share of
+        # the query's trigrams, so every such candidate has one of its rarest
+        # len - ceil(min_similarity * len) + 1 trigrams
+        rarest = sorted(grams, key=lambda gram: len(self._postings.get(gram, ())))
+        rarest = rarest[:len(grams) - math.ceil(self.min_similarity * len(grams)) + 1]
+        candidates = set().union(*(self._postings.get(gram, ()) for gram in rarest))
+        # Nor can sets whose sizes differ by more than that ratio
+        low, high = self.min_similarity * len(grams), len(grams) / self.min_similarity
+        scored = []
+        for candidate_key in candidates:
+            entry = self._entries[candidate_key]
+            if not low <= len(entry.grams) <= high:
+                continue
+            if entry.brand and entry.brand != key[1] and \
+                    similarity(brand_grams, entry.brand_grams) < self.min_similarity:
+                continue
+            score = similarity(grams, entry.grams)
+            if score >= self.min_similarity and words_align(key[0], entry.name):
+                scored.append((score, entry))
+        if not scored:
+            return "misses", None
+        scored.sort(key=lambda item: item[0], reverse=True)
+        if len(scored) > 1 and scored[0][0] - scored[1][0] < self.min_margin:
+            return "ambiguous", None
+        return "fuzzy_hits", ProductMatch(scored[0][1], "fuzzy", round(scored[0][0], 3))
+
+    def result_for(self, entry: ProductEntry) -> Optional[dict]:
+        """
+        Canonical result of a matched product, from the LRU or read from its
+        stored scan; None if there is neither
+        """
+        key = (entry.name, entry.brand)
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                return result
+            scan_id = entry.scan_id
+        if scan_id is None:
+            return None
+        db = SessionLocal()
+        try:
+            result = db.query(FoodScan.scan_result).filter(FoodScan.id == scan_id).scalar()
+        finally:
+            db.close()
+        if result is not None:
+            with self._lock:
+                # Unless the product got a newer canonical scan meanwhile
+                if entry.scan_id == scan_id:
+                    self._remember(key, result)
+        return result
+
+    def _remember(self, key: tuple, result: dict):
+        # Callers hold the lock
+        if self.max_results <= 0:
+            return
+        self._results[key] = result
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+
+    def load(self, chunk_size: int = 1000) -> int:
+        """
+        Index every stored packaged scan that has a product name, oldest
+        first so the newest scan of each product ends up canonical
+        """
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(FoodScan.id, FoodScan.product_name, FoodScan.brand, FoodScan.barcode)
+                .filter(FoodScan.food_type == "packaged", FoodScan.product_name.isnot(None))
+                .order_by(FoodScan.id)
+                .yield_per(chunk_size)
+            )
+            for row in rows:
+                self.add(row.product_name, row.brand, row.barcode, scan_id=row.id)
+        finally:
+            db.close()
+        logger.info("Product index loaded %s products", len(self))
+        return len(self)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._barcodes.clear()
+            self._postings.clear()
+            self._results.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["products"] = len(self._entries)
+            stats["barcodes"] = len(self._barcodes)
+            stats["cached_results"] = len(self._results)
+        hits = stats["barcode_hits"] + stats["exact_hits"] + stats["fuzzy_hits"]
+        lookups = hits + stats["ambiguous"] + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,125 @@
+"""
+Response schemas for the model's structured output.
+
+Passed as ``response_schema`` with ``response_mime_type="application/json"``
+(see ``generation_config``) instead of pasting JSON templates into every
+prompt: the model answers with bare JSON of exactly these shapes, so the
+prompts only need to say what to extract, and fields without a value are
+left out instead of being echoed back empty.
+
+Written in the OpenAPI subset Gemini accepts: every object lists its
+properties (no free-form maps) and there are no defaults. Label nutrient
+panels are therefore lists of named entries, turned back into the objects
+keyed by nutrient that results use by ``expand_nutrients``.
+"""
+
+STRING = {"type": "string"}
+BOOLEAN = {"type": "boolean"}
+STRINGS = {"type": "array", "items": STRING}
+
+NUTRIENT_PANELS = ("macronutrients", "vitamins_minerals")
+RAW_MACRONUTRIENTS = ("protein", "carbohydrates", "fiber", "sugars", "total_fat")
+RAW_VITAMINS_MINERALS = ("vitamin_c", "vitamin_a", "potassium", "calcium")
+
+
+def obj(properties: dict, required=()) -> dict:
+    schema = {"type": "object", "properties": properties}
+    if required:
+        schema["required"] = list(required)
+    return schema
+
+
+LABEL_NUTRIENTS = {"type": "array", "items": obj({
+    "name": {"type": "string", "description": "snake_case, e.g. total_fat or vitamin_d"},
+    "amount": STRING,
+    "unit": STRING,
+    "daily_value": STRING,
+}, required=("name", "amount", "unit"))}
+
+PRODUCT_LABEL_SCHEMA = obj({
+    "product_info": obj({
+        "product_name": STRING,
+        "brand": STRING,
+        "package_size": STRING,
+        "barcode": {"type": "string", "description": "Digits printed under the barcode"},
+    }, required=("product_name",)),
+    "nutrition_facts": obj({
+        "serving_size": obj({
+            "amount": STRING,
+            "unit": STRING,
+            "servings_per_container": STRING,
+        }, required=("amount", "unit")),
+        "calories": STRING,
+        "macronutrients": LABEL_NUTRIENTS,
+        "vitamins_minerals": LABEL_NUTRIENTS,
+    }, required=("serving_size", "calories", "macronutrients")),
+    "ingredients": STRINGS,
+    "allergens": STRINGS,
+    "dietary_info": obj({
+        "is_vegetarian": BOOLEAN,
+        "is_vegan": BOOLEAN,
+        "is_gluten_free": BOOLEAN,
+    }, required=("is_vegetarian", "is_vegan", "is_gluten_free")),
+    "storage_instructions": STRING,
+    "manufacturer_info": STRING,
+}, required=("product_info", "nutrition_facts", "ingredients", "allergens", "dietary_info"))
+
+RAW_FOOD_SCHEMA = obj({
+    "food_identification": obj({
+        "items": STRINGS,
+        "total_items": {"type": "integer"},
+    }, required=("items", "total_items")),
+    "nutritional_info": {"type": "array", "items": obj({
+        "food_name": STRING,
+        "serving_size": STRING,
+        "nutrition_facts": obj({
+            "calories": STRING,
+            "macronutrients": obj({name: STRING for name in RAW_MACRONUTRIENTS}),
+            "vitamins_minerals": obj({name: STRING for name in RAW_VITAMINS_MINERALS}),
+        }, required=("calories", "macronutrients")),
+        "health_benefits": STRINGS,
+        "storage_tips": STRINGS,
+    }, required=("food_name", "serving_size", "nutrition_facts"))},
+    "combination_suggestions": STRINGS,
+    "seasonal_info": obj({"season": STRING, "availability": STRING}),
+}, required=("food_identification", "nutritional_info"))
+
+# Either shape behind a "food_type" discriminator; which fields apply is
+# checked afterwards (food_analyzer.finalize_single_pass), since the schema
+# subset has no oneOf
+COMBINED_SCHEMA = obj({
+    "food_type": {"type": "string", "enum": ["packaged", "raw"]},
+    **PRODUCT_LABEL_SCHEMA["properties"],
+    **RAW_FOOD_SCHEMA["properties"],
+}, required=("food_type",))
+
+# The identify answer; all fields empty when no packaged product is shown
+IDENTITY_SCHEMA = obj({
+    "product_name": STRING,
+    "brand": STRING,
+    "barcode": STRING,
+})
+
+
+def expand_nutrients(nutrition_facts):
+    """
+    Turn a label's nutrient lists into objects keyed by nutrient name, in
+    place; panels that are already objects are left alone
+    """
+    if not isinstance(nutrition_facts, dict):
+        return nutrition_facts
+    for panel in NUTRIENT_PANELS:
+        entries = nutrition_facts.get(panel)
+        if isinstance(entries, list):
+            nutrition_facts[panel] = {
+                entry.pop("name"): entry for entry in entries
+                if isinstance(entry, dict) and entry.get("name")
+            }
+    return nutrition_facts
+
+
+def generation_config(schema: dict) -> dict:
+    """
+    ``generation_config`` for a call answering with JSON of ``schema``
+    """
+    return {"response_mime_type": "application/json", "response_schema": schema}
@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from PIL import Image
+
+from app.database import SessionLocal
+from app.models import FoodScan
+
+logger = logging.getLogger(__name__)
+
+# Side of the confirming dHash: at 8x8 two labels with the same layout and
+# different numbers hash alike, at 32x32 the digits themselves show up
+DETAIL_HASH_SIZE = 32
+
+
+@dataclass(frozen=True)
+class ImageKeys:
+    digest: str  # SHA-256 hex of the normalized pixels
+    phash: int  # 64-bit difference hash
+    detail: int = None  # 1024-bit difference hash confirming perceptual hits
+
+
+def image_keys(image: Image.Image, detail: bool = False) -> ImageKeys:
+    """
+    Compute the exact and perceptual cache keys for an image; ``detail``
+    adds the high-resolution hash needed for perceptual hits
+    """
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    sha = hashlib.sha256()
+    sha.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+    sha.update(image.tobytes())
+    return ImageKeys(digest=sha.hexdigest(), phash=difference_hash(image),
+                     detail=difference_hash(image, DETAIL_HASH_SIZE) if detail else None)
+
+
+def difference_hash(image: Image.Image, size: int = 8) -> int:
+    """
+    dHash: compare neighbouring pixels of a tiny grayscale thumbnail
+    """
+    small = image.convert('L').resize((size + 1, size), Image.Resampling.BILINEAR)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def phash_to_hex(phash: int) -> str:
+    return f"{phash:016x}"
+
+
+class ResultCache:
+    """
+    Two-tier analysis result cache keyed on image content.
+
+    The memory tier is an LRU with entry-count and TTL eviction. With a
+    ``phash_distance`` above 0 it also answers near-duplicate lookups, but
+    only when the 64-bit and the 1024-bit hash are both within that
+    distance. The persistent tier reuses stored ``FoodScan.scan_result``
+    rows by exact image hash only.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, phash_distance: int,
+                 persistent: bool = True, persistent_max_age: float = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.phash_distance = phash_distance
+        self.persistent = persistent
+        self.persistent_max_age = persistent_max_age
+        self._entries = OrderedDict()  # digest -> (expires_at, phash, detail, result)
+        self._lock = threading.Lock()
+        self.counters = {
+            "memory_hits": 0,
+            "perceptual_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+        }
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def get(self, keys: ImageKeys):
+        """
+        Return a cached result for ``keys`` or None
+        """
+        result = self._get_memory(keys)
+        if result is None and self.persistent:
+            result = self._get_persistent(keys)
+            if result is not None:
+                self._count("persistent_hits")
+                self.put(keys, result)
+        if result is None:
+            self._count("misses")
+        return result
+
+    def _get_memory(self, keys: ImageKeys):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(keys.digest)
+            if entry is not None:
+                expires_at, _, _, result = entry
+                if expires_at > now:
+                    self._entries.move_to_end(keys.digest)
+                    self.counters["memory_hits"] += 1
+                    return result
+                del self._entries[keys.digest]
+
+            if self.phash_distance <= 0 or keys.detail is None:
+                return None
+            for digest, (expires_at, phash, detail, result) in reversed(self._entries.items()):
+                if (expires_at > now and detail is not None
+                        and (phash ^ keys.phash).bit_count() <= self.phash_distance
+                        and (detail ^ keys.detail).bit_count() <= self.phash_distance):
+                    self._entries.move_to_end(digest)
+                    self.counters["perceptual_hits"] += 1
+                    return result
+        return None
+
+    def _get_persistent(self, keys: ImageKeys):
+        db = SessionLocal()
+        try:
+            query = db.query(FoodScan.scan_result).filter(FoodScan.image_hash == keys.digest)
+            if self.persistent_max_age:
+                cutoff = datetime.utcnow() - timedelta(seconds=self.persistent_max_age)
+                query = query.filter(FoodScan.created_at >= cutoff)
+            row = query.order_by(FoodScan.id.desc()).first()
+            return row.scan_result if row is not None else None
+        except Exception as e:
+            logger.warning("Persistent cache lookup failed: %s", e)
+            return None
+        finally:
+            db.close()
+
+    def put(self, keys: ImageKeys, result: dict):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[keys.digest] = (expires_at, keys.phash, keys.detail, result)
+            self._entries.move_to_end(keys.digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self._entries)
+        hits = stats["memory_hits"] + stats["perceptual_hits"] + stats["persistent_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,170 @@
+"""
+Typed views of model results.
+
+``parse_result`` turns a result dict (either shape of the extraction
+template) into compact slotted objects once, with every nutrient parsed
+and normalized by ``app.nutrients``, so derived data never has to dig
+through the raw dicts again.
+"""
+from dataclasses import dataclass, field
+from typing import Optional, Union
+
+from app.nutrients import (
+    NUTRIENT_ALIASES, Nutrient, clean_text, parse_calories, parse_nutrient, parse_quantity
+)
+
+
+@dataclass(slots=True)
+class ServingSize:
+    amount: Optional[float] = None
+    unit: str = ""
+    servings_per_container: Optional[float] = None
+
+
+@dataclass(slots=True)
+class PackagedResult:
+    product_name: Optional[str] = None
+    brand: Optional[str] = None
+    package_size: Optional[str] = None
+    serving: ServingSize = field(default_factory=ServingSize)
+    calories: Optional[float] = None
+    macronutrients: dict = field(default_factory=dict)  # name -> Nutrient
+    vitamins_minerals: dict = field(default_factory=dict)  # name -> Nutrient
+    ingredients: tuple = ()
+    allergens: tuple = ()
+    dietary_info: dict = field(default_factory=dict)  # e.g. is_vegan -> bool
+
+    food_type = "packaged"
+
+    def nutrient(self, name: str) -> Optional[Nutrient]:
+        return self.macronutrients.get(name) or self.vitamins_minerals.get(name)
+
+
+@dataclass(slots=True)
+class RawFoodItem:
+    food_name: Optional[str] = None
+    serving_size: Optional[str] = None
+    calories: Optional[float] = None
+    macronutrients: dict = field(default_factory=dict)
+    vitamins_minerals: dict = field(default_factory=dict)
+    health_benefits: tuple = ()
+    storage_tips: tuple = ()
+
+
+@dataclass(slots=True)
+class RawResult:
+    items: tuple = ()  # RawFoodItem per identified food
+    combination_suggestions: tuple = ()
+    calories: Optional[float] = None  # summed over items
+    totals: dict = field(default_factory=dict)  # name -> Nutrient summed over items
+
+    food_type = "raw"
+
+    def nutrient(self, name: str) -> Optional[Nutrient]:
+        return self.totals.get(name)
+
+
+ParsedResult = Union[PackagedResult, RawResult]
+
+
+def parse_result(result: dict) -> ParsedResult:
+    """
+    Parse a packaged or raw result dict; missing or malformed parts are
+    left empty rather than raising
+    """
+    if not isinstance(result, dict):
+        return RawResult()
+    if "product_info" in result:
+        return _parse_packaged(result)
+    return _parse_raw(result)
+
+
+def _parse_packaged(result: dict) -> PackagedResult:
+    info = _dict(result.get("product_info"))
+    facts = _dict(result.get("nutrition_facts"))
+    serving = _dict(facts.get("serving_size"))
+    amount = parse_quantity(serving.get("amount"))
+    servings = parse_quantity(serving.get("servings_per_container"))
+    return PackagedResult(
+        product_name=clean_text(info.get("product_name")),
+        brand=clean_text(info.get("brand")),
+        package_size=clean_text(info.get("package_size")),
+        serving=ServingSize(
+            amount=amount[0] if amount else None,
+            unit=clean_text(serving.get("unit")) or (amount[1] if amount else ""),
+            servings_per_container=servings[0] if servings else None,
+        ),
+        calories=parse_calories(facts.get("calories")),
+        macronutrients=_nutrients(facts.get("macronutrients")),
+        vitamins_minerals=_nutrients(facts.get("vitamins_minerals")),
+        ingredients=_strings(result.get("ingredients")),
+        allergens=_strings(result.get("allergens")),
+        dietary_info={
+            key: bool(value) for key, value in _dict(result.get("dietary_info")).items()
+        },
+    )
+
+
+def _parse_raw(result: dict) -> RawResult:
+    items = []
+    for entry in result.get("nutritional_info") or []:
+        if not isinstance(entry, dict):
+            continue
+        facts = _dict(entry.get("nutrition_facts"))
+        items.append(RawFoodItem(
+            food_name=clean_text(entry.get("food_name")),
+            serving_size=clean_text(entry.get("serving_size")),
+            calories=parse_calories(facts.get("calories")),
+            macronutrients=_nutrients(facts.get("macronutrients")),
+            vitamins_minerals=_nutrients(facts.get("vitamins_minerals")),
+            health_benefits=_strings(entry.get("health_benefits")),
+            storage_tips=_strings(entry.get("storage_tips")),
+        ))
+
+    calories = [item.calories for item in items if item.calories is not None]
+    totals = {}
+    for item in items:
+        for name, nutrient in (*item.macronutrients.items(), *item.vitamins_minerals.items()):
+            total = totals.get(name)
+            if total is None:
+                totals[name] = Nutrient(nutrient.amount, nutrient.unit, nutrient.daily_value,
+                                        nutrient.approximate)
+                continue
+            total.amount = _add(total.amount, nutrient.amount)
+            total.daily_value = _add(total.daily_value, nutrient.daily_value)
+            total.approximate = total.approximate or nutrient.approximate
+
+    return RawResult(
+        items=tuple(items),
+        combination_suggestions=_strings(result.get("combination_suggestions")),
+        calories=sum(calories) if calories else None,
+        totals=totals,
+    )
+
+
+def _nutrients(section) -> dict:
+    parsed = {}
+    for key, value in _dict(section).items():
+        name = NUTRIENT_ALIASES.get(key, key)
+        nutrient = parse_nutrient(name, value)
+        if nutrient is not None:
+            parsed[name] = nutrient
+    return parsed
+
+
+def _add(total: Optional[float], value: Optional[float]) -> Optional[float]:
+    if value is None:
+        return total
+    return value if total is None else total + value
+
+
+def _dict(value) -> dict:
+    return value if isinstance(value, dict) else {}
+
+
+def _strings(value) -> tuple:
+    if isinstance(value, str):
+        return (value,) if value.strip() else ()
+    if not isinstance(value, (list, tuple)):
+        return ()
+    return tuple(str(item) for item in value if item not in (None, ""))
@@ -0,0 +1,61 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class CachedScan:
+    body: bytes  # encoded /results/{id} response
+    etag: str  # strong ETag, quoted
+
+
+def make_cached_scan(body: bytes) -> CachedScan:
+    return CachedScan(body=body, etag=f'"{hashlib.sha256(body).hexdigest()}"')
+
+
+class ScanCache:
+    """
+    LRU of encoded single-scan responses keyed by scan id.
+
+    Stored scans are never modified, so entries only leave by eviction;
+    scans that aren't in the database yet (write-behind) are never cached.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # scan id -> CachedScan
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, scan_id: int):
+        with self._lock:
+            entry = self._entries.get(scan_id)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(scan_id)
+            self.counters["hits"] += 1
+            return entry
+
+    def put(self, scan_id: int, entry: CachedScan):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[scan_id] = entry
+            self._entries.move_to_end(scan_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
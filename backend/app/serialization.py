@@ -0,0 +1,120 @@
+"""
+JSON encoding for API responses and the scan_result column.
+
+Uses orjson when it is installed and falls back to the stdlib json module;
+both produce compact output. brotli isn't a dependency, so responses are
+compressed with gzip only.
+"""
+import json
+import zlib
+from datetime import date, datetime
+
+from fastapi.responses import JSONResponse
+from sqlalchemy.types import JSON, Text, TypeDecorator
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+# zlib streams start with 0x78; JSON text never does
+_ZLIB_MAGIC = b"\x78"
+
+
+def _default(obj):
+    # Match orjson for the non-JSON types rows carry
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    return str(obj)
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_default).encode()
+
+
+def dumps_str(obj) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_default)
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with ``dumps``.
+
+    Returning one directly from a route also skips FastAPI's
+    jsonable_encoder pass, which dominates the cost of large pages.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+class StoredJSON(TypeDecorator):
+    """
+    JSON column encoded with ``dumps``, optionally zlib-compressed on SQLite.
+
+    On SQLite the value is stored as compact JSON text, or as a zlib BLOB
+    when it is at least ``compress_min_bytes`` long (0 disables), and rows
+    written either way (or by the plain JSON type) read back the same.
+    SQLite's json_* functions can't see into compressed rows. Other
+    databases keep their native JSON type, encoded via the engine's
+    ``json_serializer``.
+    """
+
+    impl = JSON
+    cache_ok = True
+
+    def __init__(self, compress_min_bytes: int = 0, compress_level: int = 6):
+        super().__init__()
+        self.compress_min_bytes = compress_min_bytes
+        self.compress_level = compress_level
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(Text())
+        return dialect.type_descriptor(JSON())
+
+    def process_bind_param(self, value, dialect):
+        if dialect.name != "sqlite" or value is None:
+            return value
+        encoded = dumps(value)
+        if self.compress_min_bytes and len(encoded) >= self.compress_min_bytes:
+            return zlib.compress(encoded, self.compress_level)
+        return encoded.decode()
+
+    def process_result_value(self, value, dialect):
+        if dialect.name != "sqlite" or value is None:
+            return value
+        if isinstance(value, bytes) and value[:1] == _ZLIB_MAGIC:
+            value = zlib.decompress(value)
+        return loads(value)
+
+
+class PathGZipMiddleware:
+    """
+    GZipMiddleware limited to paths under ``prefixes``, so streamed
+    responses elsewhere (NDJSON batches) aren't buffered by the compressor
+    """
+
+    def __init__(self, app, prefixes: tuple, minimum_size: int = 1024, compresslevel: int = 6):
+        self.app = app
+        self.prefixes = prefixes
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=compresslevel)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(self.prefixes):
+            await self.gzip(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
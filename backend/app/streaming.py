@@ -0,0 +1,99 @@
+import json
+
+from app.serialization import dumps_str, loads
+
+
+class IncrementalJSONParser:
+    """
+    Incrementally parses a streamed JSON object and reports each top-level
+    member as soon as its value is complete.
+
+    Text before the opening brace (e.g. a ```json fence) is skipped, and
+    anything after the closing brace is ignored.
+
+        parser = IncrementalJSONParser()
+        for chunk in chunks:
+            for key, value in parser.feed(chunk):
+                ...
+    """
+
+    def __init__(self):
+        self.result = {}
+        self.done = False
+        self._started = False
+        self._depth = 0  # nesting depth, 1 inside the top-level object
+        self._in_string = False
+        self._escaped = False
+        self._buffer = []  # characters of the current top-level member
+        self._key = None
+
+    def feed(self, text: str):
+        """
+        Consume ``text`` and return the ``(key, value)`` members it completed
+        """
+        completed = []
+        for char in text:
+            if self.done:
+                break
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                self._buffer.append(char)
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._buffer.append(char)
+            elif char in "{[":
+                self._depth += 1
+                self._buffer.append(char)
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    # Closing brace of the top-level object
+                    self._finish_member(completed)
+                    self.done = True
+                else:
+                    self._buffer.append(char)
+            elif char == ":" and self._depth == 1 and self._key is None:
+                self._key = json.loads("".join(self._buffer).strip())
+                self._buffer = []
+            elif char == "," and self._depth == 1:
+                self._finish_member(completed)
+            else:
+                self._buffer.append(char)
+        return completed
+
+    def _finish_member(self, completed: list):
+        raw = "".join(self._buffer).strip()
+        key, self._key, self._buffer = self._key, None, []
+        if key is None or not raw:
+            return
+        value = parse_value(raw)
+        self.result[key] = value
+        completed.append((key, value))
+
+
+def parse_value(raw: str):
+    """
+    A member's value; the response schema makes it plain JSON, so anything
+    else raises ValueError and fails the stream
+    """
+    return loads(raw)
+
+
+def sse_event(event: str, data) -> str:
+    """
+    Format one server-sent event
+    """
+    return f"event: {event}\ndata: {dumps_str(data)}\n\n"
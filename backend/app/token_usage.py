@@ -0,0 +1,116 @@
+"""
+Model token accounting per endpoint.
+
+Every model call's ``usage_metadata`` is split into prompt text, image and
+output tokens and added up under the endpoint that made the call (see
+metrics.current_endpoint), both in ``model_tokens_total`` for /metrics and
+in the per-endpoint totals served by /usage/tokens.
+
+Gemini reports image tokens as part of the prompt count without a
+breakdown, so the image share is estimated from the image size the way
+Gemini bills it: 258 tokens for an image up to 384px on both sides,
+otherwise 258 per 768x768 tile.
+"""
+import io
+import math
+import threading
+from dataclasses import dataclass
+
+from PIL import Image
+
+from app.metrics import MODEL_TOKENS, current_endpoint
+
+TOKENS_PER_TILE = 258
+SMALL_IMAGE_EDGE = 384
+TILE_EDGE = 768
+# Rough tokens per character of English/JSON text, for backends without usage
+CHARS_PER_TOKEN = 4
+
+
+@dataclass
+class Usage:
+    """
+    The subset of Gemini's ``usage_metadata`` the accounting reads
+    """
+    prompt_token_count: int = 0
+    candidates_token_count: int = 0
+    total_token_count: int = 0
+
+
+def image_tokens_for_size(width: int, height: int) -> int:
+    if width <= SMALL_IMAGE_EDGE and height <= SMALL_IMAGE_EDGE:
+        return TOKENS_PER_TILE
+    return TOKENS_PER_TILE * math.ceil(width / TILE_EDGE) * math.ceil(height / TILE_EDGE)
+
+
+def image_tokens(contents) -> int:
+    """
+    Estimated tokens of the images in a request (PIL images or encoded
+    ``{"mime_type", "data"}`` parts, whose size is read from the header)
+    """
+    tokens = 0
+    for part in contents:
+        if isinstance(part, Image.Image):
+            tokens += image_tokens_for_size(*part.size)
+        elif isinstance(part, dict) and "data" in part:
+            with Image.open(io.BytesIO(part["data"])) as image:
+                tokens += image_tokens_for_size(*image.size)
+    return tokens
+
+
+def text_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def estimate_usage(contents, output: str, schema_chars: int = 0) -> Usage:
+    """
+    Usage a Gemini call would report for ``contents`` answered with
+    ``output``; the response schema counts towards the prompt
+    """
+    prompt = sum(text_tokens(part) for part in contents if isinstance(part, str))
+    prompt += math.ceil(schema_chars / CHARS_PER_TOKEN) + image_tokens(contents)
+    completion = text_tokens(output)
+    return Usage(prompt, completion, prompt + completion)
+
+
+class TokenUsage:
+    """
+    Token totals per endpoint since startup
+    """
+
+    def __init__(self):
+        self._totals = {}  # endpoint -> {"calls", "prompt", "image", "output"}
+        self._lock = threading.Lock()
+
+    def record(self, contents, usage_metadata, endpoint: str = None):
+        """
+        Add one call's ``usage_metadata``; calls without one are counted
+        with no tokens
+        """
+        endpoint = endpoint or current_endpoint()
+        prompt = getattr(usage_metadata, "prompt_token_count", 0) or 0
+        output = getattr(usage_metadata, "candidates_token_count", 0) or 0
+        image = min(image_tokens(contents), prompt) if prompt else 0
+        counts = {"prompt": prompt - image, "image": image, "output": output}
+        for kind, tokens in counts.items():
+            MODEL_TOKENS.inc(tokens, endpoint=endpoint, kind=kind)
+        with self._lock:
+            totals = self._totals.setdefault(
+                endpoint, {"calls": 0, "prompt": 0, "image": 0, "output": 0}
+            )
+            totals["calls"] += 1
+            for kind, tokens in counts.items():
+                totals[kind] += tokens
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            endpoints = {name: dict(totals) for name, totals in self._totals.items()}
+        for totals in endpoints.values():
+            totals["total"] = totals["prompt"] + totals["image"] + totals["output"]
+            totals["per_call"] = round(totals["total"] / totals["calls"], 1)
+        return {"endpoints": endpoints,
+                "total": sum(totals["total"] for totals in endpoints.values())}
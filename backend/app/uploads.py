@@ -0,0 +1,101 @@
+import json
+from typing import BinaryIO, Optional
+
+from fastapi import HTTPException
+
+# Leading bytes of the image formats PIL can decode for us
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"BM", "image/bmp"),
+)
+
+# Room for multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def sniff_image_type(header: bytes) -> Optional[str]:
+    """
+    MIME type of an image from its first bytes, or None if unrecognised
+    """
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return mime_type
+    return None
+
+
+def sniff_upload(fileobj: BinaryIO) -> Optional[str]:
+    """
+    Sniff the image type of a file object without moving its position
+    """
+    position = fileobj.tell()
+    header = fileobj.read(16)
+    fileobj.seek(position)
+    return sniff_image_type(header)
+
+
+def file_size(fileobj: BinaryIO) -> int:
+    position = fileobj.tell()
+    size = fileobj.seek(0, 2)
+    fileobj.seek(position)
+    return size
+
+
+class BodySizeLimitMiddleware:
+    """
+    Rejects request bodies over the limit for their path with 413.
+
+    A declared Content-Length over the limit is refused before any of the
+    body is read; otherwise the body is counted as it streams in and the
+    request is aborted as soon as it crosses the limit.
+    """
+
+    def __init__(self, app, limits: dict):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope.get("path")) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            await _send_too_large(send, limit)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=too_large_detail(limit))
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def too_large_detail(limit: int) -> str:
+    return f"Upload exceeds the {limit // (1024 * 1024)} MB limit"
+
+
+async def _send_too_large(send, limit: int):
+    body = json.dumps({"detail": too_large_detail(limit)}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 413,
+        "headers": [(b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"connection", b"close")],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """
+    Buffers scan rows and writes them in batched transactions on a
+    background task, so requests respond as soon as analysis finishes.
+
+    A batch is flushed when it reaches ``batch_size`` rows or when
+    ``flush_interval`` seconds have passed since its first row.
+    """
+
+    def __init__(self, store_rows, batch_size: int, flush_interval: float,
+                 max_queue: int, max_retries: int = 3):
+        self.store_rows = store_rows
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self._queue = None
+        self._task = None
+        self._closed = False
+        self._pending = 0  # queued plus being flushed
+        self.counters = {"flushed_rows": 0, "batches": 0, "failed_rows": 0, "rejected_rows": 0}
+
+    @property
+    def depth(self) -> int:
+        """
+        Rows accepted but not yet written
+        """
+        return self._pending
+
+    def start(self):
+        if self._task is None:
+            self._closed = False
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.create_task(self._run())
+
+    def submit(self, row: dict) -> bool:
+        """
+        Queue a row for writing; False when not running or full, in which
+        case the caller should write it directly
+        """
+        # Only the lifespan starts the flusher: a task spawned from inside a
+        # request would inherit that request's cancel scope.
+        if self._closed or self._task is None:
+            return False
+        try:
+            self._queue.put_nowait(row)
+            self._pending += 1
+            return True
+        except asyncio.QueueFull:
+            self.counters["rejected_rows"] += 1
+            return False
+
+    async def close(self, timeout: float = 30):
+        """
+        Stop accepting rows and flush everything already queued
+        """
+        if self._task is None:
+            return
+        self._closed = True
+        await self._queue.put(_STOP)
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error("Write-behind drain timed out with %s rows queued", self.depth)
+            self._task.cancel()
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            row = await self._queue.get()
+            if row is _STOP:
+                break
+            batch = [row]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if row is _STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list):
+        try:
+            await self._write(batch)
+        finally:
+            self._pending -= len(batch)
+
+    async def _write(self, batch: list):
+        for attempt in range(self.max_retries + 1):
+            try:
+                await run_in_threadpool(self.store_rows, batch)
+                self.counters["flushed_rows"] += len(batch)
+                self.counters["batches"] += 1
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error("Dropping %s scan rows after write failures: %s", len(batch), e)
+                    self.counters["failed_rows"] += len(batch)
+                    return
+                await asyncio.sleep(0.5 * 2 ** attempt)
+
+    def stats(self) -> dict:
+        return {"depth": self.depth, **self.counters}
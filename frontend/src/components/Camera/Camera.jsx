@@ -4,6 +4,8 @@ import { Box, Button, Modal, IconButton } from '@mui/material';
 import { styled } from '@mui/material/styles';
 import { PhotoCamera, Cameraswitch, Close } from '@mui/icons-material';
 
+const MAX_CAPTURE_EDGE = 1536;
+
 const Camera = ({ open, onClose, onCapture }) => {
   const videoRef = useRef(null);
   const canvasRef = useRef(null);
@@ -49,8 +51,10 @@ const Camera = ({ open, onClose, onCapture }) => {
       const video = videoRef.current;
       const canvas = canvasRef.current;
       
-      canvas.width = video.videoWidth;
-      canvas.height = video.videoHeight;
+      // Cap the longest edge; the backend downscales to this size anyway
+      const scale = Math.min(1, MAX_CAPTURE_EDGE / Math.max(video.videoWidth, video.videoHeight));
+      canvas.width = Math.round(video.videoWidth * scale);
+      canvas.height = Math.round(video.videoHeight * scale);
       
       const context = canvas.getContext('2d');
       context.drawImage(video, 0, 0, canvas.width, canvas.height);
@@ -3,6 +3,13 @@ import { useState, useCallback } from 'react';
 
 const API_BASE_URL = 'http://localhost:8000'; // You might want to move this to an env variable
 
+// Error for a failed response; a frame rejected by the quality gate (422)
+// carries a message telling the user how to retake the photo
+const responseError = async (response) => {
+  const body = await response.json().catch(() => null);
+  return new Error(body?.detail?.message ?? `HTTP error! status: ${response.status}`);
+};
+
 export const useApi = () => {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
@@ -33,17 +40,63 @@ export const useApi = () => {
       });
 
       if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
+        throw await responseError(response);
       }
 
       return response.json();
     });
   }, [executeCall]);
 
+  // Streamed analysis: onSection(key, value) fires as each result section
+  // arrives over server-sent events; resolves with the complete result
+  const analyzeImageStream = useCallback(async (file, onSection) => {
+    const formData = new FormData();
+    formData.append('file', file);
+
+    return executeCall(async () => {
+      const response = await fetch(`${API_BASE_URL}/analyze/stream`, {
+        method: 'POST',
+        body: formData,
+      });
+
+      if (!response.ok) {
+        throw await responseError(response);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+          const message = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+
+          const event = message.match(/^event: (.*)$/m)?.[1];
+          const data = JSON.parse(message.match(/^data: (.*)$/m)?.[1] ?? 'null');
+          if (event === 'section') {
+            onSection?.(data.key, data.value);
+          } else if (event === 'result') {
+            return data;
+          } else if (event === 'error') {
+            throw new Error(data.detail);
+          }
+        }
+      }
+      throw new Error('Analysis stream ended without a result');
+    });
+  }, [executeCall]);
+
   return {
     loading,
     error,
     executeCall,
     analyzeImage, // Add the new function to the returned object
+    analyzeImageStream,
   };
 };
\ No newline at end of file
@@ -29,10 +29,10 @@ export const foodAnalyzerApi = {
     }
   },
 
-  // Get scan history
-  getScanHistory: async () => {
+  // Get a page of scan history; pass the returned next_cursor to get the next page
+  getScanHistory: async ({ cursor, limit, include } = {}) => {
     try {
-      const response = await api.get('/history');
+      const response = await api.get('/history', { params: { cursor, limit, include } });
       return response.data;
     } catch (error) {
       throw error;